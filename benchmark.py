@@ -0,0 +1,603 @@
+#Author: Chan aka bytehx
+#Headless benchmark for the Ollama AI Analyzer pipeline. Runs under plain CPython, outside Burp.
+#
+#  python benchmark.py CORPUS_DIR                          fake API server, default settings
+#  python benchmark.py CORPUS_DIR --url http://host:11434  real Ollama server
+#  python benchmark.py CORPUS_DIR --backend cli            fake `ollama run` (or --ollama-path for the real one)
+#  python benchmark.py CORPUS_DIR --config reduce_traffic=false --config max_parallel=4,map_reduce=true
+#  python benchmark.py --decode-bench                      CLI output decoding micro-benchmark
+#
+#Each --config is one run; settings use the extension's config keys. CORPUS_DIR holds
+#NAME.req / NAME.resp pairs, Burp "Save items" XML exports, or any other file as a raw request.
+from __future__ import print_function
+
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ollama_core import Analyzer, AnalysisQueue, Conversation, BACKEND_API, BACKEND_CLI, CACHE_OFF
+from ollama_core import JOB_DONE, JOB_FAILED, JOB_CANCELLED, PRIORITY_BATCH, percentile, format_size
+from ollama_core import StreamDecoder, READ_CHUNK_BYTES, clean_ansi
+
+SPINNER = u"\u280b\u2819\u2839\u2838\u283c\u2834\u2826\u2827\u2807\u280f"
+REQUEST_SUFFIXES = (".req", ".request")
+RESPONSE_SUFFIXES = (".resp", ".response")
+FAKE_WORDS = ("The", " request", " sends", " a", " session", " cookie", " without", " the", " Secure",
+              " flag", ".", " Consider", " validating", " the", " id", " parameter", " server-side", ".\n")
+FAKE_FINDING = ('{"title": "Session', ' cookie', ' without', ' Secure', ' flag", "severity": "', 'Medium',
+                '", "location": "', 'Set-Cookie', ' header", "parameter": "', 'session%d', '", "evidence": "',
+                'Set-Cookie: session=abc;', ' Path=/', '"}')
+
+
+def fake_tokens(count, structured=False):
+    """count canned tokens; with structured, a {"findings": [...]} document closed by the last token."""
+    if not structured:
+        return [FAKE_WORDS[i % len(FAKE_WORDS)] for i in range(count)]
+    tokens = ['{"findings": [']
+    index = 0
+    while len(tokens) < count - 1:
+        tokens.extend(([", "] if index else []) + [token.replace("%d", str(index)) for token in FAKE_FINDING])
+        index += 1
+    return tokens + ["]}"]
+
+
+def _decode(data):
+    return data.decode("utf-8", "replace") if isinstance(data, bytes) else data
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return _decode(f.read())
+
+
+def load_burp_items(path):
+    """(name, request, response) for every item in a Burp "Save items" XML export."""
+    items = []
+    for index, item in enumerate(ElementTree.parse(path).getroot().findall("item")):
+        pair = []
+        for tag in ("request", "response"):
+            node = item.find(tag)
+            text = node.text if node is not None and node.text else ""
+            if text and node.get("base64") == "true":
+                text = _decode(base64.b64decode(text))
+            pair.append(text or None)
+        url = item.findtext("url") or str(index + 1)
+        items.append(("%s#%d %s" % (os.path.basename(path), index + 1, url), pair[0], pair[1]))
+    return items
+
+
+def load_corpus(directory):
+    items = []
+    names = sorted(os.listdir(directory))
+    for name in names:
+        path = os.path.join(directory, name)
+        base, ext = os.path.splitext(name)
+        if not os.path.isfile(path) or ext in RESPONSE_SUFFIXES:
+            continue
+        if ext == ".xml":
+            items.extend(load_burp_items(path))
+            continue
+        response = None
+        if ext in REQUEST_SUFFIXES:
+            for suffix in RESPONSE_SUFFIXES:
+                if base + suffix in names:
+                    response = _read(os.path.join(directory, base + suffix))
+                    break
+        items.append((name, _read(path), response))
+    return items
+
+
+class FakeOllama(object):
+    """NDJSON /api/generate and /api/chat server that emits canned tokens at a fixed rate."""
+
+    def __init__(self, tokens_per_sec=50.0, tokens=200, ttft=0.2, eval_tokens_per_sec=0):
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.ttft = ttft
+        self.eval_tokens_per_sec = eval_tokens_per_sec
+        self._cached = ""  # like Ollama's KV cache: the last prompt, whose prefix is not evaluated again
+        self._cache_lock = threading.Lock()
+        self.loaded = set()
+        fake = self
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # Clients that stop reading mid-stream (cancelled or abandoned calls) are expected.
+                if not isinstance(sys.exc_info()[1], socket.error):
+                    HTTPServer.handle_error(self, request, client_address)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # Health checks probe /api/version; warm-up polls /api/ps.
+                if self.path.startswith("/api/ps"):
+                    data = json.dumps({"models": [{"name": m, "model": m, "size": 0} for m in sorted(fake.loaded)]})
+                else:
+                    data = json.dumps({"version": "0.0.0-fake"})
+                self._reply(data.encode("utf-8"))
+
+            def _reply(self, data):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(_decode(self.rfile.read(int(self.headers["Content-Length"]))))
+                if body.get("stream") is False:
+                    # A load (or unload with keep_alive 0) without generating anything.
+                    if body.get("keep_alive") == 0:
+                        fake.loaded.discard(body.get("model"))
+                    else:
+                        fake.loaded.add(body.get("model"))
+                    self._reply(json.dumps({"model": body.get("model"), "done": True}).encode("utf-8"))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    fake._stream(body, self._write)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (IOError, OSError):
+                    self.close_connection = True
+
+            def _write(self, obj):
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(("%x\r\n" % len(data)).encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d" % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def _stream(self, body, write):
+        start = time.time()
+        limit = int((body.get("options") or {}).get("num_predict", 0)) or self.tokens
+        count = min(self.tokens, limit)
+        if "messages" in body:
+            prompt = "".join(m["role"] + ":" + m.get("content", "") + "\n" for m in body["messages"])
+        else:
+            prompt = (body.get("system") or "") + "\n" + (body.get("prompt") or "")
+        with self._cache_lock:
+            if body.get("context"):
+                prompt = self._cached + prompt if body["context"] == [len(self._cached)] else prompt
+            shared = _common_prefix(self._cached, prompt)
+            self._cached = prompt
+        evaluated = (len(prompt) - shared) // 4
+        eval_seconds = evaluated / self.eval_tokens_per_sec if self.eval_tokens_per_sec else self.ttft
+        time.sleep(self.ttft + (eval_seconds if self.eval_tokens_per_sec else 0))
+        eval_start = time.time()
+        for i, text in enumerate(fake_tokens(count, bool(body.get("format")))):
+            if "messages" in body:
+                write({"message": {"role": "assistant", "content": text}, "done": False})
+            else:
+                write({"response": text, "done": False})
+            _sleep_until(eval_start + (i + 1) / self.tokens_per_sec)
+        now = time.time()
+        write({"done": True, "done_reason": "length" if count < self.tokens else "stop",
+               "eval_count": count, "eval_duration": int((now - eval_start) * 1e9), "context": [len(prompt)],
+               "prompt_eval_count": evaluated, "prompt_eval_duration": int(eval_seconds * 1e9),
+               "total_duration": int((now - start) * 1e9), "load_duration": 0})
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _common_prefix(a, b):
+    size = min(len(a), len(b))
+    low, high = 0, size
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _dead_url():
+    """URL of a local port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return "http://127.0.0.1:%d" % port
+
+
+def _sleep_until(deadline):
+    delay = deadline - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def fake_cli(argv):
+    """Stand-in for `ollama run`: spinner escapes while "loading", then each token flushed as it is generated."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tps", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--format")
+    args, _ = parser.parse_known_args(argv)
+    sys.stdin.read()
+    out = getattr(sys.stdout, "buffer", sys.stdout)
+    start = time.time()
+    frame = 0
+    while time.time() - start < args.ttft:
+        out.write(("\x1b[?25l\x1b[?2026h\x1b[1G%s \x1b[K\x1b[?25h\x1b[?2026l" % SPINNER[frame % len(SPINNER)]).encode("utf-8"))
+        out.flush()
+        frame += 1
+        time.sleep(0.05)
+    out.write(b"\x1b[1G\x1b[K")
+    eval_start = time.time()
+    for i, token in enumerate(fake_tokens(args.tokens, bool(args.format))):
+        out.write(token.encode("utf-8"))
+        out.flush()
+        _sleep_until(eval_start + (i + 1) / args.tps)
+    out.write(b"\n")
+    out.flush()
+
+
+def _fake_cli_writes(tokens, tps, ttft, frames=8):
+    """(seconds, bytes) for every write a `ollama run` like the fake one makes: spinner frames, then tokens."""
+    writes = []
+    for frame in range(frames):
+        writes.append((ttft * frame / frames, (u"\x1b[?25l\x1b[?2026h\x1b[1G%s \x1b[K\x1b[?25h\x1b[?2026l"
+                                                % SPINNER[frame % len(SPINNER)]).encode("utf-8")))
+    writes.append((ttft, b"\x1b[1G\x1b[K"))
+    # Every fifth token carries multi-byte characters so chunk edges land inside them.
+    for i, token in enumerate(fake_tokens(tokens)):
+        text = token + (u" r\u00e9sum\u00e9 \u2014 \u2713" if i % 5 == 4 else u"")
+        writes.append((ttft + (i + 1) / tps, text.encode("utf-8")))
+    return writes
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def decode_bench(argv):
+    """Micro-benchmark of the CLI output path: readline() + clean_ansi against StreamDecoder on byte chunks."""
+    parser = argparse.ArgumentParser(prog="benchmark.py --decode-bench")
+    parser.add_argument("--tokens", type=int, default=20000, help="tokens in the synthetic stream")
+    parser.add_argument("--tps", type=float, default=50.0, help="tokens per second, for time to first visible text")
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds of spinner before the first token")
+    parser.add_argument("--chunk", type=int, default=READ_CHUNK_BYTES, help="read size for the chunked path")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    writes = _fake_cli_writes(args.tokens, args.tps, args.ttft)
+    stream = b"".join(data for _, data in writes)
+
+    def by_line():
+        return u"".join(clean_ansi(line.decode("utf-8", "replace")) for line in stream.splitlines(True))
+
+    def by_chunk(size=args.chunk):
+        decoder = StreamDecoder()
+        return u"".join(decoder.feed(stream[i:i + size]) for i in range(0, len(stream), size)) + decoder.flush()
+
+    line_time, line_text = _best_of(args.repeat, by_line)
+    chunk_time, chunk_text = _best_of(args.repeat, by_chunk)
+    split_ok = all(by_chunk(size) == chunk_text for size in range(1, 17))
+
+    # Time to first visible text as the pipe delivers each write: readline() waits for a newline.
+    first_line = first_chunk = None
+    buffered = b""
+    decoder = StreamDecoder()
+    for at, data in writes:
+        if first_chunk is None and decoder.feed(data).strip():
+            first_chunk = at
+        buffered += data
+        if first_line is None and b"\n" in buffered:
+            first_line = at
+        if first_line is not None and first_chunk is not None:
+            break
+
+    def leaked(text):
+        return sum(1 for ch in text if u"\u2800" <= ch <= u"\u28ff" or ch == u"\x1b")
+
+    size = len(stream) / (1024.0 * 1024.0)
+    print("%d tokens, %s of output, first token after %.2fs" % (args.tokens, format_size(len(stream)), args.ttft))
+    print("   %-28s %9s %12s %14s" % ("", "MB/s", "first text", "leaked chars"))
+    print("   %-28s %9.1f %11.2fs %14d" % ("readline + clean_ansi", size / line_time, first_line, leaked(line_text)))
+    print("   %-28s %9.1f %11.2fs %14d" % ("StreamDecoder (%d B reads)" % args.chunk, size / chunk_time, first_chunk,
+                                          leaked(chunk_text)))
+    print("   reads of 1-16 bytes give the same text: %s" % ("yes" if split_ok else "NO"))
+    return 0 if split_ok else 1
+
+
+class BenchView(object):
+    """Result view that keeps the text like the Swing panel would and times the calls into it."""
+
+    def __init__(self):
+        self.parts = []
+        self.chunks = 0
+        self.seconds = 0.0
+
+    def _timed(self, func, *args):
+        start = time.time()
+        func(*args)
+        self.seconds += time.time() - start
+
+    def setText(self, text):
+        self._timed(self._set, text)
+
+    def appendText(self, text):
+        self._timed(self.parts.append, text)
+
+    def beginStream(self, header=""):
+        self._timed(self._set, header)
+
+    def appendChunk(self, text):
+        self.chunks += 1
+        self._timed(self.parts.append, text)
+
+    def endStream(self, text=None):
+        if text is not None:
+            self._timed(self._set, text)
+
+    def _set(self, text):
+        self.parts = [text]
+
+
+class MemoryProbe(object):
+    """Python heap peak via tracemalloc where available, plus the process's peak RSS."""
+
+    def __init__(self):
+        try:
+            import tracemalloc
+        except ImportError:
+            tracemalloc = None
+        self._tracemalloc = tracemalloc
+
+    def start(self):
+        if self._tracemalloc:
+            self._tracemalloc.start()
+
+    def stop(self):
+        result = {"heap_peak": None, "rss_peak": None}
+        if self._tracemalloc:
+            result["heap_peak"] = self._tracemalloc.get_traced_memory()[1]
+            self._tracemalloc.stop()
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            result["rss_peak"] = rss if sys.platform == "darwin" else rss * 1024
+        except ImportError:
+            pass
+        return result
+
+
+def parse_config(text):
+    """"k=v,k=v" with JSON values where they parse (true, 4, 0.5) and strings otherwise."""
+    config = {}
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        key, _, value = item.partition("=")
+        try:
+            config[key.strip()] = json.loads(value)
+        except ValueError:
+            config[key.strip()] = value.strip()
+    return config
+
+
+def run_config(label, config, corpus, prompt, repeat, followup=None):
+    analyzer = Analyzer(config)
+    queue = AnalysisQueue(workers=config.get("max_parallel", 2))
+    remaining = [len(corpus) * repeat]
+    finished = threading.Event()
+    lock = threading.Lock()
+    views = []
+
+    def on_status(job):
+        if job.status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+
+    def task(view, traffic):
+        include = (traffic[0] is not None, traffic[1] is not None)
+
+        def run(job):
+            # A follow-up question right after the first answer continues the same conversation, as on a tab.
+            conversation = Conversation()
+            result = analyzer.analyze(job, view, prompt, traffic, include, conversation=conversation)
+            if followup:
+                result = analyzer.analyze(job, view, followup, traffic, include, conversation=conversation)
+            return result
+        return run
+
+    memory = MemoryProbe()
+    memory.start()
+    start = time.time()
+    jobs = []
+    for _ in range(repeat):
+        for name, request, response in corpus:
+            view = BenchView()
+            views.append(view)
+            jobs.append(queue.submit(task(view, (request, response)), PRIORITY_BATCH, on_status=on_status, name=name))
+    finished.wait()
+    wall = time.time() - start
+    mem = memory.stop()
+    queue.shutdown()
+    pool = analyzer._pool
+    hosts = [{"url": host.url, "served": host.served, "failures": host.failures, "latency": host.latency}
+             for host in (pool.hosts if pool else [])]
+    analyzer.close()
+
+    entries = analyzer.metrics.snapshot()
+    errors = [job for job in jobs if job.status == JOB_FAILED]
+    for job in errors[:3]:
+        print("  %s failed: %s" % (job.name, job.error), file=sys.stderr)
+
+    def pct(field, value):
+        values = [getattr(m, field) for m in entries if getattr(m, field) is not None]
+        return percentile(values, value)
+
+    output_tokens = sum(m.output_tokens or 0 for m in entries)
+    return {
+        "label": label,
+        "config": config,
+        "items": len(jobs),
+        "failed": len(errors),
+        "reused": len([m for m in entries if m.cached]),
+        "findings": len(analyzer.findings),
+        "hosts": hosts,
+        "cascade": analyzer.metrics.cascade_summary(),
+        "wall": wall,
+        "items_per_sec": len(jobs) / wall if wall else None,
+        "output_tokens_per_sec": output_tokens / wall if wall else None,
+        "input_bytes": sum(m.input_bytes for m in entries),
+        "total_p50": pct("total", 50), "total_p95": pct("total", 95),
+        "ttft_p50": pct("ttft", 50), "ttft_p95": pct("ttft", 95),
+        "queue_wait_p50": pct("queue_wait", 50), "queue_wait_p95": pct("queue_wait", 95),
+        "prompt_build_p50": pct("prompt_build", 50), "prompt_build_p95": pct("prompt_build", 95),
+        "tokens_per_sec_p50": pct("tokens_per_sec", 50),
+        "prompt_eval_p50": pct("prompt_eval_duration", 50),
+        "prompt_eval_tokens": sum(m.prompt_eval_count or 0 for m in entries),
+        "view_seconds": sum(view.seconds for view in views),
+        "view_chunks": sum(view.chunks for view in views),
+        "heap_peak": mem["heap_peak"],
+        "rss_peak": mem["rss_peak"],
+    }
+
+
+def _ms(value):
+    return "-" if value is None else "%.1fms" % (value * 1000)
+
+
+def _s(value):
+    return "-" if value is None else "%.2fs" % value
+
+
+def print_report(result):
+    print("== %s (%d items, %d failed, %d reused%s)" % (
+        result["label"], result["items"], result["failed"], result["reused"],
+        ", %d distinct findings" % result["findings"] if result["findings"] else ""))
+    print("   wall %s, %.2f items/s, %.1f output tok/s, %s input" % (
+        _s(result["wall"]), result["items_per_sec"] or 0, result["output_tokens_per_sec"] or 0,
+        format_size(result["input_bytes"])))
+    print("   total p50 %s p95 %s | ttft p50 %s p95 %s | queue p50 %s p95 %s" % (
+        _s(result["total_p50"]), _s(result["total_p95"]), _s(result["ttft_p50"]), _s(result["ttft_p95"]),
+        _s(result["queue_wait_p50"]), _s(result["queue_wait_p95"])))
+    print("   prompt build p50 %s p95 %s | view %s over %d chunks | model tok/s p50 %s" % (
+        _ms(result["prompt_build_p50"]), _ms(result["prompt_build_p95"]), _ms(result["view_seconds"]),
+        result["view_chunks"], "-" if result["tokens_per_sec_p50"] is None else "%.1f" % result["tokens_per_sec_p50"]))
+    if result["prompt_eval_tokens"]:
+        print("   prompt eval p50 %s, %d prompt tokens evaluated" % (_s(result["prompt_eval_p50"]), result["prompt_eval_tokens"]))
+    print("   heap peak %s, rss peak %s" % (
+        "-" if result["heap_peak"] is None else format_size(result["heap_peak"]),
+        "-" if result["rss_peak"] is None else format_size(result["rss_peak"])))
+    if result["cascade"]:
+        print("   triage: %d of %d escalated (%.0f%%), model time saved %s" % (
+            result["cascade"]["escalated"], result["cascade"]["triaged"], 100 * result["cascade"]["escalation_rate"],
+            _s(result["cascade"]["time_saved"])))
+    if len(result["hosts"]) > 1:
+        print("   hosts: " + ", ".join("%s %d served%s%s" % (
+            host["url"], host["served"], " %d failed" % host["failures"] if host["failures"] else "",
+            "" if host["latency"] is None else " ttft %.2fs" % host["latency"]) for host in result["hosts"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Ollama AI Analyzer pipeline outside Burp.")
+    parser.add_argument("corpus", help="directory of saved request/response pairs")
+    parser.add_argument("--backend", choices=(BACKEND_API, BACKEND_CLI), default=BACKEND_API)
+    parser.add_argument("--url", help="real Ollama API URL; a fake server is started when omitted")
+    parser.add_argument("--ollama-path", help="real ollama binary for --backend cli; a fake one is used when omitted")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--prompt", default="", help="custom prompt sent with every item")
+    parser.add_argument("--config", action="append", default=[],
+                        help="comma-separated key=value settings for one run; repeat for several runs")
+    parser.add_argument("--followup", help="second question asked about every item after the first pass")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay the corpus per run")
+    parser.add_argument("--fake-tps", type=float, default=50.0, help="fake tokens per second")
+    parser.add_argument("--fake-tokens", type=int, default=200, help="fake tokens per answer")
+    parser.add_argument("--fake-ttft", type=float, default=0.2, help="fake seconds before the first token")
+    parser.add_argument("--fake-eval-tps", type=float, default=0,
+                        help="fake prompt tokens evaluated per second; the prefix shared with the previous call is free")
+    parser.add_argument("--fake-hosts", type=int, default=1,
+                        help="fake API servers to balance across; server i is i+1 times slower to the first token")
+    parser.add_argument("--fake-dead", type=int, default=0, help="unreachable hosts added to the fake pool")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error("no traffic found in " + args.corpus)
+
+    fakes = []
+    # Reuse would hide the model time being measured; pass --config dedupe_enabled=true to measure it.
+    base = {"model": args.model, "backend": args.backend, "cache_mode": CACHE_OFF, "timeout_seconds": 0,
+            "history_enabled": False, "dedupe_enabled": False}
+    if args.backend == BACKEND_API:
+        if not args.url:
+            fakes = [FakeOllama(args.fake_tps, args.fake_tokens, args.fake_ttft * (i + 1), args.fake_eval_tps)
+                     for i in range(max(1, args.fake_hosts))]
+            if len(fakes) > 1 or args.fake_dead:
+                base["api_hosts"] = [f.url for f in fakes] + [_dead_url() for _ in range(args.fake_dead)]
+        base["api_url"] = args.url or fakes[0].url
+    else:
+        base["path"] = args.ollama_path or '"%s" "%s" --fake-cli --tps %s --tokens %d --ttft %s' % (
+            sys.executable, os.path.abspath(__file__), args.fake_tps, args.fake_tokens, args.fake_ttft)
+
+    print("%d items from %s against %s" % (
+        len(corpus), args.corpus, "fake " + args.backend if fakes or not (args.url or args.ollama_path)
+        else args.url or args.ollama_path))
+
+    results = []
+    try:
+        for text in args.config or [""]:
+            config = dict(base)
+            config.update(parse_config(text))
+            result = run_config(text or "defaults", config, corpus, args.prompt, args.repeat, args.followup)
+            print_report(result)
+            results.append(result)
+    finally:
+        for fake in fakes:
+            fake.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--fake-cli":
+        fake_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--decode-bench":
+        sys.exit(decode_bench(sys.argv[2:]))
+    else:
+        sys.exit(main())
@@ -1,12 +1,15 @@
 #Author: Chan aka bytehx
 #Date: 19 feb 2025
-from burp import IBurpExtender, IContextMenuFactory, ITab, IHttpService
+from burp import IBurpExtender, IContextMenuFactory, ITab, IHttpService, IHttpListener, IExtensionStateListener
 from javax.swing import JPanel, JButton, JTextField, JTextArea, JScrollPane, JLabel, JCheckBox, BoxLayout, JComboBox
 from javax.swing import JPopupMenu, JMenuItem, JSplitPane, BorderFactory, JOptionPane, SwingConstants, JTabbedPane
 from javax.swing import SwingUtilities, JComponent, KeyStroke, AbstractAction, Action, UIManager, JToolBar
-from java.awt import BorderLayout, Dimension, Font, GridLayout, FlowLayout, Insets, Component, Color
+from javax.swing import JTable, JProgressBar, ListSelectionModel, Timer, DefaultListCellRenderer, JList
+from javax.swing.table import AbstractTableModel
+from java.awt import BorderLayout, CardLayout, Dimension, Font, GridLayout, FlowLayout, Insets, Component, Color
 from java.awt.event import KeyEvent, InputEvent, ActionListener
 from java.util import ArrayList
+from java.lang import Integer, Double, String
 from java.io import InputStreamReader, BufferedReader, OutputStreamWriter, ByteArrayOutputStream, File, FileInputStream, FileOutputStream
 import subprocess
 import threading
@@ -19,6 +22,25 @@ import uuid
 import base64
 import time
 
+try:
+    _EXTENSION_DIR = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    import inspect
+    _EXTENSION_DIR = os.path.dirname(os.path.abspath(inspect.getsourcefile(lambda: 0)))
+if _EXTENSION_DIR not in sys.path:
+    sys.path.insert(0, _EXTENSION_DIR)
+
+from ollama_core import DEFAULT_API_URL, DEFAULT_KEEP_ALIVE, BACKEND_CLI, BACKEND_API
+from ollama_core import AnalysisQueue, default_parallelism, ORDER_FIFO, ORDER_PRIORITY, PRIORITY_INTERACTIVE
+from ollama_core import JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_CANCELLED, JOB_FAILED, PRIORITY_BATCH, BatchProgress
+from ollama_core import CACHE_OFF, CACHE_MEMORY, CACHE_DISK, Analyzer, NullResultView
+from ollama_core import ModelCatalog, MODEL_LIST_TTL, describe_model, HISTORY_PAGE_SIZE
+from ollama_core import SpillStore, TextSlot, format_size, remove_stale_temp_dirs, SEVERITIES
+from ollama_core import pool_hosts, ROUTE_LEAST_OUTSTANDING, ROUTE_LATENCY, Conversation, format_duration
+from ollama_core import DEFAULT_CUSTOM_PROMPT, EXTRACT_MODES, EXTRACT_SHOW, BURP_PARAMETER_TYPES, ModelComparison
+from ollama_core import DeferredView
+from ollama_core import ModelManager, PRIORITY_BACKGROUND, PassiveIntake, PASSIVE_DEFAULT_MIME_TYPES, PASSIVE_DEFAULT_STATUS
+
 
 def safe_print(text):
     try:
@@ -32,16 +54,16 @@ def safe_print(text):
         except:
             print("Could not print message due to encoding issues")
 
-def safe_write(filepath, content):
-    try:
-        with open(filepath, 'wb') as f:
-            if isinstance(content, unicode):
-                f.write(content.encode('utf-8', 'replace'))
-            else:
-                f.write(str(content).encode('utf-8', 'replace'))
-    except Exception as e:
-        safe_print("Error writing to file: " + str(e))
-        raise
+def jobStatusText(job):
+    if job.duplicate and not job.is_active():
+        return job.status + " (duplicate)"
+    if job.cached and not job.is_active():
+        return job.status + " (cached)"
+    if job.status == JOB_CANCELLED and job.cancel_reason and job.cancel_reason != "cancelled":
+        return job.status + " (" + job.cancel_reason + ")"
+    if job.truncated and job.status == JOB_DONE:
+        return job.status + " (truncated)"
+    return job.status
 
 class StyledButton(JButton):
     def __init__(self, text, bg_color=None, fg_color=None, **kwargs):
@@ -67,6 +89,7 @@ class TabComponent(JPanel):
         self.setLayout(FlowLayout(FlowLayout.LEFT, 0, 0))
         self.setOpaque(False)
         
+        self.title = title
         self.titleLabel = JLabel(title)
         self.titleLabel.setBorder(BorderFactory.createEmptyBorder(0, 0, 0, 5))
         self.add(self.titleLabel)
@@ -79,6 +102,9 @@ class TabComponent(JPanel):
         closeButton.setFocusable(False)
         closeButton.addActionListener(CloseTabAction(tabbedPane, tabIndex, closeAction))
         self.add(closeButton)
+    
+    def setStatus(self, status):
+        self.titleLabel.setText(self.title + " [" + status + "]" if status else self.title)
 
 class CloseTabAction(ActionListener):
     def __init__(self, tabbedPane, tabIndex, callback):
@@ -120,6 +146,11 @@ class RequestPanel(JPanel):
         sendButton.addActionListener(lambda event: self._sendRequest())
         requestToolbar.add(sendButton)
         
+        self._requestFullButton = JButton("Load Full Body")
+        self._requestFullButton.addActionListener(lambda event: self._show("request", True))
+        self._requestFullButton.setVisible(False)
+        requestToolbar.add(self._requestFullButton)
+        
         self._requestPanel.add(requestToolbar, BorderLayout.NORTH)
         
         self._responsePanel = JPanel(BorderLayout())
@@ -133,6 +164,23 @@ class RequestPanel(JPanel):
         responseScroll = JScrollPane(self._responseArea)
         self._responsePanel.add(responseScroll, BorderLayout.CENTER)
         
+        self._responseToolbar = JToolBar()
+        self._responseToolbar.setFloatable(False)
+        self._responseFullButton = JButton("Load Full Body")
+        self._responseFullButton.addActionListener(lambda event: self._show("response", True))
+        self._responseToolbar.add(self._responseFullButton)
+        self._responseToolbar.setVisible(False)
+        self._responsePanel.add(self._responseToolbar, BorderLayout.NORTH)
+        
+        # Bodies live in TextSlots (spilled to disk when large); the text areas only hold
+        # the selected tab's text, and a preview when a body is too large to display in full.
+        store = tabManager.getBodyStore()
+        self._slots = {"request": TextSlot(store), "response": TextSlot(store)}
+        self._conversation = Conversation()
+        self._areas = {"request": self._requestArea, "response": self._responseArea}
+        self._previewing = {"request": False, "response": False}
+        self._loaded = False
+        
         self._splitPane.setTopComponent(self._requestPanel)
         self._splitPane.setBottomComponent(self._responsePanel)
         
@@ -145,7 +193,7 @@ class RequestPanel(JPanel):
         self._promptArea.setFont(Font("Monospaced", Font.PLAIN, 12))
         self._promptArea.setLineWrap(True)
         self._promptArea.setWrapStyleWord(True)
-        self._promptArea.setText("Extract and analyze all paths, endpoints, and parameters found in this HTTP traffic.")
+        self._promptArea.setText(DEFAULT_CUSTOM_PROMPT)
         promptPanel.add(JScrollPane(self._promptArea), BorderLayout.CENTER)
         
         buttonPanel = JPanel(FlowLayout(FlowLayout.LEFT))
@@ -154,20 +202,79 @@ class RequestPanel(JPanel):
         self._analyzeButton.addActionListener(lambda x: self._tabManager.analyzeWithAI(self._tabIndex))
         buttonPanel.add(self._analyzeButton)
         
+        self._cancelButton = JButton("Cancel")
+        self._cancelButton.setEnabled(False)
+        self._cancelButton.addActionListener(lambda x: self._tabManager.cancelAnalysis(self._tabIndex))
+        buttonPanel.add(self._cancelButton)
+        
+        compareButton = JButton("Compare Models")
+        compareButton.setToolTipText("Run this traffic through the models selected in the Compare tab, side by side")
+        compareButton.addActionListener(lambda x: self._tabManager.requestComparison(self._tabIndex))
+        buttonPanel.add(compareButton)
+        
         self._requestCheck = JCheckBox("Include Request", True)
         self._responseCheck = JCheckBox("Include Response", True)
         buttonPanel.add(self._requestCheck)
         buttonPanel.add(self._responseCheck)
         
+        self._forceRefreshCheck = JCheckBox("Force refresh", False)
+        self._forceRefreshCheck.setToolTipText("Ignore cached results and run the model again")
+        buttonPanel.add(self._forceRefreshCheck)
+        
+        self._statusLabel = JLabel("")
+        buttonPanel.add(self._statusLabel)
+        
         promptPanel.add(buttonPanel, BorderLayout.SOUTH)
         
         self.add(promptPanel, BorderLayout.SOUTH)
+        
+        self._resultPanel = AIResultPanel()
+        self._job = None
+        self._prefetch = None
+        self._tabComponent = None
+    
+    def getResultPanel(self):
+        return self._resultPanel
+    
+    def getCardName(self):
+        return "tab-" + str(id(self))
+    
+    def setTabComponent(self, tabComponent):
+        self._tabComponent = tabComponent
+    
+    def getTitle(self):
+        return self._tabComponent.title if self._tabComponent else "Request"
+    
+    def getJob(self):
+        return self._job
+    
+    def getConversation(self):
+        return self._conversation
+    
+    def setConversation(self, conversation):
+        self._conversation = conversation
+    
+    def setJob(self, job):
+        self._job = job
+    
+    def setPrefetch(self, prefetch):
+        self._prefetch = prefetch
+    
+    def takePrefetch(self):
+        prefetch, self._prefetch = self._prefetch, None
+        return prefetch
+    
+    def setStatus(self, status):
+        self._statusLabel.setText("Status: " + status if status else "")
+        self._cancelButton.setEnabled(status in (JOB_QUEUED, JOB_RUNNING))
+        if self._tabComponent:
+            self._tabComponent.setStatus(status)
     
     def getRequestText(self):
-        return self._requestArea.getText()
+        return self._text("request")
     
     def getResponseText(self):
-        return self._responseArea.getText()
+        return self._text("response")
     
     def getCustomPrompt(self):
         return self._promptArea.getText()
@@ -178,15 +285,67 @@ class RequestPanel(JPanel):
     def includeResponse(self):
         return self._responseCheck.isSelected()
     
+    def forceRefresh(self):
+        return self._forceRefreshCheck.isSelected()
+    
     def setRequest(self, text):
-        self._requestArea.setText(text)
+        self._setText("request", text)
     
     def setResponse(self, text):
-        self._responseArea.setText(text)
+        self._setText("response", text)
+    
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        for side in ("request", "response"):
+            self._show(side, False)
+    
+    def unload(self):
+        if not self._loaded:
+            return
+        for side in ("request", "response"):
+            if not self._previewing[side]:
+                self._slots[side].set(self._areas[side].getText())
+            self._areas[side].setText("")
+            self._previewing[side] = False
+        self._loaded = False
+    
+    def dispose(self):
+        for slot in self._slots.values():
+            slot.release()
+    
+    def _text(self, side):
+        if self._loaded and not self._previewing[side]:
+            return self._areas[side].getText()
+        return self._slots[side].get()
+    
+    def _setText(self, side, text):
+        self._slots[side].set(text)
+        if self._loaded:
+            self._show(side, False)
+    
+    def _show(self, side, full):
+        slot = self._slots[side]
+        area = self._areas[side]
+        limit = self._tabManager.getPreviewChars()
+        preview = not full and slot.length > limit
+        if preview:
+            area.setText(slot.preview(limit) + "\n\n[Preview of the first " + format_size(limit) + " of "
+                         + format_size(slot.length) + ". Use Load Full Body to see or edit all of it.]")
+        else:
+            area.setText(slot.get())
+        area.setEditable(not preview)
+        area.setCaretPosition(0)
+        self._previewing[side] = preview
+        if side == "request":
+            self._requestFullButton.setVisible(preview)
+        else:
+            self._responseToolbar.setVisible(preview)
         
     def _sendRequest(self):
         try:
-            request_string = self._requestArea.getText()
+            request_string = self.getRequestText()
             if not request_string:
                 JOptionPane.showMessageDialog(self, "Request is empty")
                 return
@@ -235,14 +394,14 @@ class RequestPanel(JPanel):
                 
             httpService = self._helpers.buildHttpService(host, port, useHttps)
             
-            self._responseArea.setText("Sending request...")
+            self.setResponse("Sending request...")
             
             thread = threading.Thread(target=self._executeRequest, args=[httpService, request_bytes])
             thread.daemon = True
             thread.start()
             
         except Exception as e:
-            self._responseArea.setText("Error sending request: " + str(e))
+            self.setResponse("Error sending request: " + str(e))
             import traceback
             traceback.print_exc(file=sys.stdout)
     
@@ -253,13 +412,22 @@ class RequestPanel(JPanel):
             if response and response.getResponse():
                 response_bytes = response.getResponse()
                 response_string = self._helpers.bytesToString(response_bytes)
-                self._responseArea.setText(response_string)
+                onEdt(lambda: self.setResponse(response_string))
             else:
-                self._responseArea.setText("No response received")
+                onEdt(lambda: self.setResponse("No response received"))
         except Exception as e:
-            self._responseArea.setText("Error executing request: " + str(e))
+            error = "Error executing request: " + str(e)
+            onEdt(lambda: self.setResponse(error))
+
+def onEdt(func):
+    if SwingUtilities.isEventDispatchThread():
+        func()
+    else:
+        SwingUtilities.invokeLater(func)
 
 class AIResultPanel(JPanel):
+    FLUSH_MS = 50
+    
     def __init__(self):
         self.setLayout(BorderLayout())
         self.setBorder(BorderFactory.createEmptyBorder(5, 5, 5, 5))
@@ -287,15 +455,57 @@ class AIResultPanel(JPanel):
         buttonPanel.add(clearResultButton)
         
         self.add(buttonPanel, BorderLayout.SOUTH)
+        
+        # Workers queue chunks here; the timer appends them to the document on the EDT.
+        self._pending = []
+        self._pendingLock = threading.Lock()
+        self._flushTimer = Timer(self.FLUSH_MS, lambda event: self._flush())
+        self._flushTimer.setCoalesce(True)
     
     def setText(self, text):
-        self._resultArea.setText(text)
-        self._resultArea.setCaretPosition(0)
+        def update():
+            self._resultArea.setText(text)
+            self._resultArea.setCaretPosition(0)
+        onEdt(update)
     
     def appendText(self, text):
-        current = self._resultArea.getText()
-        self._resultArea.setText(current + text)
-        self._resultArea.setCaretPosition(self._resultArea.getDocument().getLength())
+        def update():
+            document = self._resultArea.getDocument()
+            document.insertString(document.getLength(), text, None)
+            self._resultArea.setCaretPosition(document.getLength())
+        onEdt(update)
+    
+    def beginStream(self, header=""):
+        with self._pendingLock:
+            self._pending = []
+        self.setText(header)
+        onEdt(self._flushTimer.start)
+    
+    def appendChunk(self, text):
+        """Safe from any thread; the text shows up on the next timer tick."""
+        with self._pendingLock:
+            self._pending.append(text)
+    
+    def endStream(self, text=None):
+        """Flush what is left, or replace the streamed text with the final text."""
+        def finish():
+            self._flushTimer.stop()
+            if text is None:
+                self._flush()
+            else:
+                with self._pendingLock:
+                    self._pending = []
+                self._resultArea.setText(text)
+                self._resultArea.setCaretPosition(0)
+        onEdt(finish)
+    
+    def _flush(self):
+        with self._pendingLock:
+            chunks, self._pending = self._pending, []
+        if chunks:
+            document = self._resultArea.getDocument()
+            document.insertString(document.getLength(), "".join(chunks), None)
+            self._resultArea.setCaretPosition(document.getLength())
     
     def _copyToClipboard(self):
         from java.awt.datatransfer import StringSelection
@@ -319,6 +529,864 @@ class AIResultPanel(JPanel):
             except Exception as e:
                 JOptionPane.showMessageDialog(self, "Error saving file: " + str(e))
 
+class BatchTableModel(AbstractTableModel):
+    COLUMNS = ["#", "Method", "Host", "Path", "Status", "Job", "Time (s)", "Result Size", "Summary"]
+    CLASSES = [Integer, String, String, String, Integer, String, Double, Integer, String]
+    KEYS = ["id", "method", "host", "path", "status", "job", "duration", "size", "summary"]
+    
+    def __init__(self):
+        self.rows = []
+    
+    def getRowCount(self):
+        return len(self.rows)
+    
+    def getColumnCount(self):
+        return len(self.COLUMNS)
+    
+    def getColumnName(self, column):
+        return self.COLUMNS[column]
+    
+    def getColumnClass(self, column):
+        return self.CLASSES[column]
+    
+    def getValueAt(self, row, column):
+        return self.rows[row][self.KEYS[column]]
+    
+    def isCellEditable(self, row, column):
+        return False
+
+class BatchPanel(JPanel):
+    REFRESH_MS = 250
+    MAX_ROWS = None
+    
+    def __init__(self, helpers, tabManager):
+        self.setLayout(BorderLayout())
+        self._helpers = helpers
+        self._tabManager = tabManager
+        self._progress = BatchProgress()
+        self._jobs = []
+        self._lock = threading.Lock()
+        self._pendingRows = []
+        self._dirty = False
+        self._nextId = 1
+        
+        topPanel = JPanel(BorderLayout())
+        topPanel.setBorder(BorderFactory.createTitledBorder("Batch Prompt"))
+        
+        self._promptField = JTextField(DEFAULT_CUSTOM_PROMPT)
+        topPanel.add(self._promptField, BorderLayout.CENTER)
+        
+        controls = JPanel(FlowLayout(FlowLayout.LEFT))
+        self._requestCheck = JCheckBox("Include Request", True)
+        self._responseCheck = JCheckBox("Include Response", True)
+        controls.add(self._requestCheck)
+        controls.add(self._responseCheck)
+        
+        self._forceRefreshCheck = JCheckBox("Force refresh", False)
+        controls.add(self._forceRefreshCheck)
+        
+        cancelButton = JButton("Cancel Batch")
+        cancelButton.addActionListener(lambda x: self.cancelAll())
+        controls.add(cancelButton)
+        
+        clearButton = JButton("Clear")
+        clearButton.addActionListener(lambda x: self.clear())
+        controls.add(clearButton)
+        
+        self._progressBar = JProgressBar(0, 1)
+        self._progressBar.setStringPainted(True)
+        controls.add(self._progressBar)
+        
+        self._progressLabel = JLabel("No batch running")
+        controls.add(self._progressLabel)
+        topPanel.add(controls, BorderLayout.SOUTH)
+        
+        self.add(topPanel, BorderLayout.NORTH)
+        self._topPanel = topPanel
+        
+        self._model = BatchTableModel()
+        self._table = JTable(self._model)
+        self._table.setAutoCreateRowSorter(True)
+        self._table.setSelectionMode(ListSelectionModel.SINGLE_SELECTION)
+        self._table.getSelectionModel().addListSelectionListener(lambda event: self._showSelected())
+        
+        self._detailArea = JTextArea()
+        self._detailArea.setEditable(False)
+        self._detailArea.setFont(Font("Monospaced", Font.PLAIN, 12))
+        
+        splitPane = JSplitPane(JSplitPane.VERTICAL_SPLIT, JScrollPane(self._table), JScrollPane(self._detailArea))
+        splitPane.setResizeWeight(0.6)
+        self.add(splitPane, BorderLayout.CENTER)
+        
+        # Workers only mark rows dirty; the table is repainted at most every REFRESH_MS.
+        self._timer = Timer(self.REFRESH_MS, lambda event: self._refresh())
+        self._timer.start()
+    
+    def stopRefresh(self):
+        self._timer.stop()
+    
+    def addMessages(self, messages):
+        customPrompt = self._promptField.getText().strip()
+        includeRequest = self._requestCheck.isSelected()
+        includeResponse = self._responseCheck.isSelected()
+        forceRefresh = self._forceRefreshCheck.isSelected()
+        messages = list(messages)
+        self._progress.add(len(messages))
+        
+        thread = threading.Thread(target=self._intake, args=[messages, customPrompt, includeRequest, includeResponse, forceRefresh])
+        thread.daemon = True
+        thread.start()
+    
+    def _intake(self, messages, customPrompt, includeRequest, includeResponse, forceRefresh):
+        for message in messages:
+            self._queueMessage(message, customPrompt, includeRequest, includeResponse, forceRefresh, PRIORITY_BATCH, "Batch")
+    
+    def _queueMessage(self, message, customPrompt, includeRequest, includeResponse, forceRefresh, priority, label):
+        row = self._describe(message)
+        with self._lock:
+            self._pendingRows.append(row)
+        
+        def traffic():
+            request = message.getRequest()
+            response = message.getResponse()
+            return (
+                self._helpers.bytesToString(request) if includeRequest and request else None,
+                self._helpers.bytesToString(response) if includeResponse and response else None
+            )
+        
+        def onStatus(job):
+            self._updateRow(row, job)
+        
+        job = self._tabManager.queueAnalysis(customPrompt, traffic, NullResultView(), priority, onStatus,
+                                             label + " #" + str(row["id"]), (includeRequest, includeResponse), forceRefresh)
+        with self._lock:
+            self._jobs.append(job)
+        return job
+    
+    def _describe(self, message):
+        with self._lock:
+            rowId = self._nextId
+            self._nextId += 1
+        row = {"id": rowId, "method": "", "host": "", "path": "", "status": 0, "job": "queued",
+               "duration": 0.0, "size": 0, "summary": "", "result": "", "started": None}
+        try:
+            info = self._helpers.analyzeRequest(message)
+            url = info.getUrl()
+            row["method"] = info.getMethod()
+            row["host"] = url.getHost()
+            row["path"] = url.getFile()
+            if message.getResponse():
+                row["status"] = self._helpers.analyzeResponse(message.getResponse()).getStatusCode()
+        except Exception as e:
+            safe_print("Could not parse batch item: " + str(e))
+        return row
+    
+    def _updateRow(self, row, job):
+        if job.status == JOB_RUNNING:
+            row["started"] = time.time()
+        elif not job.is_active():
+            if row["started"]:
+                row["duration"] = round(time.time() - row["started"], 2)
+            result = job.result or (str(job.error) if job.error else "")
+            row["result"] = result
+            row["size"] = len(result)
+            lines = [line.strip() for line in result.splitlines() if line.strip()]
+            row["summary"] = lines[0][:120] if lines else ""
+            self._progress.record(job.status)
+        row["job"] = jobStatusText(job)
+        self._dirty = True
+    
+    def _refresh(self):
+        with self._lock:
+            newRows, self._pendingRows = self._pendingRows, []
+        if newRows:
+            first = len(self._model.rows)
+            self._model.rows.extend(newRows)
+            self._model.fireTableRowsInserted(first, len(self._model.rows) - 1)
+            if self.MAX_ROWS and len(self._model.rows) > self.MAX_ROWS:
+                excess = len(self._model.rows) - self.MAX_ROWS
+                del self._model.rows[:excess]
+                self._model.fireTableRowsDeleted(0, excess - 1)
+                with self._lock:
+                    self._jobs = [job for job in self._jobs if job.is_active()]
+        if self._dirty:
+            self._dirty = False
+            if self._model.rows:
+                self._model.fireTableRowsUpdated(0, len(self._model.rows) - 1)
+            self._showSelected()
+        if self._progress.total:
+            self._progressBar.setMaximum(self._progress.total)
+            self._progressBar.setValue(self._progress.finished())
+            self._progressLabel.setText(self._progress.summary())
+    
+    def _showSelected(self):
+        viewRow = self._table.getSelectedRow()
+        if viewRow < 0:
+            return
+        row = self._model.rows[self._table.convertRowIndexToModel(viewRow)]
+        text = row["result"] or "Status: " + row["job"]
+        if self._detailArea.getText() != text:
+            self._detailArea.setText(text)
+            self._detailArea.setCaretPosition(0)
+    
+    def cancelAll(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            if job.is_active():
+                self._tabManager.cancelJob(job)
+    
+    def clear(self):
+        self.cancelAll()
+        with self._lock:
+            self._jobs = []
+            self._pendingRows = []
+        self._model.rows = []
+        self._model.fireTableDataChanged()
+        self._detailArea.setText("")
+        self._progress = BatchProgress()
+        self._progressBar.setValue(0)
+        self._progressLabel.setText("No batch running")
+
+class PassivePanel(BatchPanel):
+    MAX_ROWS = 1000
+    
+    def __init__(self, helpers, tabManager, onApply):
+        BatchPanel.__init__(self, helpers, tabManager)
+        self._onApply = onApply
+        self._intakeQueue = None
+        self._topPanel.setBorder(BorderFactory.createTitledBorder("Passive Prompt"))
+        self._promptField.setText("Identify security issues in this HTTP traffic. Answer 'No findings.' if there are none.")
+        
+        settingsPanel = JPanel(BorderLayout())
+        settingsPanel.setBorder(BorderFactory.createTitledBorder("Passive Analysis of In-Scope Proxy Traffic"))
+        
+        fields = JPanel(GridLayout(2, 4, 10, 4))
+        self._enabledCheck = JCheckBox("Analyze in-scope responses automatically", False)
+        fields.add(self._enabledCheck)
+        self._mimeField = self._addField(fields, "MIME Types:", PASSIVE_DEFAULT_MIME_TYPES,
+                                         "Burp MIME types to analyze, e.g. HTML, JSON, script, XML; * for all")
+        self._statusField = self._addField(fields, "Status Codes:", PASSIVE_DEFAULT_STATUS, "e.g. 200-299, 400-599")
+        self._hostsField = self._addField(fields, "Hosts:", "", "Host patterns such as *.example.com; empty for all in-scope hosts")
+        self._rateField = self._addField(fields, "Per Host / Min:", "6", "Most analyses started per host per minute; 0 for no limit")
+        self._sampleField = self._addField(fields, "Sample %:", "100", "Share of matching responses that are analyzed")
+        self._queueSizeField = self._addField(fields, "Queue Size:", "50", "Waiting responses kept; the oldest is dropped when full")
+        self._inflightField = self._addField(fields, "Concurrent:", "1", "Passive analyses running at once")
+        settingsPanel.add(fields, BorderLayout.CENTER)
+        
+        applyPanel = JPanel(FlowLayout(FlowLayout.LEFT))
+        applyButton = JButton("Apply")
+        applyButton.addActionListener(lambda x: self._apply())
+        applyPanel.add(applyButton)
+        self._intakeLabel = JLabel("Passive analysis off")
+        applyPanel.add(self._intakeLabel)
+        settingsPanel.add(applyPanel, BorderLayout.SOUTH)
+        
+        self.remove(self._topPanel)
+        northPanel = JPanel(BorderLayout())
+        northPanel.add(settingsPanel, BorderLayout.NORTH)
+        northPanel.add(self._topPanel, BorderLayout.CENTER)
+        self.add(northPanel, BorderLayout.NORTH)
+    
+    def _addField(self, container, label, value, tooltip):
+        panel = JPanel(BorderLayout())
+        panel.add(JLabel(label), BorderLayout.WEST)
+        field = JTextField(value, 10)
+        field.setToolTipText(tooltip)
+        panel.add(field, BorderLayout.CENTER)
+        container.add(panel)
+        return field
+    
+    def setIntake(self, intakeQueue, config):
+        self._intakeQueue = intakeQueue
+        self._enabledCheck.setSelected(bool(config.get("passive_enabled", False)))
+        self._mimeField.setText(config.get("passive_mime_types", PASSIVE_DEFAULT_MIME_TYPES))
+        self._statusField.setText(config.get("passive_status", PASSIVE_DEFAULT_STATUS))
+        self._hostsField.setText(config.get("passive_hosts", ""))
+        self._rateField.setText(str(config.get("passive_rate_per_minute", 6)))
+        self._sampleField.setText(str(config.get("passive_sample_percent", 100)))
+        self._queueSizeField.setText(str(config.get("passive_queue_size", 50)))
+        self._inflightField.setText(str(config.get("passive_inflight", 1)))
+        if config.get("passive_prompt"):
+            self._promptField.setText(config["passive_prompt"])
+    
+    def _apply(self):
+        try:
+            self._onApply({
+                "passive_enabled": bool(self._enabledCheck.isSelected()),
+                "passive_mime_types": self._mimeField.getText().strip(),
+                "passive_status": self._statusField.getText().strip(),
+                "passive_hosts": self._hostsField.getText().strip(),
+                "passive_rate_per_minute": max(0, float(self._rateField.getText().strip() or 0)),
+                "passive_sample_percent": max(0, min(100, float(self._sampleField.getText().strip() or 100))),
+                "passive_queue_size": max(1, int(self._queueSizeField.getText().strip() or 50)),
+                "passive_inflight": max(1, int(self._inflightField.getText().strip() or 1)),
+                "passive_prompt": self._promptField.getText().strip()
+            })
+        except ValueError as e:
+            JOptionPane.showMessageDialog(self, "Invalid passive setting: " + str(e))
+    
+    def queuePassive(self, message, info):
+        # Runs on the intake thread, never on the proxy thread.
+        return self._queueMessage(message, self._promptField.getText().strip(), self._requestCheck.isSelected(),
+                                  self._responseCheck.isSelected(), False, PRIORITY_BACKGROUND, "Passive")
+    
+    def _refresh(self):
+        BatchPanel._refresh(self)
+        if self._intakeQueue:
+            self._intakeLabel.setText(self._intakeQueue.summary() if self._intakeQueue.enabled else "Passive analysis off")
+    
+    def _describe(self, message):
+        self._progress.add(1)
+        return BatchPanel._describe(self, message)
+
+class HistoryTableModel(AbstractTableModel):
+    COLUMNS = [
+        ("Time", String, "timestamp"), ("Host", String, "host"), ("Method", String, "method"), ("Path", String, "path"),
+        ("Status", Integer, "status"), ("Model", String, "model"), ("Summary", String, "summary")
+    ]
+    
+    def __init__(self):
+        self.rows = []
+    
+    def getRowCount(self):
+        return len(self.rows)
+    
+    def getColumnCount(self):
+        return len(self.COLUMNS)
+    
+    def getColumnName(self, column):
+        return self.COLUMNS[column][0]
+    
+    def getColumnClass(self, column):
+        return self.COLUMNS[column][1]
+    
+    def getValueAt(self, row, column):
+        value = self.rows[row].get(self.COLUMNS[column][2])
+        if column == 0 and value:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(value))
+        return value
+
+class HistoryPanel(JPanel):
+    def __init__(self, tabManager):
+        self.setLayout(BorderLayout())
+        self._tabManager = tabManager
+        self._query = ""
+        self._offset = 0
+        self._total = 0
+        self._searchId = 0
+        
+        searchPanel = JPanel(BorderLayout())
+        searchPanel.setBorder(BorderFactory.createTitledBorder("Search History"))
+        self._searchField = JTextField()
+        self._searchField.setToolTipText("Words must all match (word* for a prefix); filter with host:, path:, model:, method:, status:")
+        self._searchField.addActionListener(lambda x: self.search())
+        searchPanel.add(self._searchField, BorderLayout.CENTER)
+        
+        controls = JPanel(FlowLayout(FlowLayout.LEFT))
+        searchButton = JButton("Search")
+        searchButton.addActionListener(lambda x: self.search())
+        controls.add(searchButton)
+        self._prevButton = JButton("< Prev")
+        self._prevButton.addActionListener(lambda x: self._page(-1))
+        controls.add(self._prevButton)
+        self._nextButton = JButton("Next >")
+        self._nextButton.addActionListener(lambda x: self._page(1))
+        controls.add(self._nextButton)
+        self._pageLabel = JLabel("")
+        controls.add(self._pageLabel)
+        clearButton = JButton("Delete History")
+        clearButton.addActionListener(lambda x: self._clear())
+        controls.add(clearButton)
+        searchPanel.add(controls, BorderLayout.SOUTH)
+        self.add(searchPanel, BorderLayout.NORTH)
+        
+        self._model = HistoryTableModel()
+        self._table = JTable(self._model)
+        self._table.setAutoCreateRowSorter(True)
+        self._table.setSelectionMode(ListSelectionModel.SINGLE_SELECTION)
+        self._table.getSelectionModel().addListSelectionListener(lambda event: self._showSelected(event))
+        
+        self._detailArea = JTextArea()
+        self._detailArea.setEditable(False)
+        self._detailArea.setLineWrap(True)
+        self._detailArea.setWrapStyleWord(True)
+        
+        splitPane = JSplitPane(JSplitPane.VERTICAL_SPLIT, JScrollPane(self._table), JScrollPane(self._detailArea))
+        splitPane.setResizeWeight(0.5)
+        self.add(splitPane, BorderLayout.CENTER)
+    
+    def search(self):
+        self._query = self._searchField.getText().strip()
+        self._offset = 0
+        self._load()
+    
+    def refresh(self):
+        self._load()
+    
+    def _page(self, direction):
+        offset = self._offset + direction * HISTORY_PAGE_SIZE
+        if 0 <= offset < self._total:
+            self._offset = offset
+            self._load()
+    
+    def _load(self):
+        history = self._tabManager.getHistory()
+        if history is None:
+            self._pageLabel.setText("History is off")
+            return
+        self._searchId += 1
+        searchId, query, offset = self._searchId, self._query, self._offset
+        self._pageLabel.setText("Searching..." if history.ready() else "Loading history index...")
+        
+        def run():
+            try:
+                total, rows = history.search(query, offset, HISTORY_PAGE_SIZE)
+            except Exception as e:
+                safe_print("History search failed: " + str(e))
+                total, rows = 0, []
+            SwingUtilities.invokeLater(lambda: self._showPage(searchId, total, rows))
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    
+    def _showPage(self, searchId, total, rows):
+        if searchId != self._searchId:
+            return
+        self._total = total
+        self._model.rows = rows
+        self._model.fireTableDataChanged()
+        self._detailArea.setText("")
+        if total:
+            self._pageLabel.setText("%d-%d of %d" % (self._offset + 1, self._offset + len(rows), total))
+        else:
+            self._pageLabel.setText("No matches")
+        self._prevButton.setEnabled(self._offset > 0)
+        self._nextButton.setEnabled(self._offset + len(rows) < total)
+    
+    def _showSelected(self, event):
+        if event.getValueIsAdjusting():
+            return
+        viewRow = self._table.getSelectedRow()
+        history = self._tabManager.getHistory()
+        if viewRow < 0 or history is None:
+            return
+        row = self._model.rows[self._table.convertRowIndexToModel(viewRow)]
+        try:
+            record = history.get(row["id"])
+        except Exception as e:
+            self._detailArea.setText("Could not read record: " + str(e))
+            return
+        metrics = record.get("metrics") or {}
+        lines = [
+            "Time: " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.get("timestamp") or 0)),
+            "Request: " + " ".join(str(record.get(key) or "") for key in ("method", "host", "path")),
+            "Model: " + str(record.get("model")) + " (" + str(record.get("backend")) + ")"
+            + (", reused from a near-duplicate" if record.get("duplicate") else ""),
+            "Total: %.2fs, TTFT: %s, output tokens: %s" % (
+                metrics.get("total") or 0,
+                "%.2fs" % metrics["ttft"] if metrics.get("ttft") is not None else "-",
+                metrics.get("output_tokens")),
+            "Traffic hash: " + str(record.get("traffic_hash")),
+            "Custom prompt: " + (record.get("custom_prompt") or "(none)"),
+            "",
+            record.get("output") or ""
+        ]
+        self._detailArea.setText("\n".join(lines))
+        self._detailArea.setCaretPosition(0)
+    
+    def _clear(self):
+        history = self._tabManager.getHistory()
+        if history is None:
+            return
+        if JOptionPane.showConfirmDialog(self, "Delete all " + str(len(history)) + " saved analyses?", "Delete History",
+                                         JOptionPane.YES_NO_OPTION) == JOptionPane.YES_OPTION:
+            history.clear()
+            self.search()
+
+class ModelCellRenderer(DefaultListCellRenderer):
+    """Shows size and quantization next to each discovered model; the item itself stays the plain name."""
+    def __init__(self, details):
+        self._details = details
+    
+    def getListCellRendererComponent(self, jlist, value, index, isSelected, cellHasFocus):
+        component = DefaultListCellRenderer.getListCellRendererComponent(self, jlist, value, index, isSelected, cellHasFocus)
+        detail = self._details.get(str(value)) if value is not None else None
+        if detail and index >= 0:
+            component.setText(str(value) + "   (" + detail + ")")
+        return component
+
+class StatsTableModel(AbstractTableModel):
+    COLUMNS = [
+        ("Model", String, None), ("Runs", Integer, "runs"), ("Cache Hits", Integer, "cache_hits"),
+        ("Duplicates", Integer, "duplicates"), ("Failed", Integer, "failed"), ("Total p50 (s)", Double, "total_p50"), ("Total p95 (s)", Double, "total_p95"),
+        ("TTFT p50 (s)", Double, "ttft_p50"), ("TTFT p95 (s)", Double, "ttft_p95"),
+        ("Tok/s p50", Double, "tokens_per_sec_p50"), ("Tok/s p95", Double, "tokens_per_sec_p95"),
+        ("Queue p50 (s)", Double, "queue_wait_p50"), ("Prompt Eval p50 (s)", Double, "prompt_eval_duration_p50"),
+        ("Avg Input KB", Double, "avg_input_bytes"), ("Avg Output Tokens", Integer, "avg_output_tokens")
+    ]
+    
+    def __init__(self):
+        self.rows = []
+    
+    def setSummary(self, summary):
+        self.rows = []
+        for model, stats in summary.items():
+            row = [model]
+            for _, cls, key in self.COLUMNS[1:]:
+                value = stats.get(key)
+                if key == "avg_input_bytes":
+                    value = round(value / 1024.0, 1)
+                elif isinstance(value, float):
+                    value = round(value, 3)
+                row.append(value)
+            self.rows.append(row)
+        self.fireTableDataChanged()
+    
+    def getRowCount(self):
+        return len(self.rows)
+    
+    def getColumnCount(self):
+        return len(self.COLUMNS)
+    
+    def getColumnName(self, column):
+        return self.COLUMNS[column][0]
+    
+    def getColumnClass(self, column):
+        return self.COLUMNS[column][1]
+    
+    def getValueAt(self, row, column):
+        return self.rows[row][column]
+
+class StatsPanel(JPanel):
+    REFRESH_MS = 2000
+    
+    def __init__(self, metrics):
+        self.setLayout(BorderLayout())
+        self._metrics = metrics
+        
+        self._model = StatsTableModel()
+        table = JTable(self._model)
+        table.setAutoCreateRowSorter(True)
+        self.add(JScrollPane(table), BorderLayout.CENTER)
+        
+        buttonPanel = JPanel(FlowLayout(FlowLayout.LEFT))
+        
+        refreshButton = JButton("Refresh")
+        refreshButton.addActionListener(lambda x: self.refresh())
+        buttonPanel.add(refreshButton)
+        
+        exportButton = JButton("Export JSONL")
+        exportButton.setToolTipText("Save every recorded analysis with its timings, one JSON object per line")
+        exportButton.addActionListener(lambda x: self._export())
+        buttonPanel.add(exportButton)
+        
+        clearButton = JButton("Clear")
+        clearButton.addActionListener(lambda x: self._clear())
+        buttonPanel.add(clearButton)
+        
+        self._countLabel = JLabel("")
+        buttonPanel.add(self._countLabel)
+        
+        self.add(buttonPanel, BorderLayout.NORTH)
+        
+        self._timer = Timer(self.REFRESH_MS, lambda event: self._refreshIfVisible())
+        self._timer.start()
+    
+    def stopRefresh(self):
+        self._timer.stop()
+    
+    def _refreshIfVisible(self):
+        if self.isShowing():
+            self.refresh()
+    
+    def refresh(self):
+        self._model.setSummary(self._metrics.summary_by_model())
+        text = str(len(self._metrics.snapshot())) + " analyses recorded"
+        cascade = self._metrics.cascade_summary()
+        if cascade:
+            text += "   |   Triage: %d of %d escalated (%.0f%%)" % (
+                cascade["escalated"], cascade["triaged"], 100 * cascade["escalation_rate"])
+            if cascade["time_saved"] is not None:
+                text += ", about " + format_duration(cascade["time_saved"]) + " of model time saved"
+        self._countLabel.setText(text)
+    
+    def _clear(self):
+        self._metrics.clear()
+        self.refresh()
+    
+    def _export(self):
+        from javax.swing import JFileChooser
+        
+        fileChooser = JFileChooser()
+        if fileChooser.showSaveDialog(self) == JFileChooser.APPROVE_OPTION:
+            path = fileChooser.getSelectedFile().getAbsolutePath()
+            try:
+                count = self._metrics.export_jsonl(path)
+                JOptionPane.showMessageDialog(self, "Exported " + str(count) + " analyses to " + path)
+            except Exception as e:
+                JOptionPane.showMessageDialog(self, "Error exporting metrics: " + str(e))
+
+class FindingsTableModel(AbstractTableModel):
+    COLUMNS = [
+        ("Severity", String, "severity"), ("Title", String, "title"), ("Host", String, "host"), ("Path", String, "path"),
+        ("Parameter", String, "parameter"), ("Location", String, "location"), ("Seen", Integer, "count"),
+        ("Model", String, "model"), ("Last Seen", String, "last_seen")
+    ]
+    
+    def __init__(self):
+        self.rows = []
+    
+    def getRowCount(self):
+        return len(self.rows)
+    
+    def getColumnCount(self):
+        return len(self.COLUMNS)
+    
+    def getColumnName(self, column):
+        return self.COLUMNS[column][0]
+    
+    def getColumnClass(self, column):
+        return self.COLUMNS[column][1]
+    
+    def getValueAt(self, row, column):
+        value = self.rows[row].get(self.COLUMNS[column][2])
+        if self.COLUMNS[column][2] == "last_seen" and value:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(value))
+        return value
+
+class FindingsPanel(JPanel):
+    REFRESH_MS = 1000
+    
+    def __init__(self, findings):
+        self.setLayout(BorderLayout())
+        self._findings = findings
+        self._version = -1
+        
+        buttonPanel = JPanel(FlowLayout(FlowLayout.LEFT))
+        
+        exportButton = JButton("Export JSONL")
+        exportButton.setToolTipText("Save every finding with its host, path and times seen, one JSON object per line")
+        exportButton.addActionListener(lambda x: self._export())
+        buttonPanel.add(exportButton)
+        
+        clearButton = JButton("Clear")
+        clearButton.addActionListener(lambda x: self._clear())
+        buttonPanel.add(clearButton)
+        
+        self._countLabel = JLabel("")
+        buttonPanel.add(self._countLabel)
+        
+        self.add(buttonPanel, BorderLayout.NORTH)
+        
+        self._model = FindingsTableModel()
+        self._table = JTable(self._model)
+        self._table.setAutoCreateRowSorter(True)
+        self._table.setSelectionMode(ListSelectionModel.SINGLE_SELECTION)
+        self._table.getSelectionModel().addListSelectionListener(lambda event: self._showSelected(event))
+        
+        self._detailArea = JTextArea()
+        self._detailArea.setEditable(False)
+        self._detailArea.setLineWrap(True)
+        self._detailArea.setWrapStyleWord(True)
+        
+        splitPane = JSplitPane(JSplitPane.VERTICAL_SPLIT, JScrollPane(self._table), JScrollPane(self._detailArea))
+        splitPane.setResizeWeight(0.7)
+        self.add(splitPane, BorderLayout.CENTER)
+        
+        # Findings arrive while analyses stream; poll the store's version rather than copy rows every tick.
+        self._timer = Timer(self.REFRESH_MS, lambda event: self._refreshIfChanged())
+        self._timer.start()
+    
+    def stopRefresh(self):
+        self._timer.stop()
+    
+    def _refreshIfChanged(self):
+        if self.isShowing() and self._findings.version != self._version:
+            self.refresh()
+    
+    def refresh(self):
+        self._version = self._findings.version
+        selected = self._selectedRow()
+        rows = self._findings.rows()
+        rows.sort(key=lambda row: (SEVERITIES.index(row["severity"]), -row["last_seen"]))
+        self._model.rows = rows
+        self._model.fireTableDataChanged()
+        self._countLabel.setText(str(len(rows)) + " distinct findings")
+        if selected:
+            for index, row in enumerate(rows):
+                if row["id"] == selected["id"]:
+                    viewRow = self._table.convertRowIndexToView(index)
+                    self._table.setRowSelectionInterval(viewRow, viewRow)
+                    break
+    
+    def _selectedRow(self):
+        viewRow = self._table.getSelectedRow()
+        if viewRow < 0:
+            return None
+        return self._model.rows[self._table.convertRowIndexToModel(viewRow)]
+    
+    def _showSelected(self, event):
+        if event.getValueIsAdjusting():
+            return
+        row = self._selectedRow()
+        if row is None:
+            return
+        lines = [
+            "[" + row["severity"] + "] " + (row["title"] or "Untitled"),
+            "Host: " + row["host"] + "   Path: " + row["path"],
+            "Location: " + (row["location"] or "-") + "   Parameter: " + (row["parameter"] or "-"),
+            "Seen in " + str(row["count"]) + " analyses, first " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["first_seen"]))
+            + ", model " + str(row["model"]),
+            "",
+            "Evidence:",
+            row["evidence"] or "(none)"
+        ]
+        self._detailArea.setText("\n".join(lines))
+        self._detailArea.setCaretPosition(0)
+    
+    def _clear(self):
+        self._findings.clear()
+        self._detailArea.setText("")
+        self.refresh()
+    
+    def _export(self):
+        from javax.swing import JFileChooser
+        
+        fileChooser = JFileChooser()
+        if fileChooser.showSaveDialog(self) == JFileChooser.APPROVE_OPTION:
+            path = fileChooser.getSelectedFile().getAbsolutePath()
+            try:
+                count = self._findings.export_jsonl(path)
+                JOptionPane.showMessageDialog(self, "Exported " + str(count) + " findings to " + path)
+            except Exception as e:
+                JOptionPane.showMessageDialog(self, "Error exporting findings: " + str(e))
+
+class ComparePanel(JPanel):
+    REFRESH_MS = 500
+    
+    def __init__(self, tabManager, config):
+        self.setLayout(BorderLayout())
+        self._tabManager = tabManager
+        self._comparison = None
+        self._panes = {}
+        
+        topPanel = JPanel(BorderLayout())
+        topPanel.setBorder(BorderFactory.createTitledBorder("Models to Compare"))
+        
+        self._modelList = JList([])
+        self._modelList.setSelectionMode(ListSelectionModel.MULTIPLE_INTERVAL_SELECTION)
+        self._modelList.setVisibleRowCount(4)
+        self._modelList.setLayoutOrientation(JList.HORIZONTAL_WRAP)
+        topPanel.add(JScrollPane(self._modelList), BorderLayout.CENTER)
+        
+        controls = JPanel(FlowLayout(FlowLayout.LEFT))
+        controls.add(JLabel("At Once:"))
+        self._parallelField = JTextField(str(config.get("compare_parallel", 2)), 3)
+        self._parallelField.setToolTipText("How many of the selected models run at the same time; 0 runs them all at once")
+        controls.add(self._parallelField)
+        self._earlyStopCheck = JCheckBox("Stop the others when one finishes", bool(config.get("compare_early_stop", False)))
+        controls.add(self._earlyStopCheck)
+        self._cancelButton = JButton("Cancel")
+        self._cancelButton.setEnabled(False)
+        self._cancelButton.addActionListener(lambda x: self._comparison.cancel() if self._comparison else None)
+        controls.add(self._cancelButton)
+        self._statusLabel = JLabel("Select models, then use Compare Models on a request tab.")
+        controls.add(self._statusLabel)
+        topPanel.add(controls, BorderLayout.SOUTH)
+        
+        self.add(topPanel, BorderLayout.NORTH)
+        
+        self._paneContainer = JPanel(GridLayout(1, 1, 5, 0))
+        self.add(self._paneContainer, BorderLayout.CENTER)
+        
+        self._timer = Timer(self.REFRESH_MS, lambda event: self._refreshIfVisible())
+        self._timer.start()
+    
+    def stopRefresh(self):
+        self._timer.stop()
+    
+    def setModels(self, names):
+        selected = set(self.selectedModels())
+        self._modelList.setListData(names)
+        self._modelList.setSelectedIndices([i for i, name in enumerate(names) if name in selected])
+    
+    def selectedModels(self):
+        return [str(name) for name in self._modelList.getSelectedValuesList()]
+    
+    def compare(self, title, custom_prompt, traffic, include):
+        models = self.selectedModels()
+        if len(models) < 2:
+            JOptionPane.showMessageDialog(self, "Select at least two models in the Compare tab.")
+            return
+        if self._comparison is not None and self._comparison.is_active():
+            JOptionPane.showMessageDialog(self, "A comparison is still running. Cancel it or wait.")
+            return
+        try:
+            parallel = max(0, int(self._parallelField.getText().strip() or 0))
+        except ValueError:
+            parallel = 0
+        
+        self._paneContainer.removeAll()
+        self._paneContainer.setLayout(GridLayout(1, len(models), 5, 0))
+        self._panes = {}
+        for model in models:
+            pane = ComparePane(model, lambda model=model: self._choose(model))
+            self._panes[model] = pane
+            self._paneContainer.add(pane)
+        self._paneContainer.revalidate()
+        self._paneContainer.repaint()
+        
+        views = dict((model, pane.getResultPanel()) for model, pane in self._panes.items())
+        self._comparison = self._tabManager.compareModels(title, custom_prompt, traffic, include, models, views,
+                                                          parallel, self._earlyStopCheck.isSelected())
+        self._cancelButton.setEnabled(True)
+        self.refresh()
+    
+    def _choose(self, model):
+        if self._comparison is not None:
+            self._comparison.choose(model)
+            self.refresh()
+    
+    def _refreshIfVisible(self):
+        if self.isShowing() and self._comparison is not None:
+            self.refresh()
+    
+    def refresh(self):
+        comparison = self._comparison
+        if comparison is None:
+            return
+        for model, pane in self._panes.items():
+            pane.setStats(comparison.describe(model), comparison.chosen is None and comparison.is_active())
+        active = comparison.is_active()
+        self._cancelButton.setEnabled(active)
+        self._statusLabel.setText(("Running " if active else "Finished ") + str(len(comparison.models)) + " models"
+                                  + (", chose " + comparison.chosen if comparison.chosen else ""))
+
+class ComparePane(JPanel):
+    def __init__(self, model, onChoose):
+        self.setLayout(BorderLayout())
+        self.setBorder(BorderFactory.createTitledBorder(model))
+        
+        header = JPanel(BorderLayout())
+        self._statsLabel = JLabel(" ")
+        header.add(self._statsLabel, BorderLayout.CENTER)
+        self._chooseButton = JButton("Use This")
+        self._chooseButton.setToolTipText("Keep this result and cancel the models still running")
+        self._chooseButton.addActionListener(lambda x: onChoose())
+        header.add(self._chooseButton, BorderLayout.EAST)
+        self.add(header, BorderLayout.NORTH)
+        
+        self._resultPanel = AIResultPanel()
+        self.add(self._resultPanel, BorderLayout.CENTER)
+    
+    def getResultPanel(self):
+        return self._resultPanel
+    
+    def setStats(self, text, choosable):
+        self._statsLabel.setText(text)
+        self._chooseButton.setEnabled(choosable)
+
 class TabManager:
     def __init__(self, tabbedPane, helpers, callbacks, config):
         self._tabbedPane = tabbedPane
@@ -327,17 +1395,79 @@ class TabManager:
         self._config = config
         self._tabs = [] 
         self._resultPanel = None
-        self._analyzing = False
-        
-        default_system_prompt = (
-            "You are a cybersecurity expert analyzing HTTP traffic. "
-            "Focus on identifying security vulnerabilities, suspicious patterns, "
-            "and potential attack vectors. Provide concise analysis with clear recommendations."
+        self._resultCards = None
+        self._bodies = SpillStore(int(config.get("tab_spill_kb", 64)) * 1024, prefix="ollama_tabs_")
+        self._active = None
+        self._recent = []
+        self._compareHandler = None
+        self._analyzer = Analyzer(config, log=safe_print, message_parser=self._parseMessage)
+        self._queue = AnalysisQueue(
+            workers=config.get("max_parallel", default_parallelism()),
+            ordering=config.get("queue_order", ORDER_FIFO)
         )
-        self._system_prompt = config.get("system_prompt", default_system_prompt)
+        
+        self._tabbedPane.addChangeListener(lambda event: self._showCurrentResult())
     
-    def setResultPanel(self, resultPanel):
+    def setResultPanel(self, resultPanel, resultCards=None):
         self._resultPanel = resultPanel
+        self._resultCards = resultCards
+        if resultCards:
+            resultCards.add(resultPanel, "general")
+    
+    def updateConfig(self, config):
+        self._analyzer.update_config(config)
+        self._config = config
+        self._queue.set_workers(config.get("max_parallel", default_parallelism()))
+        self._queue.set_ordering(config.get("queue_order", ORDER_FIFO))
+    
+    def showMessage(self, text):
+        self._resultPanel.setText(text)
+        if self._resultCards:
+            self._resultCards.getLayout().show(self._resultCards, "general")
+    
+    def getBodyStore(self):
+        return self._bodies
+    
+    def getPreviewChars(self):
+        return int(self._config.get("tab_preview_kb", 256)) * 1024
+    
+    def _activate(self, requestPanel):
+        # Only the selected tab keeps its text in Swing documents.
+        if requestPanel is self._active:
+            return
+        if self._active:
+            self._active.unload()
+        self._active = requestPanel
+        if requestPanel:
+            requestPanel.load()
+            if requestPanel in self._recent:
+                self._recent.remove(requestPanel)
+            self._recent.append(requestPanel)
+    
+    def _enforceTabLimit(self):
+        limit = int(self._config.get("max_tabs", 50))
+        while limit > 0 and len(self._tabs) > limit:
+            idle = [panel for panel in self._recent
+                    if panel is not self._active and not (panel.getJob() and panel.getJob().is_active())]
+            if not idle:
+                return
+            safe_print("Closing least recently used tab " + idle[0].getTitle() + " (limit " + str(limit) + " tabs)")
+            self.closeTab(self._tabs.index(idle[0]))
+    
+    def dispose(self):
+        self._queue.shutdown("extension unloaded")
+        self._analyzer.close()
+        self._bodies.close()
+    
+    def _showCurrentResult(self):
+        requestPanel = self.getCurrentTab()
+        self._activate(requestPanel)
+        if not self._resultCards:
+            return
+        if requestPanel:
+            self._resultCards.getLayout().show(self._resultCards, requestPanel.getCardName())
+        else:
+            self._resultCards.getLayout().show(self._resultCards, "general")
     
     def addTab(self, request="", response=""):
         tabId = len(self._tabs) + 1
@@ -349,6 +1479,9 @@ class TabManager:
         if response:
             requestPanel.setResponse(response)
         
+        if self._resultCards:
+            self._resultCards.add(requestPanel.getResultPanel(), requestPanel.getCardName())
+        
         tabTitle = "Request " + str(tabId)
         
         tabIndex = self._tabbedPane.getTabCount() - 1
@@ -356,22 +1489,42 @@ class TabManager:
         
         tabComponent = TabComponent(self._tabbedPane, tabIndex, tabTitle, self.closeTab)
         self._tabbedPane.setTabComponentAt(tabIndex, tabComponent)
+        requestPanel.setTabComponent(tabComponent)
         
         self._tabs.append(requestPanel)
         
         self._tabbedPane.setSelectedIndex(tabIndex)
+        if request and self._config.get("prefetch_tabs", False):
+            self._prefetch(requestPanel)
+        self._enforceTabLimit()
         
-        return tabId - 1
+        return self._tabs.index(requestPanel)
     
     def closeTab(self, tabIndex):
         if tabIndex < 0 or tabIndex >= len(self._tabs) or tabIndex >= self._tabbedPane.getTabCount() - 1:
             return
         
-        self._tabbedPane.removeTabAt(tabIndex)
-        
+        requestPanel = self._tabs[tabIndex]
+        if requestPanel.getJob():
+            self._queue.cancel(requestPanel.getJob())
+        prefetch = requestPanel.takePrefetch()
+        if prefetch:
+            self._queue.cancel(prefetch[0])
+        if requestPanel is self._active:
+            self._active = None
+        if requestPanel in self._recent:
+            self._recent.remove(requestPanel)
+        requestPanel.dispose()
+        if self._resultCards:
+            self._resultCards.remove(requestPanel.getResultPanel())
+        
+        # Drop the panel first so the selection change during removal activates a live tab.
         self._tabs.pop(tabIndex)
         
+        self._tabbedPane.removeTabAt(tabIndex)
+        
         for i in range(tabIndex, len(self._tabs)):
+            self._tabs[i]._tabIndex = i
             tabComponent = self._tabbedPane.getTabComponentAt(i)
             if tabComponent and isinstance(tabComponent, TabComponent):
                 for component in tabComponent.getComponents():
@@ -390,151 +1543,165 @@ class TabManager:
         return None
     
     def analyzeWithAI(self, tabIndex):
-        if self._analyzing:
-            JOptionPane.showMessageDialog(None, "Analysis already in progress. Please wait.")
-            return
-            
         if tabIndex < 0 or tabIndex >= len(self._tabs):
             return
         
         requestPanel = self._tabs[tabIndex]
         
+        job = requestPanel.getJob()
+        if job and job.is_active():
+            JOptionPane.showMessageDialog(None, "Analysis already " + job.status + " for this tab. Cancel it or wait.")
+            return
+        
         if not requestPanel.getRequestText().strip() and not requestPanel.getResponseText().strip():
             JOptionPane.showMessageDialog(None, "No request or response content to analyze.")
             return
         
-        self._analyzing = True
-        thread = threading.Thread(target=self._analyzeWithAI, args=[requestPanel])
-        thread.daemon = True
-        thread.start()
+        # Snapshot the tab now: the job may sit in the queue while the user keeps editing.
+        custom_prompt = requestPanel.getCustomPrompt().strip()
+        traffic = self._snapshotTraffic(requestPanel)
+        include = (requestPanel.includeRequest(), requestPanel.includeResponse())
+        force_refresh = requestPanel.forceRefresh()
+        resultPanel = requestPanel.getResultPanel()
+        
+        def onStatus(job):
+            SwingUtilities.invokeLater(lambda: requestPanel.setStatus(jobStatusText(job)))
+        
+        prefetch = requestPanel.takePrefetch()
+        if prefetch:
+            job, view, key, conversation = prefetch
+            if (not force_refresh and not job.is_cancelled() and job.status != JOB_FAILED
+                    and key == self._analyzer.cache_key(custom_prompt, traffic, include)):
+                # The tab is as it was when the prefetch started: show its finished or streaming result.
+                self._queue.promote(job)
+                requestPanel.setConversation(conversation)
+                requestPanel.setJob(job)
+                view.attach(resultPanel)
+                job.watch(onStatus)
+                return
+            self._queue.cancel(job, "prefetch discarded")
+        
+        if not force_refresh:
+            entry = self._analyzer.cache.get(self._analyzer.cache_key(custom_prompt, traffic, include))
+            if entry:
+                requestPanel.setJob(None)
+                resultPanel.setText(self._analyzer.cached_text(entry))
+                requestPanel.setStatus(JOB_DONE + " (cached)")
+                return
+        
+        job = self.queueAnalysis(custom_prompt, traffic, resultPanel, PRIORITY_INTERACTIVE, onStatus,
+                                 requestPanel.getTitle(), include, force_refresh, requestPanel.getConversation())
+        requestPanel.setJob(job)
+        resultPanel.setText("Queued for analysis...\n")
     
-    def _clean_ansi(self, text):
-        ansi_escape = re.compile(r'(\x9B|\x1B\[)[0-?]*[ -/]*[@-~]')
-        return ansi_escape.sub('', text)
+    def queueAnalysis(self, custom_prompt, traffic, resultPanel, priority=PRIORITY_INTERACTIVE, on_status=None, name=None,
+                      include=(True, True), force_refresh=False, conversation=None):
+        """Queue one analysis of a (request, response) pair; None leaves a side out.
+        
+        traffic may be a callable returning the pair so large messages are only read by the worker.
+        """
+        def run(job):
+            pair = traffic() if callable(traffic) else traffic
+            return self._analyzer.analyze(job, resultPanel, custom_prompt, pair, include, force_refresh, conversation)
+        if self._analyzer.skips_model(custom_prompt):
+            # Local extraction takes milliseconds; it should not wait behind model calls.
+            return self._queue.run_now(run, priority=priority, on_status=on_status, name=name)
+        return self._queue.submit(run, priority=priority, on_status=on_status, name=name)
     
-    def _analyzeWithAI(self, requestPanel):
-        output_content = ""
-        temp_dir = None
-        
-        try:
-            custom_prompt = requestPanel.getCustomPrompt().strip()
-            
-            content = ""
-            
-            if requestPanel.includeRequest():
-                content += "===== REQUEST =====\n"
-                content += requestPanel.getRequestText() + "\n\n"
-            
-            if requestPanel.includeResponse():
-                content += "===== RESPONSE =====\n"
-                content += requestPanel.getResponseText() + "\n\n"
-            
-            model = self._config.get("model", "llama3")
-            ollama_path = self._config.get("path", "ollama")
-            
-            self._resultPanel.setText("Starting Ollama analysis with model: " + str(model) + "...\n")
-            
-            safe_print("Analyzing with model: " + str(model))
-            safe_print("Ollama path: " + ollama_path)
-            safe_print("System prompt length: " + str(len(self._system_prompt)))
-            safe_print("Custom prompt: " + custom_prompt)
-            
-            temp_dir = tempfile.mkdtemp(prefix="ollama_")
-            safe_print("Created temp directory: " + temp_dir)
-            
-            http_file = os.path.join(temp_dir, "http_traffic.txt")
-            safe_write(http_file, content)
-            safe_print("Wrote HTTP traffic to: " + http_file)
-            
-            complete_prompt = 'Based on the following system instructions:[ %s ]  %s ' % (
-                self._system_prompt,
-                custom_prompt
-            )
-            
-            output_file = os.path.join(temp_dir, "output.txt")
-            
-            cmd_str = ""
-            if os.name == 'nt':  
-                cmd_str = '%s run %s "%s" < "%s"' % (
-                    ollama_path,
-                    model,
-                    complete_prompt.replace('"', '\\"'),
-                    http_file.replace('/', '\\')
-                )
-                safe_print("Running Windows command: " + cmd_str)
-            else:  
-                cmd_str = '%s run %s "%s" < %s' % (
-                    ollama_path,
-                    model,
-                    complete_prompt.replace('"', '\\"'),
-                    http_file
-                )
-                safe_print("Running Unix command: " + cmd_str)
-            
-            self._resultPanel.setText("Running Ollama analysis...\n\nCommand: " + cmd_str)
-            
-            try:
-                if os.name == 'nt': 
-                    process = subprocess.Popen(cmd_str, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                else:  
-                    process = subprocess.Popen(cmd_str, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                self._resultPanel.setText("Analysis in progress with " + model + "...\n")
-                
-                result = ""
-                while True:
-                    output_line = process.stdout.readline()
-                    if not output_line and process.poll() is not None:
-                        break
-                        
-                    if output_line:
-                        line = output_line.decode('utf-8', 'replace')
-                        line = self._clean_ansi(line)
-                        result += line
-                        self._resultPanel.setText("Analysis in progress...\n\n" + result)
-                
-                remaining_output, error_output = process.communicate()
-                if remaining_output:
-                    remaining = remaining_output.decode('utf-8', 'replace')
-                    remaining = self._clean_ansi(remaining)
-                    result += remaining
-                
-                if process.returncode != 0:
-                    if error_output:
-                        error = error_output.decode('utf-8', 'replace')
-                        safe_print("Error output from process: " + error)
-                        result += "\n\nError executing command: " + error
-                
-                if result.strip():
-                    self._resultPanel.setText(result)
-                else:
-                    self._resultPanel.setText("No output received from Ollama.\n\nCommand: " + cmd_str)
-                    
-                    if error_output:
-                        error = error_output.decode('utf-8', 'replace')
-                        self._resultPanel.setText("No output received. Error: " + error)
-                
-            except Exception as e:
-                import traceback
-                error_msg = "Error running Ollama: " + str(e)
-                stack_trace = traceback.format_exc()
-                self._resultPanel.setText(error_msg + "\n\n" + stack_trace)
-                safe_print(error_msg)
-                safe_print(stack_trace)
-                
-        except Exception as e:
-            import traceback
-            error_msg = "Error during analysis: " + str(e)
-            stack_trace = traceback.format_exc()
-            self._resultPanel.setText(error_msg + "\n\n" + stack_trace)
-            safe_print(error_msg)
-            safe_print(stack_trace)
-        finally:
-            self._analyzing = False            
-            if temp_dir:
-                safe_print("Temporary files at: " + temp_dir)
+    def _parseMessage(self, traffic):
+        # Burp's own parsers also know XML and multipart attributes; the core parses anything else itself.
+        parsed = {}
+        if traffic[0]:
+            info = self._helpers.analyzeRequest(self._helpers.stringToBytes(traffic[0]))
+            parsed["parameters"] = [
+                (BURP_PARAMETER_TYPES[p.getType()] if p.getType() < len(BURP_PARAMETER_TYPES) else "other",
+                 p.getName(), p.getValue()) for p in info.getParameters()]
+        if traffic[1]:
+            info = self._helpers.analyzeResponse(self._helpers.stringToBytes(traffic[1]))
+            parsed["cookies"] = [cookie.getName() for cookie in info.getCookies()]
+        return parsed
+    
+    def _prefetch(self, requestPanel):
+        # Speculative run of what Analyze would do; it waits for an idle worker and gives way to clicks.
+        custom_prompt = requestPanel.getCustomPrompt().strip()
+        traffic = self._snapshotTraffic(requestPanel)
+        include = (requestPanel.includeRequest(), requestPanel.includeResponse())
+        if self._analyzer.skips_model(custom_prompt):
+            return
+        key = self._analyzer.cache_key(custom_prompt, traffic, include)
+        if self._analyzer.cache.get(key):
+            return
+        view = DeferredView()
+        conversation = Conversation()
+        def run(job):
+            return self._analyzer.analyze(job, view, custom_prompt, traffic, include, False, conversation)
+        job = self._queue.submit(run, priority=PRIORITY_BACKGROUND, name=requestPanel.getTitle() + " (prefetch)",
+                                 preemptible=True)
+        requestPanel.setPrefetch((job, view, key, conversation))
+    
+    def setCompareHandler(self, handler):
+        self._compareHandler = handler
+    
+    def requestComparison(self, tabIndex):
+        if tabIndex < 0 or tabIndex >= len(self._tabs) or self._compareHandler is None:
+            return
+        requestPanel = self._tabs[tabIndex]
+        if not requestPanel.getRequestText().strip() and not requestPanel.getResponseText().strip():
+            JOptionPane.showMessageDialog(None, "No request or response content to analyze.")
+            return
+        include = (requestPanel.includeRequest(), requestPanel.includeResponse())
+        self._compareHandler(requestPanel.getTitle(), requestPanel.getCustomPrompt().strip(),
+                             self._snapshotTraffic(requestPanel), include)
+    
+    def compareModels(self, title, custom_prompt, traffic, include, models, views, parallel=0, early_stop=False):
+        """Start a ModelComparison of traffic over models; views maps each model to its result view."""
+        def submit(model, on_status):
+            # Cached or near-duplicate results would not measure anything, so every model really runs.
+            def run(job):
+                return self._analyzer.analyze(job, views[model], custom_prompt, traffic, include, True, model=model)
+            return self._queue.submit(run, priority=PRIORITY_INTERACTIVE, on_status=on_status,
+                                      name=title + " [" + model + "]")
+        comparison = ModelComparison(models, submit, self._queue.cancel, parallel, early_stop)
+        comparison.start()
+        return comparison
+    
+    def clearCache(self):
+        self._analyzer.clear_cache()
+    
+    def getHostSummary(self):
+        return self._analyzer.pool().summary()
+    
+    def getFindings(self):
+        return self._analyzer.findings
+    
+    def getMetrics(self):
+        return self._analyzer.metrics
+    
+    def getHistory(self):
+        return self._analyzer.history
+    
+    def setSystemPrompt(self, system_prompt):
+        self._analyzer.system_prompt = system_prompt
+    
+    def cancelJob(self, job):
+        self._queue.cancel(job)
+    
+    def cancelAnalysis(self, tabIndex):
+        if tabIndex < 0 or tabIndex >= len(self._tabs):
+            return
+        job = self._tabs[tabIndex].getJob()
+        if job and job.is_active():
+            self._queue.cancel(job)
+    
+    def _snapshotTraffic(self, requestPanel):
+        return (
+            requestPanel.getRequestText() if requestPanel.includeRequest() else None,
+            requestPanel.getResponseText() if requestPanel.includeResponse() else None
+        )
 
-class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
+class BurpExtender(IBurpExtender, IContextMenuFactory, ITab, IHttpListener, IExtensionStateListener):
+    BACKENDS = [(BACKEND_CLI, "CLI (ollama run)"), (BACKEND_API, "HTTP API (keep-alive)")]
+    
     def registerExtenderCallbacks(self, callbacks):
         self._callbacks = callbacks
         self._helpers = callbacks.getHelpers()
@@ -545,6 +1712,10 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         
         self._config_file = os.path.join(os.path.expanduser("~"), ".burp_ai_analyzer.json")
         self._config = self._load_config()
+        self._models = ModelManager(self._config, safe_print)
+        self._catalog = ModelCatalog(int(self._config.get("model_list_ttl", MODEL_LIST_TTL)))
+        self._modelDetails = {}
+        self._populatingModels = False
         
         self._panel = JPanel(BorderLayout())
         
@@ -567,24 +1738,58 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         resultContainer.setBorder(BorderFactory.createTitledBorder("AI Analysis Results"))
         
         self._resultPanel = AIResultPanel()
-        resultContainer.add(self._resultPanel, BorderLayout.CENTER)
+        resultCards = JPanel(CardLayout())
+        resultContainer.add(resultCards, BorderLayout.CENTER)
         
         horizontalSplitPane.setLeftComponent(self._tabbedPane)
         horizontalSplitPane.setRightComponent(resultContainer)
         
-        self._panel.add(horizontalSplitPane, BorderLayout.CENTER)
-        
         self._tabManager = TabManager(self._tabbedPane, self._helpers, self._callbacks, self._config)
-        self._tabManager.setResultPanel(self._resultPanel)
+        self._tabManager.setResultPanel(self._resultPanel, resultCards)
+        
+        self._batchPanel = BatchPanel(self._helpers, self._tabManager)
+        
+        self._mainTabs = JTabbedPane()
+        self._mainTabs.addTab("Requests", horizontalSplitPane)
+        self._mainTabs.addTab("Batch", self._batchPanel)
+        
+        self._passivePanel = PassivePanel(self._helpers, self._tabManager, self._applyPassiveConfig)
+        self._passive = PassiveIntake(self._classifyPassive, self._passivePanel.queuePassive, self._config)
+        self._passivePanel.setIntake(self._passive, self._config)
+        self._mainTabs.addTab("Passive", self._passivePanel)
+        self._historyPanel = HistoryPanel(self._tabManager)
+        self._mainTabs.addTab("History", self._historyPanel)
+        self._findingsPanel = FindingsPanel(self._tabManager.getFindings())
+        self._mainTabs.addTab("Findings", self._findingsPanel)
+        self._statsPanel = StatsPanel(self._tabManager.getMetrics())
+        self._mainTabs.addTab("Stats", self._statsPanel)
+        self._comparePanel = ComparePanel(self._tabManager, self._config)
+        self._comparePanel.setModels([str(self._modelField.getItemAt(i)) for i in range(self._modelField.getItemCount())])
+        self._mainTabs.addTab("Compare", self._comparePanel)
+        self._tabManager.setCompareHandler(self._compare)
+        self._mainTabs.addChangeListener(lambda event: self._historyPanel.refresh()
+                                         if self._mainTabs.getSelectedComponent() is self._historyPanel else None)
+        self._panel.add(self._mainTabs, BorderLayout.CENTER)
         
         self._tabManager.addTab()
         
         callbacks.addSuiteTab(self)
+        callbacks.registerHttpListener(self)
+        callbacks.registerExtensionStateListener(self)
+        
+        thread = threading.Thread(target=self._removeStaleTempDirs)
+        thread.daemon = True
+        thread.start()
         
-        self._lastContextMenuTime = 0
+        self._lastInvocation = None
         
         safe_print("Ollama AI Analyzer extension loaded")
     
+    def _removeStaleTempDirs(self):
+        removed = remove_stale_temp_dirs()
+        if removed:
+            safe_print("Removed " + str(removed) + " temporary directories left by earlier sessions")
+    
     def _createSettingsPanel(self):
         settingsPanel = JPanel(BorderLayout())
         settingsPanel.setBorder(BorderFactory.createCompoundBorder(
@@ -592,7 +1797,7 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
             BorderFactory.createTitledBorder("Ollama Settings")
         ))
         
-        controlsPanel = JPanel(GridLayout(1, 2, 10, 0))
+        controlsPanel = JPanel(GridLayout(10, 3, 10, 4))
         
         modelPanel = JPanel(BorderLayout())
         modelPanel.add(JLabel("Ollama Model:  "), BorderLayout.WEST)
@@ -600,6 +1805,8 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         self._modelField.setEditable(True)
         if "model" in self._config:
             self._modelField.setSelectedItem(self._config["model"])
+        self._modelField.setRenderer(ModelCellRenderer(self._modelDetails))
+        self._modelField.addActionListener(lambda x: self._onModelSelected())
         modelPanel.add(self._modelField, BorderLayout.CENTER)
         controlsPanel.add(modelPanel)
         
@@ -609,6 +1816,183 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         pathPanel.add(self._pathField, BorderLayout.CENTER)
         controlsPanel.add(pathPanel)
         
+        backendPanel = JPanel(BorderLayout())
+        backendPanel.add(JLabel("Backend:  "), BorderLayout.WEST)
+        self._backendField = JComboBox([label for _, label in self.BACKENDS])
+        backend = self._config.get("backend", BACKEND_CLI)
+        for i, (value, _) in enumerate(self.BACKENDS):
+            if value == backend:
+                self._backendField.setSelectedIndex(i)
+        backendPanel.add(self._backendField, BorderLayout.CENTER)
+        controlsPanel.add(backendPanel)
+        
+        apiUrlPanel = JPanel(BorderLayout())
+        apiUrlPanel.add(JLabel("API URL(s):  "), BorderLayout.WEST)
+        self._apiUrlField = JTextField(", ".join(url for url, _ in pool_hosts(self._config)))
+        self._apiUrlField.setToolTipText("Several comma-separated Ollama hosts share the analyses; a host that fails is skipped "
+                                         "until its health check passes again")
+        apiUrlPanel.add(self._apiUrlField, BorderLayout.CENTER)
+        controlsPanel.add(apiUrlPanel)
+        
+        endpointPanel = JPanel(BorderLayout())
+        endpointPanel.add(JLabel("API Endpoint:  "), BorderLayout.WEST)
+        self._endpointField = JComboBox(["generate", "chat"])
+        self._endpointField.setSelectedItem(self._config.get("api_endpoint", "generate"))
+        endpointPanel.add(self._endpointField, BorderLayout.CENTER)
+        controlsPanel.add(endpointPanel)
+        
+        keepAlivePanel = JPanel(BorderLayout())
+        keepAlivePanel.add(JLabel("Keep Alive:  "), BorderLayout.WEST)
+        self._keepAliveField = JTextField(str(self._config.get("keep_alive", DEFAULT_KEEP_ALIVE)))
+        self._keepAliveField.setToolTipText("How long Ollama keeps the model loaded, e.g. 30m, 3600 or -1 for forever")
+        keepAlivePanel.add(self._keepAliveField, BorderLayout.CENTER)
+        controlsPanel.add(keepAlivePanel)
+        
+        warmPanel = JPanel(BorderLayout())
+        warmPanel.add(JLabel("Warm Models:  "), BorderLayout.WEST)
+        self._warmField = JComboBox(["0", "1", "2"])
+        self._warmField.setSelectedItem(str(self._config.get("warm_models", 1)))
+        self._warmField.setToolTipText("Preload the selected model and keep this many recently selected models loaded; "
+                                       "2 needs OLLAMA_MAX_LOADED_MODELS of at least 2")
+        warmPanel.add(self._warmField, BorderLayout.CENTER)
+        controlsPanel.add(warmPanel)
+        
+        workersPanel = JPanel(BorderLayout())
+        workersPanel.add(JLabel("Parallel Analyses:  "), BorderLayout.WEST)
+        self._workersField = JTextField(str(self._config.get("max_parallel", default_parallelism())))
+        self._workersField.setToolTipText("How many analyses run at once; match the server's OLLAMA_NUM_PARALLEL")
+        workersPanel.add(self._workersField, BorderLayout.CENTER)
+        controlsPanel.add(workersPanel)
+        
+        orderPanel = JPanel(BorderLayout())
+        orderPanel.add(JLabel("Queue Order:  "), BorderLayout.WEST)
+        self._orderField = JComboBox([ORDER_FIFO, ORDER_PRIORITY])
+        self._orderField.setSelectedItem(self._config.get("queue_order", ORDER_FIFO))
+        orderPanel.add(self._orderField, BorderLayout.CENTER)
+        controlsPanel.add(orderPanel)
+        
+        cachePanel = JPanel(BorderLayout())
+        cachePanel.add(JLabel("Result Cache:  "), BorderLayout.WEST)
+        self._cacheField = JComboBox([CACHE_OFF, CACHE_MEMORY, CACHE_DISK])
+        self._cacheField.setSelectedItem(self._config.get("cache_mode", CACHE_MEMORY))
+        cachePanel.add(self._cacheField, BorderLayout.CENTER)
+        clearCacheButton = JButton("Clear")
+        clearCacheButton.setToolTipText("Delete all cached analysis results")
+        clearCacheButton.addActionListener(lambda x: self._tabManager.clearCache())
+        cachePanel.add(clearCacheButton, BorderLayout.EAST)
+        controlsPanel.add(cachePanel)
+        
+        reducePanel = JPanel(BorderLayout())
+        self._reduceCheck = JCheckBox("Reduce traffic before prompting", bool(self._config.get("reduce_traffic", True)))
+        self._reduceCheck.setToolTipText("Summarize binary bodies, minify JSON/HTML, collapse repeated headers and sample large bodies")
+        reducePanel.add(self._reduceCheck, BorderLayout.CENTER)
+        controlsPanel.add(reducePanel)
+        
+        maxBodyPanel = JPanel(BorderLayout())
+        maxBodyPanel.add(JLabel("Max Body KB:  "), BorderLayout.WEST)
+        self._maxBodyField = JTextField(str(self._config.get("max_body_kb", 16)))
+        self._maxBodyField.setToolTipText("Larger bodies are sampled (start and end kept) when traffic reduction is on")
+        maxBodyPanel.add(self._maxBodyField, BorderLayout.CENTER)
+        controlsPanel.add(maxBodyPanel)
+        
+        mapReducePanel = JPanel(BorderLayout())
+        self._mapReduceCheck = JCheckBox("Chunked map-reduce for large traffic", bool(self._config.get("map_reduce", False)))
+        self._mapReduceCheck.setToolTipText("Split traffic larger than Chunk KB, analyze the parts in parallel and merge the findings")
+        mapReducePanel.add(self._mapReduceCheck, BorderLayout.CENTER)
+        controlsPanel.add(mapReducePanel)
+        
+        chunkPanel = JPanel(BorderLayout())
+        chunkPanel.add(JLabel("Chunk KB:  "), BorderLayout.WEST)
+        self._chunkField = JTextField(str(self._config.get("chunk_kb", 12)))
+        chunkPanel.add(self._chunkField, BorderLayout.CENTER)
+        controlsPanel.add(chunkPanel)
+        
+        chunkParallelPanel = JPanel(BorderLayout())
+        chunkParallelPanel.add(JLabel("Chunk Parallelism:  "), BorderLayout.WEST)
+        self._chunkParallelField = JTextField(str(self._config.get("chunk_parallel", 2)))
+        chunkParallelPanel.add(self._chunkParallelField, BorderLayout.CENTER)
+        controlsPanel.add(chunkParallelPanel)
+        
+        timeoutPanel = JPanel(BorderLayout())
+        timeoutPanel.add(JLabel("Timeout (s):  "), BorderLayout.WEST)
+        self._timeoutField = JTextField(str(self._config.get("timeout_seconds", 300)))
+        self._timeoutField.setToolTipText("Wall-clock limit per analysis; 0 disables it. Partial output is kept.")
+        timeoutPanel.add(self._timeoutField, BorderLayout.CENTER)
+        controlsPanel.add(timeoutPanel)
+        
+        maxTokensPanel = JPanel(BorderLayout())
+        maxTokensPanel.add(JLabel("Max Output Tokens:  "), BorderLayout.WEST)
+        self._maxTokensField = JTextField(str(self._config.get("max_output_tokens", 0)))
+        self._maxTokensField.setToolTipText("Stop generation after this many tokens; 0 means unlimited")
+        maxTokensPanel.add(self._maxTokensField, BorderLayout.CENTER)
+        controlsPanel.add(maxTokensPanel)
+        
+        dedupePanel = JPanel(BorderLayout())
+        self._dedupeCheck = JCheckBox("Reuse results for near-duplicates", bool(self._config.get("dedupe_enabled", False)))
+        self._dedupeCheck.setToolTipText("Requests with the same method, path template, parameter names and response shape "
+                                         "reuse the earlier analysis instead of running the model again")
+        dedupePanel.add(self._dedupeCheck, BorderLayout.CENTER)
+        controlsPanel.add(dedupePanel)
+        
+        structuredPanel = JPanel(BorderLayout())
+        self._structuredCheck = JCheckBox("Structured findings (JSON)", bool(self._config.get("structured_findings", False)))
+        self._structuredCheck.setToolTipText("Ask the model for JSON findings with severity, location, parameter and evidence; "
+                                             "they fill the Findings tab as the output streams in")
+        structuredPanel.add(self._structuredCheck, BorderLayout.CENTER)
+        controlsPanel.add(structuredPanel)
+        
+        routingPanel = JPanel(BorderLayout())
+        routingPanel.add(JLabel("Host Routing:  "), BorderLayout.WEST)
+        self._routingField = JComboBox([ROUTE_LEAST_OUTSTANDING, ROUTE_LATENCY])
+        self._routingField.setSelectedItem(self._config.get("routing", ROUTE_LEAST_OUTSTANDING))
+        self._routingField.setToolTipText("How analyses are spread over several API URLs")
+        routingPanel.add(self._routingField, BorderLayout.CENTER)
+        controlsPanel.add(routingPanel)
+        
+        hostLimitPanel = JPanel(BorderLayout())
+        hostLimitPanel.add(JLabel("Per-Host Limit:  "), BorderLayout.WEST)
+        self._hostLimitField = JTextField(str(self._config.get("host_concurrency", 0)))
+        self._hostLimitField.setToolTipText("Analyses running at once on each host; 0 means no limit")
+        hostLimitPanel.add(self._hostLimitField, BorderLayout.CENTER)
+        controlsPanel.add(hostLimitPanel)
+        
+        cascadePanel = JPanel(BorderLayout())
+        self._cascadeCheck = JCheckBox("Triage before analyzing (cascade)", bool(self._config.get("cascade_enabled", False)))
+        self._cascadeCheck.setToolTipText("Batch and passive items are scored first; only those above the threshold go to the "
+                                          "selected model")
+        cascadePanel.add(self._cascadeCheck, BorderLayout.CENTER)
+        controlsPanel.add(cascadePanel)
+        
+        triageModelPanel = JPanel(BorderLayout())
+        triageModelPanel.add(JLabel("Triage Model:  "), BorderLayout.WEST)
+        self._triageModelField = JTextField(self._config.get("cascade_model", ""))
+        self._triageModelField.setToolTipText("Small model that rates each item 0-10; empty uses the built-in heuristic only")
+        triageModelPanel.add(self._triageModelField, BorderLayout.CENTER)
+        controlsPanel.add(triageModelPanel)
+        
+        thresholdPanel = JPanel(BorderLayout())
+        thresholdPanel.add(JLabel("Escalate Above:  "), BorderLayout.WEST)
+        self._thresholdField = JTextField(str(self._config.get("cascade_threshold", 30)))
+        self._thresholdField.setToolTipText("Triage score (0-100) an item needs to be sent to the selected model")
+        thresholdPanel.add(self._thresholdField, BorderLayout.CENTER)
+        controlsPanel.add(thresholdPanel)
+        
+        extractionPanel = JPanel(BorderLayout())
+        extractionPanel.add(JLabel("Local Extraction:  "), BorderLayout.WEST)
+        self._extractionField = JComboBox(list(EXTRACT_MODES))
+        self._extractionField.setSelectedItem(self._config.get("extraction_mode", EXTRACT_SHOW))
+        self._extractionField.setToolTipText("Paths, endpoints and parameters parsed locally: shown first, sent to the model "
+                                             "in place of the bodies, or the whole answer for the default prompt")
+        extractionPanel.add(self._extractionField, BorderLayout.CENTER)
+        controlsPanel.add(extractionPanel)
+        
+        prefetchPanel = JPanel(BorderLayout())
+        self._prefetchCheck = JCheckBox("Prefetch analyses for new tabs", bool(self._config.get("prefetch_tabs", False)))
+        self._prefetchCheck.setToolTipText("Start analyzing tabs sent from other tools on idle workers, so Analyze shows "
+                                           "the result at once; dropped if the prompt, include flags or traffic change")
+        prefetchPanel.add(self._prefetchCheck, BorderLayout.CENTER)
+        controlsPanel.add(prefetchPanel)
+        
         settingsPanel.add(controlsPanel, BorderLayout.CENTER)
         
         buttonPanel = JPanel(FlowLayout(FlowLayout.RIGHT))
@@ -627,49 +2011,76 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         
         settingsPanel.add(buttonPanel, BorderLayout.EAST)
         
+        self._modelStatusLabel = JLabel(" ")
+        self._modelStatusLabel.setBorder(BorderFactory.createEmptyBorder(4, 0, 0, 0))
+        settingsPanel.add(self._modelStatusLabel, BorderLayout.SOUTH)
+        self._modelStatusTimer = Timer(2000, lambda event: self._modelStatusLabel.setText(
+            ("Models: " + self._models.summary() if self._models.max_warm else "Model warm-up off")
+            + ("   |   Hosts: " + self._tabManager.getHostSummary() if len(self._apiUrls()) > 1 else "")))
+        self._modelStatusTimer.start()
+        
+        self._refreshModels()
+        
         return settingsPanel
     
+    def _onModelSelected(self):
+        if not self._populatingModels:
+            self._models.select(str(self._modelField.getSelectedItem() or "").strip())
+    
+    def _apiUrls(self):
+        return [url.strip().rstrip("/") for url in self._apiUrlField.getText().split(",") if url.strip()] or [DEFAULT_API_URL]
+    
+    def _refreshModels(self, force=False, onDone=None):
+        # Discovery runs on a background thread; only the results are applied on the EDT.
+        config = {"api_url": self._apiUrls()[0], "path": self._pathField.getText()}
+        def done(models, source, error):
+            SwingUtilities.invokeLater(lambda: self._showModels(models, source, error, onDone))
+        self._catalog.discover_async(config, done, force)
+    
+    def _showModels(self, models, source, error, onDone=None):
+        if models:
+            current = str(self._modelField.getSelectedItem() or "").strip()
+            names = [model["name"] for model in models]
+            self._modelDetails.clear()
+            for model in models:
+                self._modelDetails[model["name"]] = describe_model(model)
+            self._populatingModels = True
+            try:
+                self._modelField.removeAllItems()
+                for name in names + ([current] if current and current not in names else []):
+                    self._modelField.addItem(name)
+                self._modelField.setSelectedItem(current or names[0])
+            finally:
+                self._populatingModels = False
+            if hasattr(self, "_comparePanel"):
+                self._comparePanel.setModels(names)
+        elif error:
+            safe_print("Model discovery failed: " + error)
+        if onDone:
+            onDone(models, source, error)
+    
     def _test_ollama(self):
-        ollama_path = self._pathField.getText()
-        
-        try:
-            self._resultPanel.setText("Testing Ollama connection...\n")
-            
-            if os.name == 'nt':  
-                cmd = '"%s" list' % ollama_path
-            else: 
-                cmd = ollama_path + " list"
-            
-            process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output, error = process.communicate()
-            
-            if output:
-                output_str = output.decode('utf-8', 'replace')
-                self._resultPanel.setText("Ollama test successful! Available models:\n\n" + output_str)
-                JOptionPane.showMessageDialog(self._panel, 
-                    "Ollama is working correctly.",
-                    "Success", 
-                    JOptionPane.INFORMATION_MESSAGE)
-            else:
-                error_msg = "Ollama test failed! No output received."
-                if error:
-                    error_str = error.decode('utf-8', 'replace')
-                    error_msg += "\n\nError: " + error_str
-                
-                self._resultPanel.setText(error_msg)
-                JOptionPane.showMessageDialog(self._panel, 
-                    error_msg,
-                    "Error", 
-                    JOptionPane.ERROR_MESSAGE)
-                
-        except Exception as e:
-            error_msg = "Error testing Ollama: " + str(e)
-            self._resultPanel.setText(error_msg)
+        self._tabManager.showMessage("Testing Ollama connection...\n")
+        self._refreshModels(True, self._showTestResult)
+    
+    def _showTestResult(self, models, source, error):
+        if error:
+            error_msg = "Ollama test failed!\n\nError: " + error
+            self._tabManager.showMessage(error_msg)
             JOptionPane.showMessageDialog(self._panel, 
                 error_msg,
                 "Error", 
                 JOptionPane.ERROR_MESSAGE)
-            safe_print(error_msg)
+            return
+        
+        lines = [model["name"] + ("   " + describe_model(model) if describe_model(model) else "") for model in models]
+        via = "the HTTP API" if source == "api" else "ollama list"
+        self._tabManager.showMessage("Ollama test successful! Available models (via " + via + "):\n\n"
+                                     + ("\n".join(lines) if lines else "No models installed. Run `ollama pull <model>` first."))
+        JOptionPane.showMessageDialog(self._panel, 
+            "Ollama is working correctly.",
+            "Success", 
+            JOptionPane.INFORMATION_MESSAGE)
     
     def _configure_system_prompt(self):
         currentPrompt = self._config.get("system_prompt", 
@@ -696,11 +2107,11 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
             self._config["system_prompt"] = system_prompt
             
             if hasattr(self, '_tabManager'):
-                self._tabManager._system_prompt = system_prompt
+                self._tabManager.setSystemPrompt(system_prompt)
                 
             self._save_config()
             
-            self._resultPanel.setText("System prompt updated to:\n\n" + system_prompt)
+            self._tabManager.showMessage("System prompt updated to:\n\n" + system_prompt)
     
     def _load_config(self):
         try:
@@ -711,25 +2122,62 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
             safe_print("Error loading config: " + str(e))
         return {}
         
+    def _apiHosts(self):
+        # Keep per-host {"url", "max_concurrent"} entries from the config file for hosts still listed.
+        urls = self._apiUrls()
+        if len(urls) < 2:
+            return []
+        existing = dict((item.get("url", "").rstrip("/"), item) for item in self._config.get("api_hosts") or []
+                        if isinstance(item, dict))
+        return [existing.get(url, url) for url in urls]
+    
     def _save_config(self):
         try:
-            config = {
+            config = dict(self._config)
+            config.update({
                 "model": str(self._modelField.getSelectedItem()),
                 "path": self._pathField.getText(),
+                "backend": self.BACKENDS[max(self._backendField.getSelectedIndex(), 0)][0],
+                "api_url": self._apiUrls()[0],
+                "api_hosts": self._apiHosts(),
+                "routing": str(self._routingField.getSelectedItem()),
+                "host_concurrency": max(0, int(self._hostLimitField.getText().strip() or 0)),
+                "api_endpoint": str(self._endpointField.getSelectedItem()),
+                "keep_alive": self._keepAliveField.getText().strip() or DEFAULT_KEEP_ALIVE,
+                "max_parallel": max(1, int(self._workersField.getText().strip() or default_parallelism())),
+                "queue_order": str(self._orderField.getSelectedItem()),
+                "cache_mode": str(self._cacheField.getSelectedItem()),
+                "reduce_traffic": bool(self._reduceCheck.isSelected()),
+                "max_body_kb": max(0, int(self._maxBodyField.getText().strip() or 16)),
+                "map_reduce": bool(self._mapReduceCheck.isSelected()),
+                "chunk_kb": max(1, int(self._chunkField.getText().strip() or 12)),
+                "chunk_parallel": max(1, int(self._chunkParallelField.getText().strip() or 2)),
+                "timeout_seconds": max(0, int(self._timeoutField.getText().strip() or 0)),
+                "max_output_tokens": max(0, int(self._maxTokensField.getText().strip() or 0)),
+                "dedupe_enabled": bool(self._dedupeCheck.isSelected()),
+                "structured_findings": bool(self._structuredCheck.isSelected()),
+                "cascade_enabled": bool(self._cascadeCheck.isSelected()),
+                "extraction_mode": str(self._extractionField.getSelectedItem()),
+                "prefetch_tabs": bool(self._prefetchCheck.isSelected()),
+                "cascade_model": self._triageModelField.getText().strip(),
+                "cascade_threshold": min(100, max(0, int(self._thresholdField.getText().strip() or 30))),
+                "warm_models": int(str(self._warmField.getSelectedItem())),
+                "pinned_models": self._models.pinned(),
                 "system_prompt": self._config.get("system_prompt", 
                     "You are a cybersecurity expert analyzing HTTP traffic. "
                     "Focus on identifying security vulnerabilities, suspicious patterns, "
                     "and potential attack vectors. Provide concise analysis with clear recommendations.")
-            }
+            })
             
             with open(self._config_file, 'wb') as f:
                 f.write(json.dumps(config, ensure_ascii=False).encode('utf-8', 'replace'))
             
             self._config = config
             
+            self._models.update_config(config)
             if hasattr(self, '_tabManager'):
-                self._tabManager._config = config
-                self._tabManager._system_prompt = config["system_prompt"]
+                self._tabManager.updateConfig(config)
+                self._tabManager.setSystemPrompt(config["system_prompt"])
             
             JOptionPane.showMessageDialog(self._panel, 
                 "Settings saved successfully", 
@@ -745,6 +2193,49 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
                 JOptionPane.ERROR_MESSAGE)
             safe_print("Error saving config: " + str(e))
     
+    def _applyPassiveConfig(self, values):
+        try:
+            config = dict(self._config)
+            config.update(values)
+            with open(self._config_file, 'wb') as f:
+                f.write(json.dumps(config, ensure_ascii=False).encode('utf-8', 'replace'))
+            self._config = config
+            self._tabManager.updateConfig(config)
+        except Exception as e:
+            safe_print("Error saving passive settings: " + str(e))
+        self._passive.set_config(self._config)
+        if not self._config.get("passive_enabled", False):
+            self._passive.clear()
+    
+    def processHttpMessage(self, toolFlag, messageIsRequest, messageInfo):
+        # Proxy thread: only hand the message over; scope checks and parsing happen on the intake thread.
+        if not messageIsRequest and toolFlag == self._callbacks.TOOL_PROXY:
+            self._passive.offer(messageInfo)
+    
+    def _classifyPassive(self, message):
+        response = message.getResponse()
+        if not response:
+            return None
+        url = self._helpers.analyzeRequest(message).getUrl()
+        if not self._callbacks.isInScope(url):
+            return None
+        responseInfo = self._helpers.analyzeResponse(response)
+        return {
+            "host": url.getHost(),
+            "mime": responseInfo.getStatedMimeType() or responseInfo.getInferredMimeType(),
+            "status": responseInfo.getStatusCode()
+        }
+    
+    def extensionUnloaded(self):
+        self._tabManager.dispose()
+        self._passive.stop()
+        self._models.stop()
+        self._modelStatusTimer.stop()
+        self._batchPanel.cancelAll()
+        self._passivePanel.cancelAll()
+        for panel in (self._batchPanel, self._passivePanel, self._findingsPanel, self._statsPanel, self._comparePanel):
+            panel.stopRefresh()
+    
     def getTabCaption(self):
         return "Ollama AI Analyzer"
     
@@ -756,15 +2247,41 @@ class BurpExtender(IBurpExtender, IContextMenuFactory, ITab):
         menuItem = JMenuItem("Send to Ollama AI Analyzer")
         menuItem.addActionListener(lambda x: self.handleContextMenu(contextMenuInvocation))
         menuItems.add(menuItem)
+        
+        selectedMessages = contextMenuInvocation.getSelectedMessages()
+        if selectedMessages and len(selectedMessages) > 1:
+            batchItem = JMenuItem("Batch analyze " + str(len(selectedMessages)) + " items with Ollama AI Analyzer")
+            batchItem.addActionListener(lambda x: self.handleBatchContextMenu(contextMenuInvocation))
+            menuItems.add(batchItem)
         return menuItems
     
-    def handleContextMenu(self, invocation):
-        current_time = int(round(time.time() * 1000))  
-        if (current_time - self._lastContextMenuTime) < 500:
+    def _isDuplicateInvocation(self, invocation):
+        # Burp can deliver the same menu action twice; separate clicks are always honoured.
+        if invocation is self._lastInvocation:
             safe_print("Ignoring duplicate context menu event")
+            return True
+        self._lastInvocation = invocation
+        return False
+    
+    def _compare(self, title, custom_prompt, traffic, include):
+        self._mainTabs.setSelectedComponent(self._comparePanel)
+        self._comparePanel.compare(title, custom_prompt, traffic, include)
+    
+    def handleBatchContextMenu(self, invocation):
+        if self._isDuplicateInvocation(invocation):
+            return
+        
+        selectedMessages = invocation.getSelectedMessages()
+        if not selectedMessages:
+            return
+        
+        safe_print("Queueing " + str(len(selectedMessages)) + " items for batch analysis")
+        self._batchPanel.addMessages(selectedMessages)
+        self._mainTabs.setSelectedComponent(self._batchPanel)
+    
+    def handleContextMenu(self, invocation):
+        if self._isDuplicateInvocation(invocation):
             return
-            
-        self._lastContextMenuTime = current_time
         
         selectedMessages = invocation.getSelectedMessages()
         if not selectedMessages or len(selectedMessages) == 0:
@@ -0,0 +1,4209 @@
+#Author: Chan aka bytehx
+#Pure-Python helpers for the Ollama AI Analyzer extension.
+#Nothing in here may import burp/javax so it also runs under plain CPython.
+import codecs
+import fnmatch
+import hashlib
+import heapq
+import json
+import os
+import random
+import re
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+try:
+    import httplib
+    from urlparse import urlparse
+except ImportError:
+    import http.client as httplib
+    from urllib.parse import urlparse
+
+
+DEFAULT_API_URL = "http://127.0.0.1:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_API_TIMEOUT = 600
+ROUTE_LEAST_OUTSTANDING = "least outstanding"
+ROUTE_LATENCY = "lowest latency"
+
+BACKEND_CLI = "cli"
+BACKEND_API = "api"
+
+IS_JYTHON = sys.platform.startswith("java")
+IS_WINDOWS = os.name == "nt" or getattr(os, "_name", "") == "nt"
+
+
+class OllamaError(Exception):
+    pass
+
+
+class HostUnavailable(OllamaError):
+    """A pooled host failed before producing any output, so the call can move to another host."""
+
+
+def parse_keep_alive(value):
+    """Ollama accepts durations like "30m" or a number of seconds (-1 = forever)."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    value = str(value).strip()
+    if not value:
+        return DEFAULT_KEEP_ALIVE
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def keep_alive_seconds(value):
+    """parse_keep_alive() value in seconds; None for "forever" (any negative value)."""
+    value = parse_keep_alive(value)
+    if isinstance(value, int):
+        return None if value < 0 else value
+    match = re.match(r"^(-?[\d.]+)\s*(ms|s|m|h)?$", value.strip())
+    if not match:
+        return 300
+    seconds = float(match.group(1)) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+    return None if seconds < 0 else seconds
+
+
+def chunk_text(chunk):
+    """Text carried by one NDJSON chunk of /api/generate or /api/chat."""
+    if "response" in chunk:
+        return chunk.get("response") or ""
+    message = chunk.get("message")
+    if message:
+        return message.get("content") or ""
+    return ""
+
+
+def _read_available(response, size=8192):
+    # read(n) blocks until n bytes arrive, which would hold back streamed tokens.
+    read1 = getattr(response, "read1", None)
+    if read1 is not None:
+        return read1(size)
+    if getattr(response, "chunked", False):
+        left = response.chunk_left
+        return response.read(left if left else 1)
+    return response.read(size)
+
+
+class OllamaClient(object):
+    """Streams from Ollama's HTTP API over reusable keep-alive connections."""
+
+    def __init__(self, base_url=DEFAULT_API_URL, timeout=DEFAULT_API_TIMEOUT):
+        parsed = urlparse(base_url if "://" in base_url else "http://" + base_url)
+        self.base_url = base_url
+        self._https = parsed.scheme == "https"
+        self._host = parsed.hostname or "127.0.0.1"
+        self._port = parsed.port or (443 if self._https else 11434)
+        self._prefix = parsed.path.rstrip("/")
+        self._timeout = timeout
+        self._idle = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        if self._https:
+            return httplib.HTTPSConnection(self._host, self._port, timeout=self._timeout)
+        return httplib.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _release(self, conn, response):
+        with self._lock:
+            if not self._closed and (response is None or not response.will_close):
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close the idle connections; calls still running close theirs when they finish."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _send(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        conn, reused = self._acquire()
+        try:
+            conn.request(method, self._prefix + path, body, headers)
+            return conn, conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            if not reused:
+                raise
+        # The server dropped an idle keep-alive connection; retry once on a fresh one.
+        conn = self._new_connection()
+        try:
+            conn.request(method, self._prefix + path, body, headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _check_status(self, conn, response):
+        if response.status == 200:
+            return
+        raw = response.read()
+        conn.close()
+        message = raw.decode("utf-8", "replace")
+        try:
+            message = json.loads(message).get("error", message)
+        except ValueError:
+            pass
+        raise OllamaError("HTTP %d from Ollama: %s" % (response.status, message))
+
+    def request_json(self, method, path, payload=None):
+        conn, response = self._send(method, path, payload)
+        self._check_status(conn, response)
+        data = response.read()
+        self._release(conn, response)
+        return json.loads(data.decode("utf-8")) if data else {}
+
+    def stream(self, path, payload, on_connect=None):
+        """Yield each decoded object of an NDJSON streaming response.
+
+        on_connect(abort) receives a callable that tears the connection down from another thread.
+        """
+        conn, response = self._send("POST", path, payload)
+        self._check_status(conn, response)
+        if on_connect:
+            on_connect(lambda: _abort_connection(conn))
+        finished = False
+        try:
+            pending = b""
+            while True:
+                data = _read_available(response)
+                if not data:
+                    break
+                pending += data
+                while b"\n" in pending:
+                    line, pending = pending.split(b"\n", 1)
+                    if line.strip():
+                        chunk = self._decode_line(line)
+                        yield chunk
+            if pending.strip():
+                yield self._decode_line(pending)
+            finished = True
+        finally:
+            if finished:
+                self._release(conn, response)
+            else:
+                conn.close()
+
+    def _decode_line(self, line):
+        try:
+            chunk = json.loads(line.decode("utf-8"))
+        except ValueError:
+            raise OllamaError("Malformed stream line from Ollama: %r" % line[:200])
+        if chunk.get("error"):
+            raise OllamaError(chunk["error"])
+        return chunk
+
+    def generate(self, model, prompt, system=None, keep_alive=DEFAULT_KEEP_ALIVE, options=None, on_connect=None,
+                 format=None, context=None):
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": keep_alive}
+        if system:
+            payload["system"] = system
+        if context:
+            payload["context"] = context
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return self.stream("/api/generate", payload, on_connect)
+
+    def chat(self, model, messages, keep_alive=DEFAULT_KEEP_ALIVE, options=None, on_connect=None, format=None):
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": keep_alive}
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return self.stream("/api/chat", payload, on_connect)
+
+    def load(self, model, keep_alive=DEFAULT_KEEP_ALIVE):
+        """Load a model without generating anything; keep_alive=0 unloads it instead."""
+        return self.request_json("POST", "/api/generate", {"model": model, "keep_alive": keep_alive, "stream": False})
+
+    def running(self):
+        """Loaded models as reported by /api/ps."""
+        return self.request_json("GET", "/api/ps").get("models") or []
+
+
+def _abort_connection(conn):
+    # shutdown() unblocks a reader stuck in recv(); close() alone does not on every platform.
+    sock = conn.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (socket.error, OSError):
+            pass
+    conn.close()
+
+
+def popen_group(args, **kwargs):
+    """Start a process in its own process group so kill_process_tree() can take its children too."""
+    if IS_WINDOWS:
+        kwargs["creationflags"] = 0x00000200  # CREATE_NEW_PROCESS_GROUP
+    elif hasattr(os, "setsid") and not IS_JYTHON:
+        kwargs["preexec_fn"] = os.setsid
+    return subprocess.Popen(args, **kwargs)
+
+
+def parse_hosts(value, default_concurrency=0):
+    """[(url, max_concurrent)] from a comma-separated string or a list of URLs / {"url", "max_concurrent"} dicts."""
+    if not value:
+        return []
+    if not isinstance(value, list):
+        value = split_list(value)
+    hosts = []
+    for item in value:
+        if isinstance(item, dict):
+            url, limit = item.get("url"), item.get("max_concurrent", default_concurrency)
+        else:
+            url, limit = item, default_concurrency
+        url = str(url or "").strip().rstrip("/")
+        if url and url not in [host[0] for host in hosts]:
+            hosts.append((url, max(0, int(limit or 0))))
+    return hosts
+
+
+class PoolHost(object):
+    def __init__(self, url, max_concurrent):
+        self.url = url
+        self.max_concurrent = max_concurrent  # 0 = no limit
+        self.client = OllamaClient(url)
+        self.outstanding = 0
+        self.healthy = True
+        self.latency = None  # moving average of seconds to the first token
+        self.failures = 0
+        self.served = 0
+        self.failed_at = 0
+
+    def has_room(self):
+        return not self.max_concurrent or self.outstanding < self.max_concurrent
+
+    def describe(self):
+        name = urlparse(self.url).netloc or self.url
+        if not self.healthy:
+            return name + " down"
+        limit = "/" + str(self.max_concurrent) if self.max_concurrent else ""
+        latency = " %.1fs" % self.latency if self.latency is not None else ""
+        return name + " " + str(self.outstanding) + limit + latency
+
+
+class HostPool(object):
+    """Ollama hosts that share the analyses: routing, per-host limits, failover and health checks.
+
+    acquire() picks a healthy host with room, by fewest outstanding calls or lowest observed
+    latency, and waits while every host is at its limit. A host that fails is skipped until
+    its /api/version answers again.
+    """
+
+    LATENCY_WEIGHT = 0.3
+
+    def __init__(self, hosts, routing=ROUTE_LEAST_OUTSTANDING, health_interval=15.0, log=None):
+        self.hosts = [PoolHost(url, limit) for url, limit in hosts]
+        self.routing = routing
+        self.health_interval = health_interval
+        self.log = log or (lambda text: None)
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._checker = None
+
+    def urls(self):
+        return [(host.url, host.max_concurrent) for host in self.hosts]
+
+    def _rank(self, host):
+        latency = host.latency if host.latency is not None else 0.0
+        if self.routing == ROUTE_LATENCY:
+            return (latency, host.outstanding)
+        return (host.outstanding, latency)
+
+    def acquire(self, cancelled=None, exclude=()):
+        """A host reserved for one call, or None when cancelled() turned true or every host was excluded."""
+        with self._cond:
+            while True:
+                candidates = [host for host in self.hosts if host not in exclude]
+                if not candidates:
+                    return None
+                # With every remaining host marked down, try the one that failed longest ago anyway.
+                healthy = [host for host in candidates if host.healthy]
+                if not healthy:
+                    healthy = [min(candidates, key=lambda host: host.failed_at)]
+                free = [host for host in healthy if host.has_room()]
+                if free:
+                    host = min(free, key=self._rank)
+                    host.outstanding += 1
+                    return host
+                if cancelled is not None and cancelled():
+                    return None
+                self._cond.wait(0.25)
+
+    def release(self, host, failed=False):
+        with self._cond:
+            host.outstanding -= 1
+            if failed:
+                host.failures += 1
+                host.failed_at = time.time()
+                if host.healthy and len(self.hosts) > 1:
+                    host.healthy = False
+                    self.log("Ollama host " + host.url + " marked down")
+                    self._start_checker()
+            else:
+                host.served += 1
+            self._cond.notify_all()
+
+    def observe(self, host, seconds):
+        """Record a call's time to first token for lowest-latency routing."""
+        with self._cond:
+            if host.latency is None:
+                host.latency = seconds
+            else:
+                host.latency += self.LATENCY_WEIGHT * (seconds - host.latency)
+
+    def check(self):
+        """Probe every host once; returns how many are healthy."""
+        for host in self.hosts:
+            probe = OllamaClient(host.url, timeout=5)
+            try:
+                probe.request_json("GET", "/api/version")
+                ok = True
+            except Exception:
+                ok = False
+            finally:
+                probe.close()
+            with self._cond:
+                if ok != host.healthy:
+                    self.log("Ollama host " + host.url + (" is back" if ok else " marked down"))
+                host.healthy = ok
+                if not ok:
+                    host.failed_at = time.time()
+                self._cond.notify_all()
+        return len([host for host in self.hosts if host.healthy])
+
+    def _start_checker(self):
+        if self._checker is not None or self.health_interval <= 0:
+            return
+        self._checker = threading.Thread(target=self._check_loop, name="ollama-health")
+        self._checker.daemon = True
+        self._checker.start()
+
+    def _check_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            self.check()
+
+    def start(self):
+        """Begin periodic health checks; only worthwhile with more than one host."""
+        if len(self.hosts) > 1:
+            with self._cond:
+                self._start_checker()
+
+    def summary(self):
+        with self._cond:
+            return ", ".join(host.describe() for host in self.hosts)
+
+    def close(self):
+        self._stopped.set()
+        for host in self.hosts:
+            host.client.close()
+
+
+def pool_hosts(config):
+    """api_hosts when configured, otherwise just api_url."""
+    limit = int(config.get("host_concurrency", 0))
+    return parse_hosts(config.get("api_hosts"), limit) or parse_hosts([config.get("api_url", DEFAULT_API_URL)], limit)
+
+
+def create_pool(config, log=None):
+    pool = HostPool(pool_hosts(config), config.get("routing", ROUTE_LEAST_OUTSTANDING),
+                    float(config.get("health_interval", 15)), log)
+    pool.start()
+    return pool
+
+
+def command_args(path):
+    """The Ollama path as an argument list; a path with arguments or quotes is split like a shell would."""
+    if os.path.isfile(path) or not re.search(r"[\s\"']", path):
+        return [path]
+    if IS_WINDOWS:
+        return [arg.strip('"') for arg in shlex.split(path, posix=False)]
+    return shlex.split(path)
+
+
+SPILL_PREFIXES = ("ollama_spill_", "ollama_tabs_")
+
+
+def _newest_mtime(path):
+    newest = os.path.getmtime(path)
+    for name in os.listdir(path):
+        try:
+            newest = max(newest, os.path.getmtime(os.path.join(path, name)))
+        except OSError:
+            pass
+    return newest
+
+
+def remove_stale_temp_dirs(max_age=2 * 24 * 3600):
+    """Delete ollama_* directories left in the temp dir: those older versions made for one http_traffic.txt,
+    and SpillStore directories a crashed or killed session never closed, once untouched for max_age seconds
+    (a younger one may belong to another running Burp)."""
+    removed = 0
+    root = tempfile.gettempdir()
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return 0
+    cutoff = time.time() - max_age
+    for name in names:
+        path = os.path.join(root, name)
+        if not name.startswith("ollama_") or not os.path.isdir(path):
+            continue
+        try:
+            if name.startswith(SPILL_PREFIXES):
+                stale = _newest_mtime(path) < cutoff
+            else:
+                stale = os.listdir(path) == ["http_traffic.txt"]
+            if stale:
+                shutil.rmtree(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _feed_stdin(process, data):
+    """Write data to the process's stdin on a daemon thread, so reading its output cannot deadlock."""
+    def write():
+        try:
+            process.stdin.write(data)
+        except (IOError, OSError, ValueError):
+            pass  # the process exited or was killed before reading everything
+        finally:
+            try:
+                process.stdin.close()
+            except (IOError, OSError, ValueError):
+                pass
+            process.stdin = None  # already closed; keeps communicate() from flushing it
+
+    writer = threading.Thread(target=write, name="ollama-stdin")
+    writer.daemon = True
+    writer.start()
+    return writer
+
+
+def kill_process_tree(process):
+    if process.poll() is not None:
+        return
+    try:
+        if IS_JYTHON:
+            # Jython wraps a java.lang.Process; kill its descendants through ProcessHandle (Java 9+).
+            java_process = getattr(process, "_process", None)
+            if java_process is not None and hasattr(java_process, "descendants"):
+                for handle in java_process.descendants().toArray():
+                    handle.destroyForcibly()
+                java_process.destroyForcibly()
+                return
+        elif IS_WINDOWS:
+            with open(os.devnull, "w") as devnull:
+                subprocess.call(["taskkill", "/F", "/T", "/PID", str(process.pid)], stdout=devnull, stderr=devnull)
+            return
+        elif hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+    except (OSError, AttributeError):
+        pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+ORDER_FIFO = "fifo"
+ORDER_PRIORITY = "priority"
+
+#Lower numbers run first when the queue is in priority order.
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BATCH = 20
+PRIORITY_BACKGROUND = 30
+
+
+def default_parallelism():
+    """Match the server's OLLAMA_NUM_PARALLEL when it is set in our environment."""
+    try:
+        return max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "")))
+    except ValueError:
+        return 2
+
+
+class AnalysisJob(object):
+    def __init__(self, func, priority, seq, on_status=None, name=None, preemptible=False):
+        self.func = func
+        self.priority = priority
+        self.seq = seq
+        self.name = name
+        self.preemptible = preemptible
+        self.status = JOB_QUEUED
+        self.error = None
+        self.result = None
+        self.cached = False
+        self.duplicate = False
+        self.truncated = False
+        self.cancel_reason = None
+        self.metrics = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self._on_status = on_status
+        self._cancelled = threading.Event()
+        self._hooks = []
+        self._hook_lock = threading.Lock()
+
+    def cancel(self, reason="cancelled"):
+        """Flag the job and fire its cancel hooks so blocked reads return immediately."""
+        with self._hook_lock:
+            if self._cancelled.is_set():
+                return
+            self.cancel_reason = reason
+            self._cancelled.set()
+            hooks = list(self._hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                pass
+
+    def add_cancel_hook(self, hook):
+        with self._hook_lock:
+            if not self._cancelled.is_set():
+                self._hooks.append(hook)
+                return
+        hook()
+
+    def remove_cancel_hook(self, hook):
+        with self._hook_lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_active(self):
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def watch(self, on_status):
+        """Replace the status callback and report the current status to it."""
+        self._on_status = on_status
+        self._set_status(self.status)
+
+    def _set_status(self, status):
+        self.status = status
+        if self._on_status:
+            try:
+                self._on_status(self)
+            except Exception:
+                pass
+
+
+class AnalysisQueue(object):
+    """Bounded worker pool; jobs run as func(job) and are ordered FIFO or by priority.
+
+    Preemptible jobs only use idle workers: they wait behind every other job, and a running one is
+    cancelled when an interactive job arrives and no worker is free.
+    """
+
+    def __init__(self, workers=None, ordering=ORDER_FIFO):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        self._ordering = ordering
+        self._target = max(1, int(workers or default_parallelism()))
+        self._alive = 0
+        self._running = 0
+        self._active = set()
+        self._shutdown = False
+        self._spawn()
+
+    def _sort_key(self, job):
+        if self._ordering == ORDER_PRIORITY:
+            return (job.preemptible, job.priority, job.seq)
+        return (job.preemptible, 0, job.seq)
+
+    def _spawn(self):
+        while self._alive < self._target:
+            self._alive += 1
+            worker = threading.Thread(target=self._work, name="ollama-worker")
+            worker.daemon = True
+            worker.start()
+
+    def set_workers(self, workers):
+        with self._cond:
+            self._target = max(1, int(workers))
+            self._spawn()
+            self._cond.notify_all()
+
+    def set_ordering(self, ordering):
+        with self._cond:
+            self._ordering = ordering
+            self._heap = [(self._sort_key(job), job.seq, job) for _, _, job in self._heap]
+            heapq.heapify(self._heap)
+
+    def submit(self, func, priority=PRIORITY_INTERACTIVE, on_status=None, name=None, preemptible=False):
+        victim = None
+        with self._cond:
+            self._seq += 1
+            job = AnalysisJob(func, priority, self._seq, on_status, name, preemptible)
+        # Marked queued before a worker can see it, so this never overwrites a later status.
+        job._set_status(JOB_QUEUED)
+        with self._cond:
+            heapq.heappush(self._heap, (self._sort_key(job), job.seq, job))
+            if priority == PRIORITY_INTERACTIVE and not preemptible and self._running >= self._target:
+                victims = [running for running in self._active if running.preemptible and not running.is_cancelled()]
+                if victims:
+                    victim = max(victims, key=lambda running: running.seq)
+            self._cond.notify()
+        if victim is not None:
+            victim.cancel("preempted")
+        return job
+
+    def promote(self, job, priority=PRIORITY_INTERACTIVE):
+        """Make a preemptible job an ordinary one at priority, e.g. once someone is waiting for it."""
+        with self._cond:
+            job.priority = priority
+            job.preemptible = False
+            self._heap = [(self._sort_key(queued), queued.seq, queued) for _, _, queued in self._heap]
+            heapq.heapify(self._heap)
+
+    def run_now(self, func, priority=PRIORITY_INTERACTIVE, on_status=None, name=None):
+        """Run a job on its own thread, outside the worker limit; only for quick work that never calls a model."""
+        with self._cond:
+            self._seq += 1
+            job = AnalysisJob(func, priority, self._seq, on_status, name)
+        job._set_status(JOB_QUEUED)
+        worker = threading.Thread(target=self._run, args=(job,), name="ollama-local")
+        worker.daemon = True
+        worker.start()
+        return job
+
+    def cancel(self, job, reason="cancelled"):
+        job.cancel(reason)
+        with self._cond:
+            queued = [entry for entry in self._heap if entry[2] is job]
+            if queued:
+                self._heap.remove(queued[0])
+                heapq.heapify(self._heap)
+        if queued:
+            job._set_status(JOB_CANCELLED)
+
+    def counts(self):
+        with self._cond:
+            return len(self._heap), self._running
+
+    def shutdown(self, reason="shut down"):
+        """Cancel every queued and running job; the workers exit as they come free."""
+        with self._cond:
+            self._shutdown = True
+            pending = [job for _, _, job in self._heap]
+            self._heap = []
+            running = list(self._active)
+            self._cond.notify_all()
+        for job in running:
+            job.cancel(reason)
+        for job in pending:
+            job.cancel(reason)
+            job._set_status(JOB_CANCELLED)
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._shutdown or self._alive > self._target:
+                    self._alive -= 1
+                    return None
+                if self._heap:
+                    self._running += 1
+                    job = heapq.heappop(self._heap)[2]
+                    self._active.add(job)
+                    return job
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._active.discard(job)
+
+    def _run(self, job):
+        if job.is_cancelled():
+            job._set_status(JOB_CANCELLED)
+            return
+        job.started_at = time.time()
+        job._set_status(JOB_RUNNING)
+        try:
+            job.result = job.func(job)
+        except Exception as e:
+            job.error = e
+            job._set_status(JOB_CANCELLED if job.is_cancelled() else JOB_FAILED)
+            return
+        job._set_status(JOB_CANCELLED if job.is_cancelled() else JOB_DONE)
+
+
+def build_content(request_text=None, response_text=None):
+    """Traffic block sent to the model; pass None to leave a side out."""
+    content = ""
+    if request_text is not None:
+        content += "===== REQUEST =====\n"
+        content += request_text + "\n\n"
+    if response_text is not None:
+        content += "===== RESPONSE =====\n"
+        content += response_text + "\n\n"
+    return content
+
+
+def user_prompt(custom_prompt, content, stable_prefix=True):
+    """The user turn: traffic first and the task last, so calls sharing traffic share a prompt prefix.
+
+    With stable_prefix off, the task comes first (the layout used before prompt caching was considered).
+    """
+    if not custom_prompt:
+        return content
+    if stable_prefix:
+        return content + "===== TASK =====\n" + custom_prompt
+    return custom_prompt + "\n\n" + content
+
+
+def host_context(config, host):
+    """Notes from the host_context config ({"*.example.com": "text"}) for a host, as a leading traffic block."""
+    notes = [text for pattern, text in sorted((config.get("host_context") or {}).items())
+             if host and fnmatch.fnmatch(host.lower(), pattern.lower())]
+    if not notes:
+        return ""
+    return "===== HOST CONTEXT =====\n" + "\n".join(notes) + "\n\n"
+
+
+class Conversation(object):
+    """Follow-up state for one tab: what the model has seen about the last traffic analyzed there.
+
+    A later analysis of the same traffic with the same model and system prompt only sends the new
+    question, continuing from Ollama's returned context (generate) or the message history (chat).
+    source is the Analyzer's cache key of that traffic with no question, so a follow-up can be
+    recognised before the traffic is reduced.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.source = None
+        self.context = None
+        self.messages = None
+        self.turns = 0
+
+    def follows(self, key):
+        return key is not None and key == self.key and (self.context is not None or self.messages is not None)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return "%ds" % seconds
+    if seconds < 3600:
+        return "%dm%02ds" % (seconds // 60, seconds % 60)
+    return "%dh%02dm" % (seconds // 3600, (seconds % 3600) // 60)
+
+
+class BatchProgress(object):
+    """Thread-safe counters for a batch run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.started = None
+        self.last_finished = None
+
+    def add(self, count=1):
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+            self.total += count
+
+    def record(self, status):
+        with self._lock:
+            if status == JOB_DONE:
+                self.done += 1
+            elif status == JOB_FAILED:
+                self.failed += 1
+            elif status == JOB_CANCELLED:
+                self.cancelled += 1
+            else:
+                return
+            self.last_finished = time.time()
+
+    def finished(self):
+        return self.done + self.failed + self.cancelled
+
+    def rate(self):
+        """Items finished per second since the batch started."""
+        if self.started is None:
+            return 0.0
+        end = self.last_finished if self.finished() >= self.total else time.time()
+        elapsed = (end or time.time()) - self.started
+        return self.finished() / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        text = "%d/%d analyzed, %d failed, %d cancelled, %.2f items/s" % (
+            self.finished(), self.total, self.failed, self.cancelled, self.rate())
+        remaining = self.total - self.finished()
+        rate = self.rate()
+        if remaining > 0 and rate > 0:
+            text += ", ETA " + format_duration(remaining / rate)
+        return text
+
+
+COMPARE_WAITING = "waiting"
+COMPARE_SKIPPED = "skipped"
+
+
+class ModelComparison(object):
+    """The same traffic sent to several models, at most parallel of them at a time.
+
+    submit(model, on_status) queues one model's analysis and returns its AnalysisJob; cancel(job)
+    stops one. With early_stop, the first model to finish is chosen and the others are cancelled.
+    """
+
+    def __init__(self, models, submit, cancel, parallel=0, early_stop=False, on_update=None):
+        self.models = list(models)
+        self.jobs = {}
+        self.chosen = None
+        self._submit = submit
+        self._cancel = cancel
+        self._parallel = parallel if parallel > 0 else len(self.models)
+        self._early_stop = early_stop
+        self._on_update = on_update or (lambda comparison: None)
+        self._waiting = list(self.models)
+        self._running = 0
+        self._finished = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._launch()
+
+    def _launch(self):
+        while True:
+            with self._lock:
+                if self.chosen is not None or not self._waiting or self._running >= self._parallel:
+                    return
+                model = self._waiting.pop(0)
+                self._running += 1
+            job = self._submit(model, lambda job, model=model: self._status(model, job))
+            with self._lock:
+                self.jobs[model] = job
+
+    def _status(self, model, job):
+        finished = False
+        with self._lock:
+            self.jobs[model] = job
+            if job.status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED) and model not in self._finished:
+                self._finished.add(model)
+                self._running -= 1
+                finished = True
+        if finished:
+            if self._early_stop and job.status == JOB_DONE and self.chosen is None:
+                self.choose(model)
+            self._launch()
+        self._on_update(self)
+
+    def choose(self, model):
+        """Keep model's result and cancel every other model still waiting or running."""
+        with self._lock:
+            self.chosen = model
+            self._waiting = []
+            others = [job for name, job in self.jobs.items() if name != model and job is not None and job.is_active()]
+        for job in others:
+            self._cancel(job)
+        self._on_update(self)
+
+    def cancel(self):
+        with self._lock:
+            self._waiting = []
+            jobs = [job for job in self.jobs.values() if job is not None and job.is_active()]
+        for job in jobs:
+            self._cancel(job)
+
+    def is_active(self):
+        with self._lock:
+            return bool(self._waiting) or self._running > 0
+
+    def status(self, model):
+        job = self.jobs.get(model)
+        if job is not None:
+            return job.status
+        return COMPARE_SKIPPED if self.chosen is not None or not self.is_active() else COMPARE_WAITING
+
+    def describe(self, model):
+        """One line of measurements for model's run so far."""
+        job = self.jobs.get(model)
+        metrics = job.metrics if job is not None else None
+        text = self.status(model)
+        if model == self.chosen:
+            text += ", chosen"
+        if metrics is None or job.status == JOB_QUEUED:
+            return text
+        total = metrics.total if metrics.total is not None else metrics.elapsed()
+        return "%s | %.2fs, first token %s, %s tok/s, %s" % (
+            text, total, "%.2fs" % metrics.ttft if metrics.ttft is not None else "-",
+            "%.1f" % metrics.tokens_per_sec if metrics.tokens_per_sec else "-", format_size(metrics.output_bytes))
+
+
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".burp_ai_analyzer")
+
+CACHE_OFF = "off"
+CACHE_MEMORY = "memory"
+CACHE_DISK = "memory + disk"
+
+
+def _to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode("utf-8", "replace")
+
+
+def normalize_traffic(content):
+    """Line endings and trailing whitespace must not defeat the cache."""
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(model, system_prompt, custom_prompt, include_request, include_response, content, variant=""):
+    """variant carries any other setting that changes what the model sees, e.g. traffic reduction."""
+    digest = hashlib.sha256()
+    flags = "%d%d" % (bool(include_request), bool(include_response))
+    for part in (model, system_prompt, custom_prompt, flags, variant, normalize_traffic(content)):
+        digest.update(_to_bytes(part or ""))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """Analysis results keyed by cache_key(): an in-memory LRU plus an optional on-disk tier."""
+
+    EVICT_EVERY = 20
+
+    def __init__(self, memory_entries=256, directory=None, max_disk_bytes=64 * 1024 * 1024,
+                 max_age_seconds=30 * 24 * 3600):
+        self._memory = OrderedDict()
+        self._memory_entries = memory_entries
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._max_age = max_age_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                self._directory = None
+
+    def enabled(self):
+        return self._memory_entries > 0 or self._directory is not None
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + ".json")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory[key] = entry
+                return entry
+        if not self._directory:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self._max_age:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                entry = json.loads(f.read().decode("utf-8"))
+            # mtime doubles as last-access time for disk eviction.
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, result, model=None):
+        if not self.enabled():
+            return
+        entry = {"result": result, "model": model, "created": time.time()}
+        self._remember(key, entry)
+        if not self._directory:
+            return
+        path = self._path(key)
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(entry).encode("utf-8"))
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            return
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 1:
+            self.evict_disk()
+
+    def _remember(self, key, entry):
+        if self._memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory.pop(key, None)
+            self._memory[key] = entry
+            while len(self._memory) > self._memory_entries:
+                self._memory.popitem(last=False)
+
+    def evict_disk(self):
+        """Drop expired entries, then the least recently used until under the size cap."""
+        if not self._directory:
+            return
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self._directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._directory, name)
+            try:
+                st = os.stat(path)
+                if now - st.st_mtime > self._max_age:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        while total > self._max_disk_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._directory:
+            for name in os.listdir(self._directory):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self._directory, name))
+                    except OSError:
+                        pass
+
+
+def create_cache(config):
+    mode = config.get("cache_mode", CACHE_MEMORY)
+    if mode == CACHE_OFF:
+        return ResultCache(memory_entries=0)
+    directory = None
+    if mode == CACHE_DISK:
+        directory = os.path.join(CONFIG_DIR, "cache")
+    return ResultCache(
+        memory_entries=int(config.get("cache_memory_entries", 256)),
+        directory=directory,
+        max_disk_bytes=int(config.get("cache_max_mb", 64)) * 1024 * 1024,
+        max_age_seconds=int(config.get("cache_max_age_days", 30)) * 24 * 3600
+    )
+
+
+BINARY_TYPE_PREFIXES = (
+    "image/", "audio/", "video/", "font/", "application/octet-stream", "application/zip",
+    "application/gzip", "application/x-gzip", "application/pdf", "application/wasm",
+    "application/x-protobuf", "application/grpc", "application/x-shockwave-flash"
+)
+COMPRESSED_ENCODINGS = ("gzip", "br", "deflate", "zstd", "compress")
+
+_DATA_URI = re.compile(r"data:([\w/+.-]+);base64,[A-Za-z0-9+/=]{100,}")
+_STYLE_BLOCK = re.compile(r"(<style[^>]*>)(.*?)(</style>)", re.I | re.S)
+_SVG_BLOCK = re.compile(r"<svg\b.*?</svg>", re.I | re.S)
+_BETWEEN_TAGS = re.compile(r">\s+<")
+_SPACES = re.compile(r"[ \t]{2,}")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def estimate_tokens(text):
+    """Rough token count; four characters per token is close enough for English and code."""
+    return (len(text) + 3) // 4
+
+
+def format_size(size):
+    if size < 1024:
+        return "%d B" % size
+    if size < 1024 * 1024:
+        return "%.1f KB" % (size / 1024.0)
+    if size < 1024 * 1024 * 1024:
+        return "%.1f MB" % (size / (1024.0 * 1024))
+    return "%.1f GB" % (size / (1024.0 * 1024 * 1024))
+
+
+def split_message(text):
+    """Split raw HTTP text into (head, separator, body)."""
+    for sep in ("\r\n\r\n", "\n\n"):
+        idx = text.find(sep)
+        if idx >= 0:
+            return text[:idx], sep, text[idx + len(sep):]
+    return text, "", ""
+
+
+def looks_binary(body, sample=2048):
+    chunk = body[:sample]
+    if not chunk:
+        return False
+    odd = 0
+    for ch in chunk:
+        code = ord(ch)
+        if (code < 32 and ch not in "\t\r\n") or code == 0xFFFD:
+            odd += 1
+    return odd > len(chunk) * 0.1
+
+
+def body_kind(content_type, body):
+    """Coarse body type used to pick minification, sampling and chunking rules."""
+    if "json" in content_type:
+        return "json"
+    if "html" in content_type:
+        return "html"
+    if "javascript" in content_type or "ecmascript" in content_type:
+        return "javascript"
+    if "css" in content_type:
+        return "css"
+    if "xml" in content_type:
+        return "xml"
+    stripped = body.lstrip()[:1]
+    if stripped in ("{", "["):
+        return "json"
+    if stripped == "<":
+        return "html"
+    if content_type.startswith("text/") or not content_type:
+        return "text"
+    return "other"
+
+
+def header_value(head, name):
+    prefix = name.lower() + ":"
+    for line in head.splitlines()[1:]:
+        if line.lower().startswith(prefix):
+            return line[len(prefix):].strip()
+    return ""
+
+
+class ReductionStats(object):
+    def __init__(self):
+        self.original_bytes = 0
+        self.reduced_bytes = 0
+        self.actions = []
+
+    def saved_bytes(self):
+        return self.original_bytes - self.reduced_bytes
+
+    def tokens_saved(self):
+        return max(0, self.saved_bytes()) // 4
+
+    def summary(self):
+        text = "Traffic reduced %s -> %s (~%d tokens saved)" % (
+            format_size(self.original_bytes), format_size(self.reduced_bytes), self.tokens_saved())
+        if self.actions:
+            text += ": " + "; ".join(self.actions)
+        return text
+
+
+class TrafficReducer(object):
+    """Shrinks request/response text before prompting without hiding what matters for security review."""
+
+    KIND_LIMIT_SCALE = {"css": 0.25, "other": 0.5}
+
+    def __init__(self, enabled=True, max_body_bytes=16384, header_value_limit=256, max_repeated_headers=3):
+        self.enabled = enabled
+        self.max_body_bytes = max_body_bytes
+        self.header_value_limit = header_value_limit
+        self.max_repeated_headers = max_repeated_headers
+
+    def signature(self):
+        if not self.enabled:
+            return "raw"
+        return "reduce:%d:%d:%d" % (self.max_body_bytes, self.header_value_limit, self.max_repeated_headers)
+
+    def reduce(self, request_text, response_text):
+        """Return (request, response, ReductionStats); None sides stay None."""
+        stats = ReductionStats()
+        request = self._reduce_message(request_text, stats, "request")
+        response = self._reduce_message(response_text, stats, "response")
+        return request, response, stats
+
+    def _reduce_message(self, text, stats, label):
+        if text is None:
+            return None
+        stats.original_bytes += len(text)
+        if self.enabled and text:
+            head, sep, body = split_message(text)
+            head, content_type, encoding = self._reduce_headers(head, stats, label)
+            body = self._reduce_body(body, content_type, encoding, stats, label)
+            text = head + sep + body
+        stats.reduced_bytes += len(text)
+        return text
+
+    def _shorten_value(self, value, limit):
+        if len(value) <= limit:
+            return value
+        return value[:limit] + "...(%d chars)" % len(value)
+
+    def _shorten_cookies(self, value, separator):
+        pairs = []
+        for pair in value.split(separator):
+            name, eq, cookie = pair.partition("=")
+            pairs.append(name + eq + self._shorten_value(cookie, 48))
+        return separator.join(pairs)
+
+    def _reduce_headers(self, head, stats, label):
+        lines = head.splitlines()
+        if not lines:
+            return head, "", ""
+        kept = [lines[0]]
+        seen = set()
+        counts = {}
+        omitted = {}
+        content_type = ""
+        encoding = ""
+        for line in lines[1:]:
+            name, colon, value = line.partition(":")
+            key = name.strip().lower()
+            if not colon:
+                kept.append(line)
+                continue
+            if key == "content-type":
+                content_type = value.strip().lower()
+            elif key == "content-encoding":
+                encoding = value.strip().lower()
+            if line in seen:
+                omitted[name.strip()] = omitted.get(name.strip(), 0) + 1
+                continue
+            seen.add(line)
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] > self.max_repeated_headers:
+                omitted[name.strip()] = omitted.get(name.strip(), 0) + 1
+                continue
+            value = value.strip()
+            if key == "cookie":
+                value = self._shorten_cookies(value, "; ")
+            elif key == "set-cookie":
+                cookie, semi, attributes = value.partition(";")
+                value = self._shorten_cookies(cookie, "; ") + semi + attributes
+            elif key != "authorization":
+                value = self._shorten_value(value, self.header_value_limit)
+            kept.append(name + ": " + value)
+        for name in sorted(omitted):
+            kept.append("[... %d more %s headers omitted ...]" % (omitted[name], name))
+            stats.actions.append("%s: collapsed %d %s headers" % (label, omitted[name], name))
+        newline = "\r\n" if "\r\n" in head else "\n"
+        return newline.join(kept), content_type, encoding
+
+    def _reduce_body(self, body, content_type, encoding, stats, label):
+        if not body:
+            return body
+        is_binary_type = content_type.startswith(BINARY_TYPE_PREFIXES) and "svg" not in content_type
+        if is_binary_type or looks_binary(body) or (encoding in COMPRESSED_ENCODINGS and looks_binary(body, 256)):
+            stats.actions.append("%s: omitted %s binary body" % (label, format_size(len(body))))
+            return "[binary body omitted: %s%s, %d bytes]" % (
+                content_type or "unknown type", ", " + encoding if encoding else "", len(body))
+
+        kind = body_kind(content_type, body)
+        original = len(body)
+        body = self._minify(kind, body)
+        if len(body) < original:
+            stats.actions.append("%s: minified %s %s -> %s" % (label, kind, format_size(original), format_size(len(body))))
+
+        limit = int(self.max_body_bytes * self.KIND_LIMIT_SCALE.get(kind, 1.0))
+        if limit > 0 and len(body) > limit:
+            stats.actions.append("%s: sampled %s body to %s" % (label, format_size(len(body)), format_size(limit)))
+            body = self._sample(body, limit)
+        return body
+
+    def _minify(self, kind, body):
+        if kind == "json":
+            try:
+                return json.dumps(json.loads(body), separators=(",", ":"), ensure_ascii=False)
+            except ValueError:
+                return body
+        if kind in ("html", "xml"):
+            body = _DATA_URI.sub(lambda m: "data:%s;base64,[%d bytes]" % (m.group(1), len(m.group(0))), body)
+            body = _STYLE_BLOCK.sub(lambda m: m.group(1) + ("[%d bytes of CSS]" % len(m.group(2)) if len(m.group(2)) > 512 else m.group(2)) + m.group(3), body)
+            body = _SVG_BLOCK.sub(lambda m: "<svg>[%d bytes]</svg>" % len(m.group(0)) if len(m.group(0)) > 512 else m.group(0), body)
+            body = _BETWEEN_TAGS.sub("><", body)
+        if kind in ("html", "xml", "javascript", "css", "text"):
+            body = _SPACES.sub(" ", body)
+            body = _BLANK_LINES.sub("\n", body)
+        return body
+
+    def _sample(self, body, limit):
+        """Keep the start and the end; both tend to carry the interesting parts."""
+        head = limit * 2 // 3
+        tail = limit - head
+        return body[:head] + "\n[... %d bytes omitted ...]\n" % (len(body) - limit) + body[-tail:]
+
+
+def create_reducer(config):
+    return TrafficReducer(
+        enabled=bool(config.get("reduce_traffic", True)),
+        max_body_bytes=int(config.get("max_body_kb", 16)) * 1024
+    )
+
+
+_BLOCK_TAGS = r"(?:script|style|form|section|article|div|table|ul|ol|nav|header|footer|main|body|head|iframe|template)"
+_CHUNK_BOUNDARIES = {
+    "json": [(re.compile(r"[}\]],"), "end")],
+    "html": [(re.compile(r"<" + _BLOCK_TAGS + r"\b", re.I), "start"),
+             (re.compile(r"</" + _BLOCK_TAGS + r">", re.I), "end")],
+    "javascript": [(re.compile(r"[;}]\s*\n"), "end"),
+                   (re.compile(r"\n(?=(?:function|const|let|var|class|export|import)\b)"), "end")],
+}
+_CHUNK_BOUNDARIES["xml"] = _CHUNK_BOUNDARIES["html"]
+_LINE_BOUNDARY = [(re.compile(r"\n"), "end")]
+
+
+class TrafficChunker(object):
+    """Splits traffic that is too big for one prompt into overlapping chunks on structural boundaries."""
+
+    def __init__(self, chunk_size=12288, overlap=512):
+        self.chunk_size = max(1024, chunk_size)
+        self.overlap = min(overlap, self.chunk_size // 4)
+
+    def signature(self):
+        return "chunk:%d:%d" % (self.chunk_size, self.overlap)
+
+    def needs_chunking(self, request, response):
+        return len(request or "") + len(response or "") > self.chunk_size
+
+    def chunk_traffic(self, request, response):
+        """Return prompt-ready blocks labelled with their part number."""
+        pieces = []
+        for label, text in (("REQUEST", request), ("RESPONSE", response)):
+            if text:
+                pieces.extend((label, piece) for piece in self.split(text))
+        total = len(pieces)
+        return ["===== %s (part %d/%d) =====\n%s\n" % (label, i + 1, total, piece)
+                for i, (label, piece) in enumerate(pieces)]
+
+    def split(self, text):
+        head, sep, body = split_message(text)
+        if not body:
+            return self._pack([text])
+        kind = body_kind(header_value(head, "content-type").lower(), body)
+        return self._pack([head + sep] + self._segments(body, kind))
+
+    def _segments(self, body, kind):
+        cuts = set()
+        for pattern, edge in _CHUNK_BOUNDARIES.get(kind, _LINE_BOUNDARY):
+            for match in pattern.finditer(body):
+                cuts.add(match.start() if edge == "start" else match.end())
+        segments = []
+        last = 0
+        for cut in sorted(cuts):
+            if 0 < cut < len(body) and cut > last:
+                segments.append(body[last:cut])
+                last = cut
+        segments.append(body[last:])
+        return segments
+
+    def _pack(self, units):
+        chunks = []
+        current = ""
+        for unit in units:
+            while len(unit) > self.chunk_size:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(unit[:self.chunk_size])
+                unit = unit[self.chunk_size - self.overlap:]
+            if current and len(current) + len(unit) > self.chunk_size:
+                chunks.append(current)
+                current = current[-self.overlap:] if self.overlap else ""
+            current += unit
+        if current.strip() or not chunks:
+            chunks.append(current)
+        return chunks
+
+
+def create_chunker(config):
+    return TrafficChunker(chunk_size=int(config.get("chunk_kb", 12)) * 1024)
+
+
+def run_parallel(tasks, parallelism, on_result=None, should_stop=None):
+    """Run callables on at most `parallelism` threads; on_result(index, result, error) fires as each finishes."""
+    results = [None] * len(tasks)
+    errors = [None] * len(tasks)
+    pending = list(range(len(tasks)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending or (should_stop and should_stop()):
+                    return
+                index = pending.pop(0)
+            try:
+                results[index] = tasks[index]()
+            except Exception as e:
+                errors[index] = e
+            if on_result:
+                on_result(index, results[index], errors[index])
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(parallelism, len(tasks))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+MAP_INSTRUCTIONS = (
+    "The traffic below is one part of an HTTP exchange that was too large to analyze at once. "
+    "Report only what this part shows and do not speculate about the other parts."
+)
+REDUCE_INSTRUCTIONS = (
+    "Below are analyses of consecutive parts of one HTTP exchange. Merge them into a single report: "
+    "remove duplicates, keep the most specific evidence for each finding and do not mention the parts."
+)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+
+class AnalysisMetrics(object):
+    """Timings and sizes for one analysis. Durations are in seconds, Ollama's own are converted from ns."""
+
+    def __init__(self, model, backend, queue_wait=0.0):
+        self.model = model
+        self.backend = backend
+        self.timestamp = time.time()
+        self.queue_wait = queue_wait
+        self.prompt_build = None
+        self.setup = None
+        self.ttft = None
+        self.total = None
+        self.input_bytes = 0
+        self.input_tokens = 0
+        self.output_bytes = 0
+        self.output_tokens = None
+        self.tokens_per_sec = None
+        self.eval_count = None
+        self.eval_duration = None
+        self.prompt_eval_count = None
+        self.prompt_eval_duration = None
+        self.load_duration = None
+        self.status = None
+        self.cached = False
+        self.duplicate = False
+        self.triage_score = None
+        self.triage_seconds = None
+        self.escalated = None  # None when the cascade did not triage this analysis
+        self._start = time.time()
+        self._setup_start = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.time() - self._start
+
+    def set_input(self, content):
+        self.input_bytes = len(content)
+        self.input_tokens = estimate_tokens(content)
+
+    def begin_setup(self):
+        with self._lock:
+            if self._setup_start is None:
+                self._setup_start = time.time()
+
+    def mark_setup(self):
+        """Process spawned (CLI) or response headers received (API)."""
+        with self._lock:
+            if self.setup is None:
+                self.setup = time.time() - (self._setup_start or self._start)
+
+    def add_output(self, text):
+        with self._lock:
+            if self.ttft is None and text:
+                self.ttft = self.elapsed()
+            self.output_bytes += len(text)
+
+    def add_ollama_stats(self, chunk):
+        """Sum the counters from a final (done) API chunk; map-reduce runs report several."""
+        with self._lock:
+            for name in ("eval_count", "prompt_eval_count"):
+                if name in chunk:
+                    setattr(self, name, (getattr(self, name) or 0) + chunk[name])
+            for name in ("eval_duration", "prompt_eval_duration", "load_duration"):
+                if name in chunk:
+                    setattr(self, name, (getattr(self, name) or 0.0) + chunk[name] / 1e9)
+
+    def finish(self, status):
+        self.status = status
+        self.total = self.elapsed()
+        if self.eval_count is not None:
+            self.output_tokens = self.eval_count
+        elif self.output_bytes:
+            self.output_tokens = (self.output_bytes + 3) // 4
+        if self.eval_count and self.eval_duration:
+            self.tokens_per_sec = self.eval_count / self.eval_duration
+        elif self.output_tokens and self.ttft is not None and self.total > self.ttft:
+            self.tokens_per_sec = self.output_tokens / (self.total - self.ttft)
+
+    def to_dict(self):
+        return dict((key, value) for key, value in self.__dict__.items() if not key.startswith("_"))
+
+
+class MetricsStore(object):
+    """Keeps the most recent analyses' metrics and summarizes them per model."""
+
+    SUMMARY_FIELDS = ("total", "ttft", "tokens_per_sec", "queue_wait", "prompt_eval_duration")
+
+    def __init__(self, max_entries=5000):
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def add(self, metrics):
+        with self._lock:
+            self._entries.append(metrics)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def summary_by_model(self):
+        """{model: {"runs", "cache_hits", "failed", "avg_input_bytes", "<field>_p50", "<field>_p95", ...}}"""
+        groups = OrderedDict()
+        for metrics in self.snapshot():
+            groups.setdefault(metrics.model, []).append(metrics)
+        summary = OrderedDict()
+        for model, entries in groups.items():
+            live = [m for m in entries if not m.cached]
+            row = {
+                "runs": len(entries),
+                "cache_hits": len(entries) - len(live),
+                "duplicates": len([m for m in entries if m.duplicate]),
+                "failed": len([m for m in entries if m.status == JOB_FAILED]),
+                "avg_input_bytes": sum(m.input_bytes for m in live) // len(live) if live else 0,
+                "avg_output_tokens": sum(m.output_tokens or 0 for m in live) // len(live) if live else 0,
+            }
+            for field in self.SUMMARY_FIELDS:
+                values = [getattr(m, field) for m in live if getattr(m, field) is not None]
+                row[field + "_p50"] = percentile(values, 50)
+                row[field + "_p95"] = percentile(values, 95)
+            summary[model] = row
+        return summary
+
+    def cascade_summary(self):
+        """Triage counts and model time saved, or None before any triage; time_saved needs a full analysis to compare."""
+        entries = self.snapshot()
+        triaged = [m for m in entries if m.escalated is not None]
+        if not triaged:
+            return None
+        escalated = [m for m in triaged if m.escalated]
+        # A skipped item would have cost about as much as a typical full analysis.
+        full = [m.total - (m.triage_seconds or 0) for m in escalated if m.status == JOB_DONE and m.total]
+        if not full:
+            full = [m.total for m in entries if m.escalated is None and not m.cached and m.status == JOB_DONE and m.total]
+        typical = percentile(full, 50)
+        saved = None
+        if typical is not None:
+            saved = max(0.0, sum(typical - (m.triage_seconds or 0) for m in triaged if not m.escalated))
+        return {"triaged": len(triaged), "escalated": len(escalated),
+                "escalation_rate": len(escalated) / float(len(triaged)), "time_saved": saved}
+
+    def export_jsonl(self, path):
+        entries = self.snapshot()
+        with open(path, "wb") as f:
+            for metrics in entries:
+                f.write((json.dumps(metrics.to_dict(), sort_keys=True) + "\n").encode("utf-8"))
+        return len(entries)
+
+
+_UUID_SEGMENT = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+_NUMERIC_SEGMENT = re.compile(r"^\d+(\.\w+)?$")
+_HEX_SEGMENT = re.compile(r"^[0-9a-f]{16,}$", re.I)
+_TOKEN_SEGMENT = re.compile(r"^[A-Za-z0-9_~.=-]{24,}$")
+_HTML_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9-]*)([^>]*)>")
+_HTML_NAME = re.compile(r"""\bname\s*=\s*["']?([^"'\s>]+)""", re.I)
+_MULTIPART_NAME = re.compile(r"""Content-Disposition:[^\n]*\bname="([^"]*)\"""", re.I)
+SHAPE_SCAN_BYTES = 256 * 1024
+
+
+def template_segment(segment):
+    """Replace the variable part of a path segment: numbers, UUIDs, hex ids and opaque tokens."""
+    if _NUMERIC_SEGMENT.match(segment):
+        return _NUMERIC_SEGMENT.sub(lambda m: "{n}" + (m.group(1) or ""), segment)
+    if _UUID_SEGMENT.match(segment):
+        return "{uuid}"
+    if _HEX_SEGMENT.match(segment):
+        return "{hex}"
+    if _TOKEN_SEGMENT.match(segment) and re.search(r"\d", segment):
+        return "{token}"
+    return segment
+
+
+def path_template(path):
+    return "/".join(template_segment(segment) for segment in path.split("/"))
+
+
+def _json_paths(value, prefix, paths, limit=400):
+    if len(paths) >= limit:
+        return
+    if isinstance(value, dict):
+        for key in value:
+            _json_paths(value[key], prefix + "." + key if prefix else key, paths, limit)
+    elif isinstance(value, list):
+        for item in value[:3]:
+            _json_paths(item, prefix + "[]", paths, limit)
+        if not value:
+            paths.add(prefix + "[]")
+    else:
+        kind = "null" if value is None else "bool" if isinstance(value, bool) else \
+            "num" if isinstance(value, (int, float)) else "str"
+        paths.add(prefix + ":" + kind)
+
+
+def _param_names(text, content_type):
+    """Names of query, form, multipart or JSON body parameters; values are ignored."""
+    names = set()
+    kind = body_kind(content_type, text)
+    if kind == "json":
+        try:
+            _json_paths(json.loads(text), "", names)
+            return set(name.split(":")[0] for name in names)
+        except ValueError:
+            return names
+    if "multipart" in content_type:
+        return set(_MULTIPART_NAME.findall(text))
+    if "=" in text and "\n" not in text.strip():
+        for pair in text.split("&"):
+            name = pair.split("=", 1)[0].strip()
+            if name:
+                names.add(name)
+    return names
+
+
+def request_shape(request):
+    """(method, path template, sorted parameter names) of a raw request, or None if it has no request line."""
+    head, _, body = split_message(request or "")
+    parts = head.split("\n", 1)[0].split()
+    if len(parts) < 2:
+        return None
+    method, target = parts[0].upper(), parts[1]
+    if "://" in target:
+        target = "/" + target.split("://", 1)[1].partition("/")[2]
+    path, _, query = target.partition("?")
+    names = _param_names(query, "application/x-www-form-urlencoded") if query else set()
+    if body.strip():
+        names.update("body:" + name for name in _param_names(body, header_value(head, "Content-Type").lower()))
+    return method, path_template(path), sorted(names)
+
+
+def response_features(response):
+    """Structural features of a response: status, type and body shape, never the values themselves."""
+    head, _, body = split_message(response or "")
+    status = head.split("\n", 1)[0].split()[1:2]
+    content_type = header_value(head, "Content-Type").split(";")[0].strip().lower()
+    features = set(["status:" + (status[0] if status else "-"), "type:" + content_type])
+    body = body[:SHAPE_SCAN_BYTES]
+    kind = body_kind(content_type, body)
+    if kind == "json":
+        paths = set()
+        try:
+            _json_paths(json.loads(body), "", paths)
+        except ValueError:
+            paths.add("json:invalid")
+        features.update("json:" + path for path in paths)
+    elif kind in ("html", "xml"):
+        previous = ""
+        for match in _HTML_TAG.finditer(body):
+            tag = match.group(1).lower()
+            features.add("tag:" + previous + ">" + tag)
+            previous = tag
+            if tag in ("input", "select", "textarea", "button", "form"):
+                name = _HTML_NAME.search(match.group(2))
+                features.add(tag + ":" + (name.group(1) if name else ""))
+    elif body:
+        features.add("size:%d" % len(body).bit_length())
+    return features
+
+
+def simhash(features, bits=64):
+    weights = [0] * bits
+    for feature in features:
+        value = int(hashlib.md5(_to_bytes(feature)).hexdigest()[:bits // 4], 16)
+        for i in range(bits):
+            weights[i] += 1 if value >> i & 1 else -1
+    return sum(1 << i for i in range(bits) if weights[i] > 0)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class Fingerprint(object):
+    """group: exact key of everything that must match (settings, method, path template, parameter
+    names, status and type); shape: SimHash of the response structure, compared by Hamming distance."""
+
+    def __init__(self, group, shape, features, label):
+        self.group = group
+        self.shape = shape
+        self.features = features
+        self.label = label
+
+
+def fingerprint(traffic, settings=""):
+    """Fingerprint a (request, response) pair, or None when there is no request line to template."""
+    shape = request_shape(traffic[0])
+    if shape is None:
+        return None
+    features = response_features(traffic[1]) if traffic[1] else set()
+    exact = sorted(f for f in features if f.startswith(("status:", "type:")))
+    digest = hashlib.sha256()
+    for part in [settings, shape[0], shape[1], ",".join(shape[2])] + exact:
+        digest.update(_to_bytes(part))
+        digest.update(b"\x00")
+    label = shape[0] + " " + shape[1] + ("?" + "&".join(shape[2]) if shape[2] else "")
+    return Fingerprint(digest.hexdigest(), simhash(features), features, label)
+
+
+class _FingerprintSlot(object):
+    def __init__(self, fp):
+        self.fingerprint = fp
+        self.entry = None
+        self.ready = threading.Event()
+
+
+class FingerprintIndex(object):
+    """Analyzed fingerprints grouped by exact key, matched within a group by SimHash distance.
+
+    claim() returns (slot, owner). The owner runs the model and then calls fill() or abandon();
+    anyone else matching an in-flight slot waits on slot.ready instead of running the model too.
+    """
+
+    def __init__(self, max_groups=5000, max_distance=3):
+        self.max_groups = max_groups
+        self.max_distance = max_distance
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, fp):
+        with self._lock:
+            slots = self._groups.pop(fp.group, [])
+            self._groups[fp.group] = slots
+            best = None
+            for slot in slots:
+                distance = hamming(slot.fingerprint.shape, fp.shape)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, slot)
+            if best:
+                return best[1], False
+            slot = _FingerprintSlot(fp)
+            slots.append(slot)
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+            return slot, True
+
+    def fill(self, slot, result, model):
+        slot.entry = {"result": result, "model": model, "created": time.time()}
+        slot.ready.set()
+
+    def abandon(self, slot):
+        with self._lock:
+            slots = self._groups.get(slot.fingerprint.group, [])
+            if slot in slots:
+                slots.remove(slot)
+        slot.ready.set()
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(slots) for slots in self._groups.values())
+
+
+def describe_shape_diff(old, new, limit=8):
+    """Short text listing response features present in only one of two fingerprints."""
+    added = sorted(new.features - old.features)
+    removed = sorted(old.features - new.features)
+    parts = ["+" + f for f in added[:limit]] + ["-" + f for f in removed[:limit]]
+    more = len(added) + len(removed) - len(parts)
+    if more > 0:
+        parts.append("... %d more" % more)
+    return ", ".join(parts)
+
+
+HISTORY_PAGE_SIZE = 100
+_INDEX_WORD = re.compile(r"[a-z0-9_]{3,40}")
+_STOPWORDS = frozenset((
+    "the and for are with this that from not but can has have was were will into its any all may "
+    "should could would been being which their there these those such also than then them they http https"
+).split())
+
+
+def index_terms(text, limit=None):
+    """Distinct lower-case words worth indexing, in order of first appearance; all of them without a limit."""
+    seen = OrderedDict()
+    for word in _INDEX_WORD.findall((text or "").lower()):
+        if word not in _STOPWORDS and word not in seen:
+            seen[word] = True
+            if limit and len(seen) >= limit:
+                break
+    return list(seen)
+
+
+class PostingList(object):
+    """Increasing record numbers stored as varint gaps, mostly one byte each instead of four."""
+
+    __slots__ = ("data", "last", "count")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.last = -1
+        self.count = 0
+
+    def append(self, number):
+        gap = number - self.last
+        self.last = number
+        self.count += 1
+        while gap >= 0x80:
+            self.data.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        self.data.append(gap)
+
+    def __iter__(self):
+        number = -1
+        gap = shift = 0
+        for byte in self.data:
+            gap |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+            else:
+                number += gap
+                yield number
+                gap = shift = 0
+
+    def __len__(self):
+        return self.count
+
+
+def describe_traffic(traffic):
+    """(method, host, path, status) of a (request, response) pair; blanks where a side is missing."""
+    method = path = host = ""
+    status = 0
+    if traffic[0]:
+        head = split_message(traffic[0])[0]
+        parts = head.split("\n", 1)[0].split()
+        if len(parts) >= 2:
+            method, path = parts[0], parts[1]
+        host = header_value(head, "Host")
+    if traffic[1]:
+        parts = split_message(traffic[1])[0].split("\n", 1)[0].split()
+        if len(parts) >= 2 and parts[1].isdigit():
+            status = int(parts[1])
+    return method, host, path, status
+
+
+class HistoryStore(object):
+    """Append-only analysis history that stays searchable at 100k+ records.
+
+    records.jsonl holds full records; index.jsonl holds one compact line per record (offset,
+    length, metadata, indexed words). Only the index is kept in memory: metadata tuples plus an
+    inverted index of every indexed word -> PostingList of record numbers. It is loaded on a background thread; search() waits
+    for it. Full records are read back by offset when one is opened.
+    """
+
+    META_FIELDS = ("offset", "length", "timestamp", "host", "method", "path", "status", "model", "summary")
+    FILTERS = ("host", "path", "model", "method", "status")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._records_path = os.path.join(directory, "records.jsonl")
+        self._index_path = os.path.join(directory, "index.jsonl")
+        self._lock = threading.RLock()
+        self._meta = []
+        self._postings = {}
+        self._ready = threading.Event()
+        self.error = None
+        thread = threading.Thread(target=self._load, name="ollama-history")
+        thread.daemon = True
+        thread.start()
+
+    def _load(self):
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            size = os.path.getsize(self._records_path) if os.path.exists(self._records_path) else 0
+            if os.path.exists(self._index_path):
+                with open(self._index_path, "rb") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line.decode("utf-8"))
+                        except ValueError:
+                            continue
+                        if entry["offset"] + entry["length"] <= size:
+                            self._remember(entry, entry.get("terms", "").split())
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self._ready.set()
+
+    def _remember(self, entry, terms):
+        with self._lock:
+            number = len(self._meta)
+            self._meta.append(tuple(entry.get(field) for field in self.META_FIELDS))
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = PostingList()
+                postings.append(number)
+
+    def add(self, record):
+        """Append one record (a JSON-serializable dict); the summary, host and path come from it."""
+        self._ready.wait()
+        if self.error:
+            return
+        output = record.get("output") or ""
+        lines = [line.strip() for line in output.splitlines() if line.strip()]
+        entry = dict((field, record.get(field)) for field in self.META_FIELDS[2:])
+        entry["summary"] = lines[0][:160] if lines else ""
+        terms = index_terms(" ".join([output, record.get("custom_prompt") or "", entry["host"] or "",
+                                      entry["path"] or "", entry["model"] or ""]))
+        data = (json.dumps(record, sort_keys=True) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self._records_path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                entry["offset"] = f.tell()
+                f.write(data)
+            entry["length"] = len(data)
+            with open(self._index_path, "ab") as f:
+                f.write((json.dumps(dict(entry, terms=" ".join(terms))) + "\n").encode("utf-8"))
+            self._remember(entry, terms)
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._meta)
+
+    def search(self, query="", offset=0, limit=HISTORY_PAGE_SIZE):
+        """(total, rows) newest first. query mixes words (all must match, "word*" for a prefix) and
+        host:/path:/model:/method:/status: filters (case-insensitive substrings)."""
+        self._ready.wait()
+        filters = []
+        terms = []
+        prefixes = []
+        for token in (query or "").split():
+            name, sep, value = token.partition(":")
+            if sep and name.lower() in self.FILTERS and value:
+                filters.append((self.META_FIELDS.index(name.lower()), value.lower()))
+            elif token.endswith("*") and len(token) > 1:
+                prefixes.append(token[:-1].lower())
+            else:
+                terms.extend(index_terms(token))
+        with self._lock:
+            candidates = None
+            for term in terms + prefixes:
+                if term in prefixes:
+                    found = set()
+                    for indexed in self._postings:
+                        if indexed.startswith(term):
+                            found.update(self._postings[indexed])
+                else:
+                    found = set(self._postings.get(term, ()))
+                candidates = found if candidates is None else candidates & found
+                if not candidates:
+                    return 0, []
+            numbers = sorted(candidates, reverse=True) if candidates is not None \
+                else range(len(self._meta) - 1, -1, -1)
+            matches = [n for n in numbers
+                       if all(value in str(self._meta[n][field] or "").lower() for field, value in filters)]
+            page = [self._row(n) for n in matches[offset:offset + limit]]
+        return len(matches), page
+
+    def _row(self, number):
+        row = dict(zip(self.META_FIELDS, self._meta[number]))
+        row["id"] = number
+        return row
+
+    def get(self, number):
+        """The full record for a row id returned by search()."""
+        with self._lock:
+            offset, length = self._meta[number][0], self._meta[number][1]
+            with open(self._records_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+        return json.loads(data.decode("utf-8"))
+
+    def clear(self):
+        self._ready.wait()
+        with self._lock:
+            for path in (self._records_path, self._index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._meta = []
+            self._postings = {}
+
+
+def create_history(config):
+    if not config.get("history_enabled", True):
+        return None
+    return HistoryStore(config.get("history_dir") or os.path.join(CONFIG_DIR, "history"))
+
+
+SEVERITIES = ("Critical", "High", "Medium", "Low", "Info")
+FINDING_FIELDS = ("title", "severity", "location", "parameter", "evidence")
+FINDINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "findings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "severity": {"type": "string", "enum": list(SEVERITIES)},
+                    "location": {"type": "string"},
+                    "parameter": {"type": "string"},
+                    "evidence": {"type": "string"}
+                },
+                "required": list(FINDING_FIELDS)
+            }
+        }
+    },
+    "required": ["findings"]
+}
+FINDINGS_INSTRUCTIONS = (
+    "Respond only with JSON of the form {\"findings\": [{\"title\": \"...\", \"severity\": "
+    "\"Critical|High|Medium|Low|Info\", \"location\": \"URL, header or body part\", \"parameter\": \"name or empty\", "
+    "\"evidence\": \"text quoted from the traffic\"}]}. Use one entry per issue and return {\"findings\": []} "
+    "when there is nothing to report."
+)
+_FINDING_KEYS = {
+    "title": ("title", "name", "issue", "type", "vulnerability"),
+    "location": ("location", "url", "endpoint", "path"),
+    "parameter": ("parameter", "param", "field"),
+    "evidence": ("evidence", "proof", "snippet", "detail", "description"),
+}
+_JSON_TOKEN = re.compile(r'[{}"\\]')
+
+
+def normalize_severity(value):
+    text = str(value or "").strip().lower()
+    for prefix, severity in (("crit", "Critical"), ("hi", "High"), ("med", "Medium"), ("mod", "Medium"), ("lo", "Low")):
+        if text.startswith(prefix):
+            return severity
+    return "Info"
+
+
+def normalize_finding(obj, max_evidence=2000):
+    """A finding dict with exactly FINDING_FIELDS as strings, or None when obj is not a finding."""
+    if not isinstance(obj, dict):
+        return None
+    lowered = dict((str(key).lower(), value) for key, value in obj.items())
+    if "severity" not in lowered:
+        return None
+    finding = {"severity": normalize_severity(lowered["severity"])}
+    for field, keys in _FINDING_KEYS.items():
+        value = ""
+        for key in keys:
+            if lowered.get(key) not in (None, ""):
+                value = lowered[key]
+                break
+        if not isinstance(value, (type(u""), str)):
+            value = json.dumps(value, sort_keys=True)
+        finding[field] = value.strip()
+    if len(finding["evidence"]) > max_evidence:
+        finding["evidence"] = finding["evidence"][:max_evidence] + "..."
+    return finding
+
+
+class FindingsParser(object):
+    """Pulls findings out of JSON as it streams in, whatever the wrapping.
+
+    Every complete object with a "severity" key is a finding, so {"findings": [...]}, a bare
+    array and prose with embedded objects all work. Strings are tracked so braces inside them
+    are not counted. Objects enclosing a finding are not parsed themselves, so the text before
+    the current finding is dropped and a long stream is not re-buffered on every token.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._base = 0  # stream offset of _buf[0]
+        self._pos = 0
+        self._skip = 0
+        self._stack = []  # stream offsets of open objects; None for enclosing ones not worth parsing
+        self._in_string = False
+
+    def feed(self, text):
+        """New findings completed by text."""
+        found = []
+        self._buf += text
+        buf = self._buf
+        base = self._base
+        for match in _JSON_TOKEN.finditer(buf, self._pos - base):
+            i = match.start() + base
+            if i < self._skip:
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._skip = i + 2
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = bool(self._stack)
+            elif char == "{":
+                self._stack.append(i)
+            elif char == "}" and self._stack:
+                start = self._stack.pop()
+                if start is None:
+                    continue
+                try:
+                    finding = normalize_finding(json.loads(buf[start - base:i - base + 1]))
+                except ValueError:
+                    finding = None
+                if finding:
+                    found.append(finding)
+                    self._stack = [None] * len(self._stack)
+        self._pos = base + len(buf)
+        if not self._stack:
+            self._in_string = False
+        keep = min([start for start in self._stack if start is not None] or [self._pos])
+        if keep > base:
+            self._buf = buf[keep - base:]
+            self._base = keep
+        return found
+
+
+def parse_findings(text):
+    return FindingsParser().feed(text or "")
+
+
+def format_findings(findings):
+    lines = []
+    for finding in sorted(findings, key=lambda f: SEVERITIES.index(f["severity"])):
+        where = " ".join(part for part in (finding["location"], finding["parameter"] and "[" + finding["parameter"] + "]") if part)
+        lines.append("[" + finding["severity"] + "] " + (finding["title"] or "Untitled") + (" - " + where if where else ""))
+        if finding["evidence"]:
+            lines.append("    " + finding["evidence"].replace("\n", "\n    "))
+    return "\n".join(lines)
+
+
+class DeferredView(object):
+    """Result view that holds the text until a real view is attached, then replays it and forwards to it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = []
+        self._streaming = False
+        self._view = None
+
+    def attach(self, view):
+        with self._lock:
+            self._view = view
+            text = "".join(self._parts)
+            self._parts = []
+            if self._streaming:
+                view.beginStream(text)
+            else:
+                view.setText(text)
+
+    def setText(self, text):
+        with self._lock:
+            if self._view is not None:
+                self._view.setText(text)
+            else:
+                self._parts = [text]
+
+    def appendText(self, text):
+        with self._lock:
+            if self._view is not None:
+                self._view.appendText(text)
+            else:
+                self._parts.append(text)
+
+    def beginStream(self, header=""):
+        with self._lock:
+            self._streaming = True
+            if self._view is not None:
+                self._view.beginStream(header)
+            else:
+                self._parts = [header]
+
+    def appendChunk(self, text):
+        with self._lock:
+            if self._view is not None:
+                self._view.appendChunk(text)
+            else:
+                self._parts.append(text)
+
+    def endStream(self, text=None):
+        with self._lock:
+            self._streaming = False
+            if self._view is not None:
+                self._view.endStream(text)
+            elif text is not None:
+                self._parts = [text]
+
+
+class PrefixView(object):
+    """Result view wrapper that keeps prefix above whatever the analysis writes."""
+
+    def __init__(self, view, prefix):
+        self._view = view
+        self._prefix = prefix
+
+    def setText(self, text):
+        self._view.setText(self._prefix + text)
+
+    def appendText(self, text):
+        self._view.appendText(text)
+
+    def beginStream(self, header=""):
+        self._view.beginStream(self._prefix + header)
+
+    def appendChunk(self, text):
+        self._view.appendChunk(text)
+
+    def endStream(self, text=None):
+        self._view.endStream(None if text is None else self._prefix + text)
+
+
+class FindingsView(object):
+    """Result view wrapper that parses streamed output into findings and hands them to sink."""
+
+    def __init__(self, view, sink):
+        self._view = view
+        self._sink = sink
+        self._parser = FindingsParser()
+        self._findings = []
+        self._parts = []
+
+    def _take(self, findings):
+        if findings:
+            self._findings.extend(findings)
+            self._sink(findings)
+
+    def _render(self, text):
+        if not self._findings:
+            return text
+        return (str(len(self._findings)) + " findings:\n\n" + format_findings(self._findings)
+                + "\n\n----- Raw output -----\n" + text)
+
+    def setText(self, text):
+        findings = parse_findings(text)
+        if findings:
+            self._findings = []
+            self._take(findings)
+            text = self._render(text)
+        self._view.setText(text)
+
+    def appendText(self, text):
+        self._view.appendText(text)
+
+    def beginStream(self, header=""):
+        self._parser = FindingsParser()
+        self._findings = []
+        self._parts = []
+        self._view.beginStream(header)
+
+    def appendChunk(self, text):
+        self._parts.append(text)
+        self._take(self._parser.feed(text))
+        self._view.appendChunk(text)
+
+    def endStream(self, text=None):
+        if self._findings:
+            text = self._render(text if text is not None else "".join(self._parts))
+        self._view.endStream(text)
+
+
+class FindingStore(object):
+    """Findings from every analysis, merged by host, path template, severity, title and parameter."""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(finding, host, path):
+        parts = [host.lower(), path_template(path.split("?", 1)[0]), finding["severity"],
+                 " ".join(finding["title"].lower().split()), finding["parameter"].lower()]
+        return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def add(self, findings, source):
+        """Merge findings from one analysis; source has host, path, model and analysis (an id). Returns how many were new."""
+        added = 0
+        now = time.time()
+        with self._lock:
+            for finding in findings:
+                key = self.key(finding, source.get("host", ""), source.get("path", ""))
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = dict(finding)
+                    entry.update({"id": key[:12], "host": source.get("host", ""), "path": source.get("path", ""),
+                                  "model": source.get("model", ""), "count": 1, "first_seen": now,
+                                  "_analysis": source.get("analysis")})
+                    self._entries[key] = entry
+                    added += 1
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                elif entry["_analysis"] != source.get("analysis"):
+                    # Counted once per analysis; map-reduce parts repeat what the final merge reports.
+                    entry["count"] += 1
+                    entry["_analysis"] = source.get("analysis")
+                entry["last_seen"] = now
+            self.version += 1
+        return added
+
+    def rows(self):
+        with self._lock:
+            return [dict((k, v) for k, v in entry.items() if not k.startswith("_")) for entry in self._entries.values()]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+    def export_jsonl(self, path):
+        rows = self.rows()
+        with open(path, "wb") as f:
+            for row in rows:
+                f.write((json.dumps(row, sort_keys=True) + "\n").encode("utf-8"))
+        return len(rows)
+
+
+EXTRACT_OFF = "off"
+EXTRACT_SHOW = "show first"
+EXTRACT_CONTEXT = "replace bodies"
+EXTRACT_LOCAL = "skip model"
+EXTRACT_MODES = (EXTRACT_OFF, EXTRACT_SHOW, EXTRACT_CONTEXT, EXTRACT_LOCAL)
+DEFAULT_CUSTOM_PROMPT = "Extract and analyze all paths, endpoints, and parameters found in this HTTP traffic."
+EXTRACT_SCAN_BYTES = 512 * 1024
+EXTRACT_MAX_ITEMS = 200
+EXTRACT_VALUE_CHARS = 40
+EXTRACT_KINDS = (("parameter", "Parameters"), ("route", "API routes"), ("form", "Forms"), ("url", "URLs"),
+                 ("path", "Paths"), ("field", "Response fields"), ("header", "Headers"))
+# Burp's IParameter types, in order.
+BURP_PARAMETER_TYPES = ("query", "body", "cookie", "xml", "xml attribute", "multipart attribute", "json")
+_HTML_URL_ATTR = re.compile(r"""\b(?:href|src|action|formaction|data-url|data-src|poster)\s*=\s*["']?([^"'\s>]+)""", re.I)
+_HTML_FORM = re.compile(r"<form\b([^>]*)>(.*?)(?:</form>|$)", re.I | re.S)
+_HTML_FIELD = re.compile(r"<(?:input|select|textarea|button)\b([^>]*)>", re.I)
+_JS_CALL = re.compile(r"""(?:\bfetch|\baxios(?:\.(get|post|put|patch|delete))?|\$\.(get|post|ajax)|\.open)\s*\(\s*"""
+                      r"""(?:["'](GET|POST|PUT|PATCH|DELETE)["']\s*,\s*)?["'`]([^"'`\s]+)["'`]""", re.I)
+_JS_STRING = re.compile(r"""["'`]((?:https?:)?/[^"'`\s<>\\]*|(?:api|v\d+|graphql|rest)/[^"'`\s<>\\]*)["'`]""")
+_TEXT_URL = re.compile(r"""https?://[A-Za-z0-9.-]+(?::\d+)?(?:/[^\s"'<>`\\)\]]*)?""")
+_LINK_TARGET = re.compile(r"<([^>]+)>")
+_ROUTE_SEGMENT = re.compile(r"^/[A-Za-z0-9_.~%:@!$&'()*+,;={}\[\]/-]*(?:\?\S*)?$")
+
+
+def _attr(attrs, name):
+    match = re.search(r"""\b%s\s*=\s*["']?([^"'\s>]*)""" % name, attrs, re.I)
+    return match.group(1) if match else ""
+
+
+def _clip(value, limit=EXTRACT_VALUE_CHARS):
+    return value if len(value) <= limit else value[:limit] + "..."
+
+
+def _looks_route(text):
+    if text.startswith("//"):
+        return False
+    if not text.startswith("/"):
+        text = "/" + text
+    return len(text) > 1 and bool(_ROUTE_SEGMENT.match(text)) and any(ch.isalpha() for ch in text)
+
+
+class Extraction(object):
+    """Endpoints, parameters and links found in one request/response pair without a model."""
+
+    def __init__(self):
+        self.endpoint = ""
+        self.seconds = 0.0
+        self._items = dict((kind, []) for kind, _ in EXTRACT_KINDS)
+        self._seen = set()
+
+    def add(self, kind, item):
+        key = (kind, item)
+        if key in self._seen or len(self._items[kind]) >= EXTRACT_MAX_ITEMS:
+            return
+        self._seen.add(key)
+        self._items[kind].append(item)
+        if kind == "route":
+            self._seen.add(("path", item[1]))
+
+    def items(self, kind):
+        return list(self._items[kind])
+
+    def count(self):
+        return sum(len(items) for items in self._items.values())
+
+    def _lines(self, kind):
+        items = self._items[kind]
+        if kind == "parameter":
+            return ["%s %s=%s" % (location, name, value) if value else "%s %s" % (location, name)
+                    for location, name, value in items]
+        if kind == "form":
+            return ["%s %s [%s]" % (method, action or "(same page)", ", ".join(fields)) for method, action, fields in items]
+        if kind == "route":
+            return [(method + " " if method else "") + route for method, route in items]
+        if kind == "header":
+            return ["%s %s: %s" % (side, name, value) for side, name, value in items]
+        return list(items)
+
+    def format(self):
+        """Readable report for the result view."""
+        out = ["Local extraction (%d items in %.0f ms)" % (self.count(), self.seconds * 1000)]
+        if self.endpoint:
+            out.append("Endpoint: " + self.endpoint)
+        for kind, title in EXTRACT_KINDS:
+            lines = self._lines(kind)
+            if lines:
+                out.append("")
+                out.append("%s (%d):" % (title, len(lines)))
+                out.extend("  " + line for line in lines)
+        return "\n".join(out) + "\n"
+
+    def context(self):
+        """Compact block sent to the model in place of the bodies."""
+        out = ["===== EXTRACTED ====="]
+        if self.endpoint:
+            out.append("endpoint: " + self.endpoint)
+        for kind, title in EXTRACT_KINDS:
+            lines = self._lines(kind)
+            if lines:
+                out.append(title.lower() + ": " + "; ".join(lines))
+        return "\n".join(out) + "\n\n"
+
+
+def extract_traffic(traffic, parsed=None):
+    """Extraction of a (request, response) pair, None leaving a side out.
+
+    parsed optionally holds what Burp's own parser found: "parameters" as (location, name, value)
+    and response "cookies" as names. Without it the raw text is parsed here.
+    """
+    started = time.time()
+    extraction = Extraction()
+    parsed = parsed or {}
+    if traffic[0]:
+        _extract_request(extraction, traffic[0], parsed.get("parameters"))
+    if traffic[1]:
+        _extract_response(extraction, traffic[1], parsed.get("cookies"))
+    extraction.seconds = time.time() - started
+    return extraction
+
+
+def _extract_request(extraction, request, parameters):
+    head, _, body = split_message(request)
+    parts = head.split("\n", 1)[0].split()
+    target = parts[1] if len(parts) >= 2 else ""
+    if target:
+        extraction.endpoint = parts[0].upper() + " " + target.split("?", 1)[0]
+    if parameters is None:
+        parameters = _request_parameters(target, head, body[:EXTRACT_SCAN_BYTES])
+    for location, name, value in parameters:
+        extraction.add("parameter", (location, name, _clip(value)))
+    for line in head.splitlines()[1:]:
+        name, _, value = line.partition(":")
+        lowered = name.strip().lower()
+        if lowered == "authorization":
+            extraction.add("header", ("request", name.strip(), value.strip().split(" ", 1)[0] + " ..."))
+        elif lowered.startswith("x-") or lowered in ("content-type", "origin"):
+            extraction.add("header", ("request", name.strip(), _clip(value.strip())))
+
+
+def _request_parameters(target, head, body):
+    found = []
+    query = target.partition("?")[2]
+    for pair in query.split("&") if query else []:
+        name, _, value = pair.partition("=")
+        if name:
+            found.append(("query", name, value))
+    for pair in header_value(head, "Cookie").split(";"):
+        name, _, value = pair.strip().partition("=")
+        if name:
+            found.append(("cookie", name, value))
+    if not body.strip():
+        return found
+    content_type = header_value(head, "Content-Type").lower()
+    kind = body_kind(content_type, body)
+    if kind == "json":
+        try:
+            _json_leaves(json.loads(body), "", found, "json")
+        except ValueError:
+            pass
+    elif "multipart" in content_type:
+        found.extend(("multipart", name, "") for name in _MULTIPART_NAME.findall(body))
+    elif "=" in body and "\n" not in body.strip():
+        for pair in body.split("&"):
+            name, _, value = pair.partition("=")
+            if name.strip():
+                found.append(("body", name.strip(), value))
+    return found
+
+
+def _json_leaves(value, prefix, found, location, limit=EXTRACT_MAX_ITEMS):
+    if len(found) >= limit:
+        return
+    if isinstance(value, dict):
+        for key in value:
+            _json_leaves(value[key], prefix + "." + key if prefix else key, found, location, limit)
+    elif isinstance(value, list):
+        for item in value[:1]:
+            _json_leaves(item, prefix + "[]", found, location, limit)
+    else:
+        found.append((location, prefix, value if hasattr(value, "lower") else "" if value is None else json.dumps(value)))
+
+
+def _extract_response(extraction, response, cookies):
+    head, _, body = split_message(response)
+    body = body[:EXTRACT_SCAN_BYTES]
+    for name in ("Location", "Content-Location", "Refresh"):
+        value = header_value(head, name)
+        if value:
+            extraction.add("header", ("response", name, _clip(value, 120)))
+            _add_link(extraction, value.split("url=", 1)[-1].strip())
+    for target in _LINK_TARGET.findall(header_value(head, "Link")):
+        _add_link(extraction, target)
+    if cookies is None:
+        cookies = [line.split(":", 1)[1].split("=", 1)[0].strip() for line in head.splitlines()[1:]
+                   if line.lower().startswith("set-cookie:")]
+    for name in cookies:
+        extraction.add("header", ("response", "Set-Cookie", name))
+
+    kind = body_kind(header_value(head, "Content-Type").lower(), body)
+    if kind == "json":
+        try:
+            leaves = []
+            _json_leaves(json.loads(body), "", leaves, "")
+        except ValueError:
+            leaves = None
+        if leaves is not None:
+            for _, path, value in leaves:
+                extraction.add("field", path)
+                if value.startswith(("/", "http://", "https://")):
+                    _add_link(extraction, value)
+            return
+    if kind in ("html", "xml"):
+        for match in _HTML_FORM.finditer(body):
+            fields = []
+            for field in _HTML_FIELD.finditer(match.group(2)):
+                name = _attr(field.group(1), "name")
+                if name and name not in fields:
+                    fields.append(name)
+            attrs = match.group(1)
+            extraction.add("form", ((_attr(attrs, "method") or "GET").upper(), _attr(attrs, "action"), tuple(fields)))
+        for target in _HTML_URL_ATTR.findall(body):
+            _add_link(extraction, target)
+    # Inline and standalone scripts, and any other text, are scanned for calls and route-like strings.
+    for match in _JS_CALL.finditer(body):
+        method = (match.group(1) or match.group(2) or match.group(3) or "").upper()
+        if method == "AJAX":
+            method = ""
+        extraction.add("route", (method, match.group(4)))
+    for target in _JS_STRING.findall(body):
+        _add_link(extraction, target)
+    for target in _TEXT_URL.findall(body):
+        _add_link(extraction, target)
+
+
+def _add_link(extraction, target):
+    target = target.strip()
+    if not target or target.startswith(("#", "javascript:", "data:", "mailto:")):
+        return
+    if target.startswith(("http://", "https://", "//")):
+        extraction.add("url", target)
+    elif _looks_route(target):
+        extraction.add("path", target)
+
+
+TRIAGE_SYSTEM_PROMPT = (
+    "You triage HTTP traffic for a security review. Rate how likely it is to contain a vulnerability "
+    "or sensitive data worth a detailed analysis, from 0 (nothing of interest) to 10 (very likely). "
+    "Reply with the number only."
+)
+TRIAGE_SCAN_BYTES = 128 * 1024
+_STATIC_TYPES = ("image/", "font/", "video/", "audio/", "text/css")
+_STATIC_PATH = re.compile(r"\.(png|jpe?g|gif|svg|ico|webp|bmp|css|woff2?|ttf|eot|otf|mp4|webm|mp3|map)$", re.I)
+_SENSITIVE_PATH = re.compile(r"admin|debug|upload|login|auth|token|oauth|passw|reset|internal|graphql|config|export|backup", re.I)
+_ERROR_TEXT = re.compile(r"exception|traceback|stack ?trace|sql syntax|ORA-\d{5}|mysql_|pg_query|\.java:\d+\)|"
+                         r"warning: \w+\(\)|undefined (index|variable)", re.I)
+_SECRET_TEXT = re.compile(r"api[_-]?key|secret|passw(or)?d|private[_-]?key|BEGIN [A-Z ]*PRIVATE KEY|aws_access_key", re.I)
+_QUERY_VALUE = re.compile(r"[?&][^=&#\s]+=([^&#\s]{4,})")
+_RATING = re.compile(r"\d+(\.\d+)?")
+
+
+def interest_score(traffic):
+    """(score 0-100, reasons): a cheap guess at how much a (request, response) pair deserves a full analysis."""
+    request, response = traffic[0] or "", traffic[1] or ""
+    req_head, _, req_body = split_message(request)
+    resp_head, _, resp_body = split_message(response)
+    resp_body = resp_body[:TRIAGE_SCAN_BYTES]
+    method, _, path, status = describe_traffic(traffic)
+    content_type = header_value(resp_head, "Content-Type").lower()
+    if content_type.startswith(_STATIC_TYPES) or _STATIC_PATH.search(path.split("?", 1)[0]):
+        return 0, ["static asset"]
+
+    score = [0]
+    reasons = []
+
+    def add(points, reason):
+        score[0] += points
+        reasons.append(reason)
+
+    if method and method.upper() not in ("GET", "HEAD", "OPTIONS"):
+        add(25, method.upper() + " request")
+    shape = request_shape(request)
+    if shape and shape[2]:
+        add(min(25, 5 * len(shape[2])), "%d parameters" % len(shape[2]))
+    if header_value(req_head, "Authorization") or header_value(req_head, "Cookie"):
+        add(10, "authenticated")
+    if "multipart/form-data" in header_value(req_head, "Content-Type").lower():
+        add(15, "file upload")
+    if _SENSITIVE_PATH.search(path):
+        add(10, "sensitive path")
+    if status >= 500:
+        add(25, "server error %d" % status)
+    elif status in (401, 403):
+        add(15, "access denied")
+    if _ERROR_TEXT.search(resp_body):
+        add(25, "error message in response")
+    if _SECRET_TEXT.search(resp_body):
+        add(20, "secret-like text in response")
+    if any(value in resp_body for value in _QUERY_VALUE.findall(path)):
+        add(20, "parameter reflected in response")
+    origin = header_value(resp_head, "Access-Control-Allow-Origin")
+    if origin == "*" or (origin and header_value(resp_head, "Access-Control-Allow-Credentials").lower() == "true"):
+        add(10, "permissive CORS")
+    for line in resp_head.splitlines():
+        lowered = line.lower()
+        if lowered.startswith("set-cookie:") and ("httponly" not in lowered or "secure" not in lowered):
+            add(10, "cookie without HttpOnly or Secure")
+            break
+    return min(100, score[0]), reasons or ["nothing notable"]
+
+
+def parse_rating(text):
+    """A triage model's 0-10 answer as a 0-100 score, or None if it gave no number."""
+    match = _RATING.search(text or "")
+    if not match:
+        return None
+    return int(round(min(10.0, float(match.group())) * 10))
+
+
+DEFAULT_MODEL = "llama3"
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a cybersecurity expert analyzing HTTP traffic. "
+    "Focus on identifying security vulnerabilities, suspicious patterns, "
+    "and potential attack vectors. Provide concise analysis with clear recommendations."
+)
+_ANSI_ESCAPE = re.compile(r"(\x9B|\x1B\[)[0-?]*[ -/]*[@-~]")
+READ_CHUNK_BYTES = 4096
+# CSI, OSC (ended by BEL or ST), charset selection, and two-character escapes.
+_ESCAPE_SEQUENCE = re.compile(r"(?:\x1b\[|\x9b)[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[()].|\x1b[^\[\]()]", re.S)
+_ESCAPE_START = re.compile(r"[\x1b\x9b]")
+# What an escape sequence cut off by the end of a chunk can look like.
+_ESCAPE_PARTIAL = re.compile(r"(?:(?:\x1b\[|\x9b)[0-?]*[ -/]*|\x1b\][^\x07\x1b]*\x1b?|\x1b[()]?)\Z")
+_ESCAPE_PARTIAL_MAX = 4096
+
+
+def clean_ansi(text):
+    return _ANSI_ESCAPE.sub("", text)
+
+
+def _is_spinner(ch):
+    return u"\u2800" <= ch <= u"\u28ff"
+
+
+class StreamDecoder(object):
+    """Turns `ollama run` output bytes, in chunks of any size, into visible text as soon as it arrives.
+
+    UTF-8 characters and escape sequences split across chunks are held until they are complete.
+    Escape sequences are dropped, and so is a braille spinner frame (and its trailing space) drawn
+    right after one.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._pending = u""
+        self._after_escape = True
+        self._drop_space = False
+
+    def feed(self, data):
+        text = self._decoder.decode(data)
+        if self._pending:
+            text = self._pending + text
+            self._pending = u""
+        match = _ESCAPE_START.search(text)
+        if match is None:
+            return self._visible(text)
+        out = []
+        pos = 0
+        while match is not None:
+            start = match.start()
+            out.append(self._visible(text[pos:start]))
+            sequence = _ESCAPE_SEQUENCE.match(text, start)
+            if sequence is not None:
+                pos = sequence.end()
+                self._after_escape = True
+            elif _ESCAPE_PARTIAL.match(text, start) and len(text) - start < _ESCAPE_PARTIAL_MAX:
+                self._pending = text[start:]
+                return u"".join(out)
+            else:
+                pos = start + 1
+            match = _ESCAPE_START.search(text, pos)
+        out.append(self._visible(text[pos:]))
+        return u"".join(out)
+
+    def flush(self):
+        """Whatever is left at the end of the stream; an unfinished escape sequence is dropped."""
+        text = self._visible(self._decoder.decode(b"", True))
+        self._pending = u""
+        return text
+
+    def _visible(self, text):
+        if not text:
+            return text
+        if self._drop_space:
+            self._drop_space = False
+            if text[0] == u" ":
+                text = text[1:]
+        if self._after_escape and text and _is_spinner(text[0]):
+            text = text[1:]
+            if text[:1] == u" ":
+                text = text[1:]
+            elif not text:
+                self._drop_space = True
+        if text:
+            self._after_escape = False
+        return text
+
+
+def chunk_reader(stream, size=READ_CHUNK_BYTES, log=None):
+    """A function returning the bytes stream has ready (at most size, b"" at EOF) without waiting for a newline.
+
+    stream should be an unbuffered pipe (Popen bufsize=0) so the one-byte fallback returns as soon as
+    output arrives.
+    """
+    try:
+        fd = stream.fileno()
+        os.fstat(fd)
+        return lambda: os.read(fd, size)
+    except Exception:
+        # No usable file descriptor (e.g. some Jython pipes).
+        read1 = getattr(stream, "read1", None)
+        if read1 is not None:
+            return lambda: read1(size)
+        if log:
+            log("No file descriptor or read1() on the process output; reading it a byte at a time")
+        return lambda: stream.read(1)
+
+
+class NullResultView(object):
+    """Result sink for jobs that should not display anything while they stream.
+
+    A result view is anything with setText/appendText/beginStream/appendChunk/endStream;
+    the extension's AIResultPanel is the Swing one.
+    """
+
+    def setText(self, text):
+        pass
+
+    def appendText(self, text):
+        pass
+
+    def beginStream(self, header=""):
+        pass
+
+    def appendChunk(self, text):
+        pass
+
+    def endStream(self, text=None):
+        pass
+
+
+def _no_log(text):
+    pass
+
+
+def _without_body(text):
+    """Message head only; the body is described by the extraction sent with it."""
+    if text is None:
+        return None
+    head, _, body = split_message(text)
+    return head + ("\n\n[" + format_size(len(body)) + " body, see EXTRACTED]" if body.strip() else "")
+
+
+class Analyzer(object):
+    """The analysis pipeline behind the Analyze button: cache, reduction, map-reduce and the model run.
+
+    It only talks to a result view and a log function, so it runs the same inside Burp and headless.
+    """
+
+    def __init__(self, config, system_prompt=None, log=None, message_parser=None):
+        self.config = config
+        self.system_prompt = system_prompt or config.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
+        self.log = log or _no_log
+        self.message_parser = message_parser
+        self.cache = create_cache(config)
+        self.reducer = create_reducer(config)
+        self.chunker = create_chunker(config)
+        self.metrics = MetricsStore()
+        self.fingerprints = FingerprintIndex(int(config.get("dedupe_entries", 5000)))
+        self.history = create_history(config)
+        self.findings = FindingStore(int(config.get("findings_entries", 5000)))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._spill = SpillStore(prefix="ollama_spill_")
+
+    def update_config(self, config):
+        if config.get("cache_mode", CACHE_MEMORY) != self.config.get("cache_mode", CACHE_MEMORY):
+            self.cache = create_cache(config)
+        if bool(config.get("history_enabled", True)) != (self.history is not None):
+            self.history = create_history(config)
+        self.reducer = create_reducer(config)
+        self.chunker = create_chunker(config)
+        self.config = config
+
+    def model(self):
+        return self.config.get("model", DEFAULT_MODEL)
+
+    def pool(self):
+        """The HostPool for api_hosts (or api_url), rebuilt when the host list changes."""
+        hosts = pool_hosts(self.config)
+        with self._pool_lock:
+            if self._pool is None or self._pool.urls() != hosts:
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool = create_pool(self.config, self.log)
+            self._pool.routing = self.config.get("routing", ROUTE_LEAST_OUTSTANDING)
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+        self._spill.close()
+
+    def cache_key(self, custom_prompt, traffic, include, model=None):
+        return cache_key(model or self.model(), self.system_prompt, custom_prompt, include[0], include[1],
+                         build_content(*traffic), self._variant())
+
+    def _variant(self):
+        variant = self.reducer.signature()
+        if self.config.get("map_reduce", False):
+            variant += "|" + self.chunker.signature()
+        if self.structured():
+            variant += "|findings"
+        if self.extraction_mode() in (EXTRACT_CONTEXT, EXTRACT_LOCAL):
+            variant += "|extract"
+        return variant
+
+    def extraction_mode(self):
+        mode = self.config.get("extraction_mode", EXTRACT_SHOW)
+        return mode if mode in EXTRACT_MODES else EXTRACT_OFF
+
+    def skips_model(self, custom_prompt):
+        """True when the local extraction alone answers custom_prompt."""
+        return (self.extraction_mode() == EXTRACT_LOCAL
+                and (custom_prompt or "").strip().rstrip(".").lower() == DEFAULT_CUSTOM_PROMPT.rstrip(".").lower())
+
+    def extract(self, traffic):
+        parsed = None
+        if self.message_parser is not None:
+            try:
+                parsed = self.message_parser(traffic)
+            except Exception as e:
+                self.log("Message parser failed, parsing the raw text instead: " + str(e))
+        return extract_traffic(traffic, parsed)
+
+    def structured(self):
+        return bool(self.config.get("structured_findings", False))
+
+    def prompt_for_model(self):
+        """The system prompt as sent, with the JSON findings instructions in structured mode."""
+        if self.structured():
+            return self.system_prompt + "\n\n" + FINDINGS_INSTRUCTIONS
+        return self.system_prompt
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.fingerprints.clear()
+
+    def cached_text(self, entry):
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.get("created", 0)))
+        return ("[Cached result from " + created + ", model " + str(entry.get("model"))
+                + ". Use Force refresh to re-run.]\n\n" + entry["result"])
+
+    def analyze(self, job, view, custom_prompt, traffic, include=(True, True), force_refresh=False, conversation=None,
+                model=None):
+        """Run one job end to end; traffic is a (request, response) pair, None leaving a side out.
+
+        conversation, a tab's Conversation, lets a new question about the same traffic continue
+        from the previous answer instead of sending the traffic again. model overrides the
+        configured model for this job only.
+        """
+        model = model or self.model()
+        metrics = AnalysisMetrics(model, self.config.get("backend", BACKEND_CLI),
+                                  (job.started_at or time.time()) - job.submitted_at)
+        job.metrics = metrics
+        source = self.cache_key("", traffic, include, model)
+        # A follow-up's answer depends on the earlier turns, so it is neither served from nor stored
+        # under the plain key of its question and traffic.
+        key = None if self._continues(conversation, custom_prompt, source) else self.cache_key(custom_prompt, traffic, include, model)
+        mode = self.extraction_mode()
+        extraction = None
+        if mode != EXTRACT_OFF:
+            extraction = self.extract(traffic)
+            if self.skips_model(custom_prompt):
+                metrics.model = "local extraction"
+                metrics.finish(JOB_DONE)
+                self.metrics.add(metrics)
+                result = extraction.format()
+                view.setText(result)
+                return result
+            view = PrefixView(view, extraction.format() + "\n----- " + model + " -----\n")
+            view.setText("Waiting for the model...\n")
+        if self.structured():
+            _, host, path, _ = describe_traffic(traffic)
+            finding_source = {"host": host, "path": path, "model": model, "analysis": id(job)}
+            view = FindingsView(view, lambda findings: self.findings.add(findings, finding_source))
+
+        if not force_refresh and key is not None:
+            entry = self.cache.get(key)
+            if entry:
+                job.cached = True
+                metrics.cached = True
+                metrics.finish(JOB_DONE)
+                self.metrics.add(metrics)
+                view.setText(self.cached_text(entry))
+                return entry["result"]
+
+        slot = None
+        if self.config.get("dedupe_enabled", False) and not force_refresh and key is not None:
+            slot, reused = self._claim_fingerprint(job, view, model, custom_prompt, traffic, include)
+            if reused is not None:
+                return reused
+            if job.is_cancelled():
+                metrics.finish(JOB_CANCELLED)
+                self.metrics.add(metrics)
+                return None
+
+        # The timeout covers triage as well as the full model.
+        timeout = float(self.config.get("timeout_seconds", 300))
+        watchdog = None
+        if timeout > 0:
+            watchdog = threading.Timer(timeout, lambda: job.cancel("timeout after " + str(int(timeout)) + "s"))
+            watchdog.daemon = True
+            watchdog.start()
+
+        reduced = None
+        if self._cascade_applies(job, force_refresh):
+            reduced = self.reducer.reduce(traffic[0], traffic[1])
+            note = self._triage(job, view, traffic, build_content(reduced[0], reduced[1]), metrics)
+            if note is not None or job.is_cancelled():
+                if watchdog:
+                    watchdog.cancel()
+                if slot is not None:
+                    self.fingerprints.abandon(slot)
+                if note is None:
+                    metrics.finish(JOB_CANCELLED)
+                    self.metrics.add(metrics)
+                return note
+
+        status = JOB_FAILED
+        result = None
+        try:
+            request, response, stats = reduced or self.reducer.reduce(traffic[0], traffic[1])
+            if extraction is not None and mode in (EXTRACT_CONTEXT, EXTRACT_LOCAL):
+                request, response = _without_body(request), _without_body(response)
+                content = build_content(request, response) + extraction.context()
+            else:
+                content = build_content(request, response)
+            content = host_context(self.config, describe_traffic(traffic)[1]) + content
+            metrics.prompt_build = metrics.elapsed()
+            metrics.set_input(content)
+            if self.reducer.enabled:
+                self.log(stats.summary())
+
+            if self.config.get("map_reduce", False) and self.chunker.needs_chunking(request, response):
+                result = self._map_reduce(job, view, model, custom_prompt, request, response)
+            else:
+                result = self.run_model(job, view, model, custom_prompt, content, conversation)
+                if conversation is not None:
+                    conversation.source = source if conversation.key is not None else None
+            status = JOB_CANCELLED if job.is_cancelled() else JOB_DONE
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            if slot is not None:
+                if status == JOB_DONE and result and result.strip() and not job.truncated:
+                    self.fingerprints.fill(slot, result, model)
+                else:
+                    self.fingerprints.abandon(slot)
+            if status == JOB_FAILED and job.is_cancelled():
+                status = JOB_CANCELLED
+            metrics.finish(status)
+            self.metrics.add(metrics)
+            if status == JOB_DONE and result:
+                self._record(job, custom_prompt, traffic, include, result)
+            self.log("Analysis %s in %.2fs (ttft %s, %s tokens, %s tok/s)" % (
+                status, metrics.total,
+                "%.2fs" % metrics.ttft if metrics.ttft is not None else "-",
+                metrics.output_tokens,
+                "%.1f" % metrics.tokens_per_sec if metrics.tokens_per_sec else "-"))
+
+        if key is not None and result and result.strip() and not job.is_cancelled() and not job.truncated:
+            self.cache.put(key, result, model)
+            if stats.saved_bytes() > 0:
+                view.appendText("\n\n[" + stats.summary() + "]")
+        return result
+
+    def _continues(self, conversation, custom_prompt, source):
+        """True when this call may be sent as a follow-up in conversation rather than a fresh analysis."""
+        if conversation is None or not custom_prompt or conversation.source != source:
+            return False
+        return conversation.follows(conversation.key)
+
+    def _cascade_applies(self, job, force_refresh):
+        if not self.config.get("cascade_enabled", False) or force_refresh:
+            return False
+        # A preemptible job is a speculative stand-in for an interactive one.
+        interactive = job.priority == PRIORITY_INTERACTIVE or job.preemptible
+        return not interactive or bool(self.config.get("cascade_interactive", False))
+
+    def _triage(self, job, view, traffic, content, metrics):
+        """None when the job should go on to the full model; otherwise it is finished here and the note returned."""
+        started = time.time()
+        full = metrics.model
+        threshold = int(self.config.get("cascade_threshold", 30))
+        score, reasons = interest_score(traffic)
+        source = "heuristic"
+        small = (self.config.get("cascade_model") or "").strip()
+        if small:
+            view.setText("Triage with " + small + "...\n")
+            try:
+                rating = parse_rating(self._triage_model(job, small, content[:int(self.config.get("cascade_max_kb", 8)) * 1024]))
+                if rating is not None:
+                    score, source = rating, small
+            except Exception as e:
+                self.log("Triage with " + small + " failed, using the heuristic score: " + str(e))
+        if job.is_cancelled():
+            return None
+        metrics.triage_score = score
+        metrics.triage_seconds = time.time() - started
+        metrics.escalated = score >= threshold
+        if metrics.escalated:
+            view.setText("Triage score %d/100 (%s); escalating to %s...\n" % (score, source, full))
+            return None
+        metrics.model = small or "heuristic triage"
+        metrics.finish(JOB_DONE)
+        self.metrics.add(metrics)
+        note = ("[Triage score %d/100 (%s) is below the escalation threshold of %d, so %s was not run. Signals: %s.]\n"
+                "Use Force refresh to run the full analysis." % (score, source, threshold, full, ", ".join(reasons)))
+        view.setText(note)
+        return note
+
+    def _triage_model(self, job, model, content):
+        """The small model's raw answer to TRIAGE_SYSTEM_PROMPT about content.
+
+        The call is stopped after cascade_timeout_seconds (default 30) and raises, so a slow or
+        stuck small model falls back to the heuristic instead of holding up the job.
+        """
+        limit = float(self.config.get("cascade_timeout_seconds", 30))
+        aborts = []
+        expired = []
+
+        def expire():
+            expired.append(True)
+            for abort in list(aborts):
+                abort()
+
+        timer = None
+        if limit > 0:
+            timer = threading.Timer(limit, expire)
+            timer.daemon = True
+        try:
+            if self.config.get("backend", BACKEND_CLI) != BACKEND_API:
+                args = command_args(self.config.get("path", "ollama")) + ["run", model]
+                process = popen_group(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                kill = lambda: kill_process_tree(process)
+                aborts.append(kill)
+                job.add_cancel_hook(kill)
+                if timer:
+                    timer.start()
+                try:
+                    output, _ = process.communicate(_to_bytes(TRIAGE_SYSTEM_PROMPT + "\n\n" + content))
+                finally:
+                    job.remove_cancel_hook(kill)
+                if expired:
+                    raise OllamaError("no answer within " + str(int(limit)) + "s")
+                decoder = StreamDecoder()
+                return decoder.feed(output) + decoder.flush()
+
+            pool = self.pool()
+            host = pool.acquire(job.is_cancelled)
+            if host is None:
+                return ""
+            hooks = []
+
+            def on_connect(abort):
+                hooks.append(abort)
+                aborts.append(abort)
+                job.add_cancel_hook(abort)
+                if expired:
+                    abort()  # the headers came after the limit
+
+            if timer:
+                timer.start()
+            failed = True
+            try:
+                stream = host.client.generate(model, content, system=TRIAGE_SYSTEM_PROMPT,
+                                              keep_alive=parse_keep_alive(self.config.get("keep_alive", DEFAULT_KEEP_ALIVE)),
+                                              options={"num_predict": 8, "temperature": 0}, on_connect=on_connect)
+                text = "".join(chunk_text(chunk) for chunk in stream)
+                failed = False
+            except Exception:
+                if not expired:
+                    raise
+            finally:
+                for hook in hooks:
+                    job.remove_cancel_hook(hook)
+                pool.release(host, failed and not job.is_cancelled() and not expired)
+            if expired:
+                raise OllamaError("no answer within " + str(int(limit)) + "s")
+            return text
+        finally:
+            if timer:
+                timer.cancel()
+
+    def _claim_fingerprint(self, job, view, model, custom_prompt, traffic, include):
+        """(slot, None) when this job should run the model, or (None, result) reused from a near-duplicate."""
+        settings = "\x00".join([model, self.system_prompt, custom_prompt or "", "%d%d" % include, self._variant()])
+        fp = fingerprint(traffic, settings)
+        if fp is None:
+            return None, None
+        while not job.is_cancelled():
+            slot, owner = self.fingerprints.claim(fp)
+            if owner:
+                return slot, None
+            if slot.entry is None:
+                view.setText("Waiting for a near-duplicate already being analyzed (" + slot.fingerprint.label + ")...\n")
+                while not slot.ready.wait(0.25) and not job.is_cancelled():
+                    pass
+            if slot.entry is not None:
+                return None, self._reuse(job, view, slot, fp, custom_prompt, traffic, include)
+        return None, None
+
+    def _reuse(self, job, view, slot, fp, custom_prompt, traffic, include):
+        entry = slot.entry
+        job.cached = job.duplicate = True
+        job.metrics.cached = job.metrics.duplicate = True
+        job.metrics.finish(JOB_DONE)
+        self.metrics.add(job.metrics)
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["created"]))
+        header = ("[Near-duplicate of " + slot.fingerprint.label + ", analyzed " + created + " with model "
+                  + str(entry["model"]) + ". Reused its result; use Force refresh to re-run.]\n")
+        diff = describe_shape_diff(slot.fingerprint, fp)
+        if diff:
+            header += "[Response shape differences: " + diff + "]\n"
+        self.log("Reused near-duplicate result for " + fp.label)
+        self._record(job, custom_prompt, traffic, include, entry["result"])
+        view.setText(header + "\n" + entry["result"])
+        return entry["result"]
+
+    def _record(self, job, custom_prompt, traffic, include, result):
+        if self.history is None:
+            return
+        method, host, path, status = describe_traffic(traffic)
+        try:
+            self.history.add({
+                "timestamp": time.time(), "name": job.name, "host": host, "method": method, "path": path,
+                "status": status, "model": job.metrics.model if job.metrics else self.model(),
+                "backend": self.config.get("backend", BACKEND_CLI),
+                "system_prompt": self.system_prompt, "custom_prompt": custom_prompt,
+                "include_request": include[0], "include_response": include[1],
+                "traffic_hash": hashlib.sha256(_to_bytes(normalize_traffic(build_content(*traffic)))).hexdigest(),
+                "duplicate": job.duplicate, "truncated": job.truncated,
+                "metrics": job.metrics.to_dict() if job.metrics else None, "output": result
+            })
+        except Exception as e:
+            self.log("Could not save analysis history: " + str(e))
+
+    def _map_reduce(self, job, view, model, custom_prompt, request, response):
+        chunks = self.chunker.chunk_traffic(request, response)
+        parallel = max(1, int(self.config.get("chunk_parallel", 2)))
+        map_prompt = (custom_prompt + "\n\n" if custom_prompt else "") + MAP_INSTRUCTIONS
+        self.log("Map-reduce: " + str(len(chunks)) + " chunks, " + str(parallel) + " in parallel")
+
+        view.beginStream("Map-reduce analysis with " + model + ": " + str(len(chunks)) + " chunks, "
+                         + str(parallel) + " in parallel...\n\n")
+
+        def task(chunk):
+            return lambda: self.run_model(job, NullResultView(), model, map_prompt, chunk)
+
+        def on_result(index, result, error):
+            text = "Error: " + str(error) if error is not None else (result or "").strip()
+            view.appendChunk("----- Part " + str(index + 1) + "/" + str(len(chunks)) + " -----\n" + text + "\n\n")
+
+        results, errors = run_parallel([task(chunk) for chunk in chunks], parallel, on_result, job.is_cancelled)
+        partials = ["### Part %d/%d\n%s" % (i + 1, len(chunks), result.strip())
+                    for i, result in enumerate(results) if result and result.strip()]
+
+        if job.is_cancelled():
+            view.endStream()
+            return "\n\n".join(partials)
+        if not partials:
+            view.endStream()
+            raise OllamaError("All " + str(len(chunks)) + " chunk analyses failed: " + str([e for e in errors if e][0]))
+
+        reduce_prompt = REDUCE_INSTRUCTIONS + ("\n\nOriginal task: " + custom_prompt if custom_prompt else "")
+        return self.run_model(job, view, model, reduce_prompt, "\n\n".join(partials))
+
+    def run_model(self, job, view, model, custom_prompt, content, conversation=None):
+        """One model call over content; streams into view and returns the full text."""
+        view.setText("Starting Ollama analysis with model: " + str(model) + "...\n")
+        run = self._run_api if self.config.get("backend", BACKEND_CLI) == BACKEND_API else self._run_cli
+        if run == self._run_cli and not self.config.get("api_hosts"):
+            return run(job, view, model, custom_prompt, content)
+        if conversation is not None and len(self.pool().hosts) > 1:
+            conversation = None  # a follow-up could land on a host that never saw the traffic
+
+        pool = self.pool()
+        tried = []
+        while True:
+            host = pool.acquire(job.is_cancelled, tried)
+            if host is None:
+                view.setText("[Analysis stopped: " + str(job.cancel_reason) + "]")
+                return ""
+            failed = True
+            try:
+                result = run(job, view, model, custom_prompt, content, host, len(tried) + 1 < len(pool.hosts), conversation)
+                failed = False
+                return result
+            except HostUnavailable as e:
+                tried.append(host)
+                self.log(str(e) + "; trying another host")
+                view.setText("Ollama host " + host.url + " failed; trying another host...\n")
+            finally:
+                pool.release(host, failed and not job.is_cancelled())
+
+    def _run_api(self, job, view, model, custom_prompt, content, host=None, failover=False, conversation=None):
+        client = host.client if host is not None else self.pool().hosts[0].client
+        endpoint = self.config.get("api_endpoint", "generate")
+        keep_alive = parse_keep_alive(self.config.get("keep_alive", DEFAULT_KEEP_ALIVE))
+        system_prompt = self.prompt_for_model()
+        stable_prefix = self.config.get("stable_prefix", True)
+        prompt = user_prompt(custom_prompt, content, stable_prefix)
+        if not stable_prefix:
+            conversation = None
+
+        key = None
+        follow_up = False
+        if conversation is not None:
+            key = hashlib.sha1("\x00".join([model, endpoint, system_prompt, content]).encode("utf-8")).hexdigest()
+            follow_up = bool(custom_prompt) and conversation.follows(key)
+            if not follow_up:
+                conversation.reset()
+
+        options = {}
+        max_tokens = int(self.config.get("max_output_tokens", 0))
+        if max_tokens > 0:
+            options["num_predict"] = max_tokens
+        response_format = None
+        if self.structured():
+            # Older Ollama versions only accept "json"; set findings_format to "json" for them.
+            response_format = "json" if self.config.get("findings_format") == "json" else FINDINGS_SCHEMA
+
+        self.log("Streaming from " + client.base_url + " /api/" + endpoint + " (keep_alive=" + str(keep_alive) + ")")
+
+        # Cancelling the job (button, timeout) shuts the socket so a blocked read returns at once.
+        metrics = job.metrics
+        hooks = []
+
+        def on_connect(abort):
+            metrics.mark_setup()
+            hooks.append(abort)
+            job.add_cancel_hook(abort)
+
+        # The system prompt leads every call unchanged, so Ollama can reuse its evaluated prefix.
+        if follow_up:
+            self.log("Follow-up " + str(conversation.turns + 1) + " on the same traffic; sending only the new question")
+        if endpoint == "chat":
+            if follow_up:
+                messages = conversation.messages + [{"role": "user", "content": custom_prompt}]
+                # Chat resends the whole history; generate below sends only the question.
+                metrics.set_input("".join(message["content"] for message in messages))
+            else:
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ]
+            stream = client.chat(model, messages, keep_alive=keep_alive, options=options, on_connect=on_connect,
+                                 format=response_format)
+        elif follow_up:
+            # The returned context already holds the system prompt and the traffic.
+            metrics.set_input(custom_prompt)
+            stream = client.generate(model, custom_prompt, keep_alive=keep_alive, options=options,
+                                     on_connect=on_connect, format=response_format, context=conversation.context)
+        else:
+            stream = client.generate(model, prompt, system=system_prompt, keep_alive=keep_alive,
+                                     options=options, on_connect=on_connect, format=response_format)
+
+        parts = []
+        view.beginStream("Analysis in progress with " + model + "...\n\n")
+        metrics.begin_setup()
+        started = time.time()
+        context = None
+        try:
+            for chunk in stream:
+                if job.is_cancelled():
+                    stream.close()
+                    break
+                text = chunk_text(chunk)
+                if text:
+                    if host is not None and not parts:
+                        self._pool.observe(host, time.time() - started)
+                    parts.append(text)
+                    view.appendChunk(text)
+                    metrics.add_output(text)
+                if chunk.get("done"):
+                    metrics.add_ollama_stats(chunk)
+                    if conversation is not None:
+                        context = chunk.get("context")
+                if chunk.get("done_reason") == "length":
+                    job.truncated = True
+        except Exception as e:
+            if conversation is not None:
+                conversation.reset()
+            if not job.is_cancelled():
+                result = "".join(parts)
+                error_msg = "Error from Ollama API at " + client.base_url + ": " + str(e)
+                if failover and not parts:
+                    raise HostUnavailable(error_msg)
+                self.log(error_msg)
+                view.endStream((result + "\n\n" if result else "") + error_msg)
+                raise OllamaError(error_msg)
+        finally:
+            for hook in hooks:
+                job.remove_cancel_hook(hook)
+
+        result = "".join(parts)
+        if conversation is not None:
+            if job.is_cancelled() or not result.strip():
+                conversation.reset()
+            else:
+                conversation.key = key
+                conversation.turns += 1
+                if endpoint == "chat":
+                    conversation.messages = messages + [{"role": "assistant", "content": result}]
+                else:
+                    conversation.context = context
+        if job.is_cancelled():
+            view.endStream(result + "\n\n[Analysis stopped: " + str(job.cancel_reason) + "]")
+        elif job.truncated:
+            view.endStream(result + "\n\n[Output truncated at " + str(max_tokens) + " tokens]")
+        elif result.strip():
+            view.endStream(result)
+        else:
+            view.endStream("No output received from Ollama API at " + client.base_url)
+        return result
+
+    def _run_cli(self, job, view, model, custom_prompt, content, host=None, failover=False, conversation=None):
+        spill_path = None
+        stdin_file = None
+        try:
+            ollama_path = self.config.get("path", "ollama")
+
+            self.log("Analyzing with model: " + str(model))
+            self.log("Ollama path: " + ollama_path)
+            system_prompt = self.prompt_for_model()
+            self.log("System prompt length: " + str(len(system_prompt)))
+            self.log("Custom prompt: " + custom_prompt)
+
+            # No shell, and the traffic goes to stdin. ollama run puts piped input before the
+            # prompt argument, so with stable_prefix everything is piped, instructions first.
+            if self.config.get("stable_prefix", True):
+                prompt_args = []
+                payload = ('Based on the following system instructions:[ %s ]\n\n' % system_prompt
+                           + user_prompt(custom_prompt, content))
+            else:
+                prompt_args = ['Based on the following system instructions:[ %s ]  %s ' % (system_prompt, custom_prompt)]
+                payload = content
+            flags = ["--format", "json"] if self.structured() else []
+            args = command_args(ollama_path) + ["run"] + flags + [model] + prompt_args
+            cmd_str = '%s run %s%s%s < (%d chars of prompt)' % (
+                ollama_path, " ".join(flags + [""]), model,
+                "".join(' "' + arg.replace('"', '\\"') + '"' for arg in prompt_args), len(payload))
+            self.log("Running command: " + cmd_str)
+
+            # A very large prompt can be fed from a temporary file instead of held in a pipe buffer.
+            spill_kb = int(self.config.get("cli_spill_kb", 0))
+            if spill_kb > 0 and len(payload) > spill_kb * 1024:
+                spill_path = self._spill.put(payload)
+                stdin_file = open(spill_path, "rb")
+                self.log("Spilled " + str(len(payload)) + " chars of prompt to " + spill_path)
+
+            view.setText("Running Ollama analysis...\n\nCommand: " + cmd_str)
+
+            job.metrics.begin_setup()
+            env = None
+            if host is not None:
+                # A pooled host: point this ollama run at it.
+                env = dict(os.environ)
+                env["OLLAMA_HOST"] = host.url
+            started = time.time()
+            process = popen_group(args, stdin=stdin_file or subprocess.PIPE,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, bufsize=0)
+            job.metrics.mark_setup()
+            writer = _feed_stdin(process, _to_bytes(payload)) if stdin_file is None else None
+
+            # Kill ollama and its children; the blocked read then hits EOF.
+            kill = lambda: kill_process_tree(process)
+            job.add_cancel_hook(kill)
+
+            max_tokens = int(self.config.get("max_output_tokens", 0))
+            output_chars = 0
+
+            parts = []
+            decoder = StreamDecoder()
+            read = chunk_reader(process.stdout, log=self.log)
+            view.beginStream("Analysis in progress with " + model + "...\n\n")
+            try:
+                while True:
+                    if job.is_cancelled():
+                        break
+
+                    data = read()
+                    if not data:
+                        if process.poll() is not None:
+                            break
+                        time.sleep(0.01)  # stdout closed before the process exited
+                        continue
+
+                    text = decoder.feed(data)
+                    if text:
+                        if host is not None and not parts:
+                            self._pool.observe(host, time.time() - started)
+                        parts.append(text)
+                        view.appendChunk(text)
+                        job.metrics.add_output(text)
+                        output_chars += len(text)
+                        if max_tokens > 0 and output_chars // 4 >= max_tokens:
+                            job.truncated = True
+                            kill_process_tree(process)
+                            break
+
+                if writer is not None:
+                    writer.join(5)
+                remaining_output, error_output = process.communicate()
+            finally:
+                job.remove_cancel_hook(kill)
+
+            if not job.truncated:
+                parts.append(decoder.feed(remaining_output or b"") + decoder.flush())
+            result = "".join(parts)
+
+            if job.is_cancelled():
+                view.endStream(result + "\n\n[Analysis stopped: " + str(job.cancel_reason) + "]")
+                return result
+
+            if job.truncated:
+                view.endStream(result + "\n\n[Output truncated at about " + str(max_tokens) + " tokens]")
+                return result
+
+            if process.returncode != 0:
+                error = error_output.decode("utf-8", "replace") if error_output else ""
+                if failover and not result.strip():
+                    raise HostUnavailable("ollama run against " + host.url + " exited with status "
+                                          + str(process.returncode) + ": " + error.strip())
+                self.log("Error output from process: " + error)
+                view.endStream((result + "\n\n" if result.strip() else "") + "Error executing command: " + error)
+                raise OllamaError("ollama exited with status " + str(process.returncode))
+
+            if result.strip():
+                view.endStream(result)
+            else:
+                view.endStream("No output received from Ollama.\n\nCommand: " + cmd_str)
+            return result
+
+        except OllamaError:
+            raise
+        except Exception as e:
+            error_msg = "Error during analysis: " + str(e)
+            stack_trace = traceback.format_exc()
+            view.endStream(error_msg + "\n\n" + stack_trace)
+            self.log(error_msg)
+            self.log(stack_trace)
+            raise
+        finally:
+            if stdin_file is not None:
+                stdin_file.close()
+            if spill_path:
+                self._spill.delete(spill_path)
+
+
+PASSIVE_DEFAULT_MIME_TYPES = "HTML, JSON, script, XML"
+PASSIVE_DEFAULT_STATUS = "200-299, 400-599"
+
+
+def split_list(text):
+    return [part.strip() for part in (text or "").split(",") if part.strip()]
+
+
+def parse_ranges(text):
+    """"200-299, 401" -> [(200, 299), (401, 401)]; malformed parts are ignored."""
+    ranges = []
+    for part in split_list(text):
+        low, _, high = part.partition("-")
+        try:
+            ranges.append((int(low), int(high or low)))
+        except ValueError:
+            pass
+    return ranges
+
+
+class HostRateLimiter(object):
+    """Token bucket per host allowing per_minute items, with bursts of up to one minute's worth."""
+
+    MAX_HOSTS = 1024
+
+    def __init__(self, per_minute, clock=time.time):
+        self.per_minute = float(per_minute)
+        self._clock = clock
+        self._buckets = OrderedDict()
+
+    def allow(self, host):
+        if self.per_minute <= 0:
+            return True
+        now = self._clock()
+        tokens, last = self._buckets.pop(host, (self.per_minute, now))
+        tokens = min(self.per_minute, tokens + (now - last) * self.per_minute / 60.0)
+        allowed = tokens >= 1
+        self._buckets[host] = (tokens - 1 if allowed else tokens, now)
+        while len(self._buckets) > self.MAX_HOSTS:
+            self._buckets.popitem(last=False)
+        return allowed
+
+
+class PassiveIntake(object):
+    """Feeds live traffic into analysis without ever blocking the thread that offers it.
+
+    offer() only appends to a bounded inbox. One intake thread runs classify(message), which
+    returns {"host", "mime", "status"} or None for out-of-scope traffic, then applies the
+    filters, sampling and per-host rate limit. Survivors wait in a bounded pending list and are
+    passed to submit(message, info), which returns a job, only while fewer than max_inflight
+    jobs are active. Both the inbox and the pending list drop their oldest item when full.
+    """
+
+    INBOX_SIZE = 1000
+    COUNTERS = ("seen", "out_of_scope", "filtered", "sampled_out", "rate_limited", "dropped", "submitted")
+
+    def __init__(self, classify, submit, config, clock=time.time, rand=random.random):
+        self._classify = classify
+        self._submit = submit
+        self._clock = clock
+        self._rand = rand
+        self._cond = threading.Condition()
+        self._inbox = deque()
+        self._pending = deque()
+        self._inflight = []
+        self._thread = None
+        self._stopped = False
+        self.counts = dict((name, 0) for name in self.COUNTERS)
+        self.enabled = False
+        self.set_config(config)
+
+    def set_config(self, config):
+        with self._cond:
+            self.mime_types = set(t.lower() for t in split_list(config.get("passive_mime_types", PASSIVE_DEFAULT_MIME_TYPES)))
+            self.status_ranges = parse_ranges(config.get("passive_status", PASSIVE_DEFAULT_STATUS))
+            self.hosts = [h.lower() for h in split_list(config.get("passive_hosts", ""))]
+            self.sample = max(0.0, min(1.0, float(config.get("passive_sample_percent", 100)) / 100.0))
+            self.max_pending = max(1, int(config.get("passive_queue_size", 50)))
+            self.max_inflight = max(1, int(config.get("passive_inflight", 1)))
+            self.limiter = HostRateLimiter(config.get("passive_rate_per_minute", 6), self._clock)
+            self.enabled = bool(config.get("passive_enabled", False))
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.counts["dropped"] += 1
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ollama-passive")
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def offer(self, message):
+        """Called on Burp's proxy thread: constant time, never waits on analysis."""
+        if not self.enabled:
+            return
+        with self._cond:
+            self.counts["seen"] += 1
+            if len(self._inbox) >= self.INBOX_SIZE:
+                self._inbox.popleft()
+                self.counts["dropped"] += 1
+            self._inbox.append(message)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            counts = dict(self.counts)
+            counts["pending"] = len(self._pending) + len(self._inbox)
+            counts["inflight"] = len([job for job in self._inflight if job.is_active()])
+            return counts
+
+    def summary(self):
+        counts = self.stats()
+        return ("%(seen)d seen, %(submitted)d analyzed, %(inflight)d running, %(pending)d waiting, "
+                "%(dropped)d dropped, %(rate_limited)d rate limited, %(sampled_out)d sampled out, "
+                "%(filtered)d filtered, %(out_of_scope)d out of scope") % counts
+
+    def clear(self):
+        with self._cond:
+            self._inbox.clear()
+            self._pending.clear()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def accepts(self, info):
+        """The MIME type, status and host filters; an empty filter accepts everything."""
+        if self.mime_types and "*" not in self.mime_types and (info.get("mime") or "").lower() not in self.mime_types:
+            return False
+        status = info.get("status") or 0
+        if self.status_ranges and not [r for r in self.status_ranges if r[0] <= status <= r[1]]:
+            return False
+        host = (info.get("host") or "").lower()
+        if self.hosts and not [p for p in self.hosts if fnmatch.fnmatch(host, p)]:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._inbox and not (self._pending and self._has_capacity()):
+                    self._cond.wait(0.5)
+                if self._stopped:
+                    return
+                inbox = list(self._inbox)
+                self._inbox.clear()
+            for message in inbox:
+                self._screen(message)
+            with self._cond:
+                if not (self._pending and self._has_capacity()):
+                    continue
+                message, info = self._pending.popleft()
+            try:
+                job = self._submit(message, info)
+            except Exception:
+                continue
+            with self._cond:
+                self._inflight.append(job)
+                self.counts["submitted"] += 1
+
+    def _has_capacity(self):
+        self._inflight = [job for job in self._inflight if job.is_active()]
+        return self.enabled and len(self._inflight) < self.max_inflight
+
+    def _screen(self, message):
+        try:
+            info = self._classify(message)
+        except Exception:
+            info = None
+        with self._cond:
+            if info is None:
+                self.counts["out_of_scope"] += 1
+            elif not self.accepts(info):
+                self.counts["filtered"] += 1
+            elif self.sample < 1.0 and self._rand() >= self.sample:
+                self.counts["sampled_out"] += 1
+            elif not self.limiter.allow(info.get("host") or ""):
+                self.counts["rate_limited"] += 1
+            else:
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popleft()
+                    self.counts["dropped"] += 1
+                self._pending.append((message, info))
+
+
+MODEL_LOADING = "loading"
+MODEL_LOADED = "loaded"
+MODEL_UNLOADED = "not loaded"
+MODEL_FAILED = "failed"
+
+
+class ModelManager(object):
+    """Preloads the selected model and keeps the max_warm most recently selected ones loaded.
+
+    Every host in api_hosts (or api_url) is warmed, since the pool may send an analysis to any of
+    them; a host whose /api/ps does not answer is skipped until it does. All Ollama calls happen on
+    one daemon thread, which loads on the hosts in parallel; select(), status() and summary() never
+    block. Pinned models are re-touched well before their keep-alive runs out so Ollama does not
+    unload them.
+    """
+
+    POLL_SECONDS = 15
+    MAX_WARM = 2
+
+    def __init__(self, config, log=None):
+        self.log = log or _no_log
+        self._cond = threading.Condition()
+        self._states = {}  # (url, model) -> state dict
+        self._running = {}  # url -> {name: /api/ps entry}
+        self._touched = {}  # (url, model) -> time of the last load
+        self._errors = {}  # url -> why its /api/ps failed
+        self._pinned = []
+        self._clients = []
+        self._thread = None
+        self._stopped = False
+        self._dirty = False
+        self.update_config(config)
+
+    def update_config(self, config):
+        with self._cond:
+            urls = [url for url, _ in pool_hosts(config)]
+            clients = dict(self._clients)
+            for url in clients:
+                if url not in urls:
+                    clients[url].close()
+            self._clients = [(url, clients.get(url) or OllamaClient(url)) for url in urls]
+            self.keep_alive = parse_keep_alive(config.get("keep_alive", DEFAULT_KEEP_ALIVE))
+            self.max_warm = max(0, min(self.MAX_WARM, int(config.get("warm_models", 1))))
+            pinned = [m for m in config.get("pinned_models", []) if m]
+            if config.get("model"):
+                pinned = [config["model"]] + [m for m in pinned if m != config["model"]]
+            self._pinned = pinned[:self.max_warm]
+            self._wake()
+
+    def select(self, model):
+        """The user picked model: pin it ahead of the others and start loading it."""
+        with self._cond:
+            if self.max_warm and model:
+                self._pinned = ([model] + [m for m in self._pinned if m != model])[:self.max_warm]
+                self._wake()
+            return list(self._pinned)
+
+    def pinned(self):
+        with self._cond:
+            return list(self._pinned)
+
+    def status(self):
+        """One dict per pinned or loaded model: name, state, pinned, size, size_vram, load_seconds, error,
+        plus hosts (how many have it loaded) and host_count (how many answered)."""
+        with self._cond:
+            urls = [url for url, _ in self._clients]
+            reachable = [url for url in urls if url not in self._errors]
+            names = list(self._pinned)
+            for url in reachable:
+                shown = set(self._running_name(url, m) for m in names)
+                names += sorted(m for m in self._running.get(url, {}) if m not in shown and m not in names)
+            rows = []
+            for name in names:
+                loaded = [self._running[url][self._running_name(url, name)] for url in reachable
+                          if self._running_name(url, name) in self._running.get(url, {})]
+                states = [self._states.get((url, name), {}) for url in reachable]
+                info = {}
+                for state in states:
+                    if state.get("error") and not info.get("error"):
+                        info["error"] = state["error"]
+                    if state.get("load_seconds") is not None:
+                        info["load_seconds"] = max(info.get("load_seconds", 0), state["load_seconds"])
+                if [state for state in states if state.get("state") == MODEL_LOADING]:
+                    info["state"] = MODEL_LOADING
+                elif loaded:
+                    info["state"] = MODEL_LOADED
+                elif [state for state in states if state.get("state") == MODEL_FAILED]:
+                    info["state"] = MODEL_FAILED
+                else:
+                    info["state"] = MODEL_UNLOADED
+                info.update({"name": name, "pinned": name in self._pinned,
+                             "size": loaded[0].get("size") if loaded else None,
+                             "size_vram": loaded[0].get("size_vram") if loaded else None,
+                             "hosts": len(loaded), "host_count": len(reachable)})
+                rows.append(info)
+            return rows
+
+    def _running_name(self, url, model):
+        """/api/ps reports "llama3" as "llama3:latest"."""
+        running = self._running.get(url, {})
+        if model not in running and ":" not in model and model + ":latest" in running:
+            return model + ":latest"
+        return model
+
+    def summary(self):
+        with self._cond:
+            urls = [url for url, _ in self._clients]
+            errors = [(url, self._errors[url]) for url in urls if url in self._errors]
+        if errors and len(errors) == len(urls):
+            return "Ollama API unreachable: " + errors[0][1]
+        parts = []
+        for row in self.status():
+            text = row["name"] + (" (pinned)" if row["pinned"] else "") + ": " + row["state"]
+            if len(urls) > 1 and row["state"] == MODEL_LOADED:
+                text += " on %d/%d hosts" % (row["hosts"], row["host_count"])
+            if row.get("size"):
+                text += ", " + format_size(row["size"])
+                if row.get("size_vram") is not None and row["size"]:
+                    text += " (%d%% GPU)" % round(100.0 * row["size_vram"] / row["size"])
+            if row["state"] == MODEL_FAILED and row.get("error"):
+                text += " - " + row["error"]
+            elif row.get("load_seconds") is not None and row["state"] == MODEL_LOADED:
+                text += ", loaded in %.1fs" % row["load_seconds"]
+            parts.append(text)
+        parts += [url + " unreachable" for url, _ in errors]
+        return " | ".join(parts) if parts else "No models loaded"
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            clients, self._clients = self._clients, []
+            self._cond.notify()
+        for _, client in clients:
+            client.close()
+
+    def _wake(self):
+        self._dirty = True
+        if self.max_warm and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ollama-models")
+            self._thread.daemon = True
+            self._thread.start()
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._dirty and not self._stopped:
+                    self._cond.wait(self.POLL_SECONDS)
+                if self._stopped:
+                    return
+                self._dirty = False
+                clients, pinned, keep_alive = list(self._clients), list(self._pinned), self.keep_alive
+            run_parallel([lambda url=url, client=client: self._warm(url, client, pinned, keep_alive)
+                          for url, client in clients], len(clients))
+
+    def _warm(self, url, client, pinned, keep_alive):
+        self._poll(url, client)
+        for model in pinned:
+            if self._needs_touch(url, model, keep_alive):
+                self._load(url, client, model, keep_alive)
+
+    def _poll(self, url, client):
+        try:
+            running = dict((m.get("name") or m.get("model"), m) for m in client.running())
+            error = None
+        except Exception as e:
+            running, error = {}, str(e)
+        with self._cond:
+            self._running[url] = running
+            if error:
+                self._errors[url] = error
+            else:
+                self._errors.pop(url, None)
+
+    def _needs_touch(self, url, model, keep_alive):
+        with self._cond:
+            state = self._states.get((url, model), {})
+            if url in self._errors or state.get("state") == MODEL_LOADING:
+                return False
+            if self._running_name(url, model) not in self._running.get(url, {}):
+                # Failed loads are retried at most once a minute.
+                return state.get("state") != MODEL_FAILED or time.time() - state.get("failed_at", 0) > 60
+            seconds = keep_alive_seconds(keep_alive)
+            return seconds is not None and \
+                time.time() - self._touched.get((url, model), 0) > max(seconds / 2.0, self.POLL_SECONDS)
+
+    def _load(self, url, client, model, keep_alive):
+        key = (url, model)
+        where = " on " + url if len(self._clients) > 1 else ""
+        with self._cond:
+            previous = self._states.get(key, {})
+            was_loaded = self._running_name(url, model) in self._running.get(url, {})
+            if not was_loaded:
+                self._states[key] = {"state": MODEL_LOADING}
+        start = time.time()
+        try:
+            client.load(model, keep_alive)
+            state = {"state": MODEL_LOADED, "load_seconds": previous.get("load_seconds") if was_loaded
+                     else time.time() - start}
+            if not was_loaded:
+                self.log("Model " + model + " loaded" + where + " in %.1fs" % state["load_seconds"])
+        except Exception as e:
+            state = {"state": MODEL_FAILED, "error": str(e), "failed_at": time.time()}
+            self.log("Could not preload " + model + where + ": " + str(e))
+        with self._cond:
+            self._states[key] = state
+            self._touched[key] = time.time()
+        self._poll(url, client)
+
+
+DISCOVERY_TIMEOUT = 5
+MODEL_LIST_TTL = 300
+
+
+def _parse_ollama_list(output):
+    """Rows of `ollama list` (NAME, ID, SIZE, MODIFIED) as model dicts; the CLI has no quantization info."""
+    models = []
+    for line in output.splitlines()[1:]:
+        columns = re.split(r"\s{2,}", line.strip())
+        if columns and columns[0]:
+            models.append({"name": columns[0], "size_text": columns[2] if len(columns) > 2 else "",
+                           "modified": columns[3] if len(columns) > 3 else ""})
+    return models
+
+
+def describe_model(model):
+    """"4.7 GB, 8.0B, Q4_0" style summary of a discovered model."""
+    parts = [format_size(model["size"]) if model.get("size") else model.get("size_text", "")]
+    parts += [model.get("parameter_size", ""), model.get("quantization", "")]
+    return ", ".join(part for part in parts if part)
+
+
+class ModelCatalog(object):
+    """Installed models from /api/tags, falling back to `ollama list`, cached for ttl seconds.
+
+    discover() blocks for at most about timeout seconds per source; discover_async() runs it on a
+    daemon thread, shares one lookup between concurrent callers and calls back with
+    (models, source, error).
+    """
+
+    def __init__(self, ttl=MODEL_LIST_TTL, timeout=DISCOVERY_TIMEOUT):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._cached = {}
+        self._waiting = {}
+
+    def _key(self, config):
+        return (config.get("api_url", DEFAULT_API_URL), config.get("path", "ollama"))
+
+    def cached(self, config):
+        with self._lock:
+            entry = self._cached.get(self._key(config))
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def discover(self, config, force=False):
+        if not force:
+            cached = self.cached(config)
+            if cached:
+                return cached
+        errors = []
+        for source, lookup in (("api", self._from_api), ("cli", self._from_cli)):
+            try:
+                models = lookup(config)
+            except Exception as e:
+                errors.append(source + ": " + str(e))
+                continue
+            result = (models, source, None)
+            with self._lock:
+                self._cached[self._key(config)] = (time.time(), result)
+            return result
+        return [], None, "; ".join(errors)
+
+    def discover_async(self, config, callback, force=False):
+        key = self._key(config)
+        with self._lock:
+            if key in self._waiting:
+                self._waiting[key].append(callback)
+                return
+            self._waiting[key] = [callback]
+
+        def run():
+            try:
+                result = self.discover(config, force)
+            except Exception as e:
+                result = ([], None, str(e))
+            with self._lock:
+                callbacks = self._waiting.pop(key, [])
+            for waiting in callbacks:
+                try:
+                    waiting(*result)
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=run, name="ollama-discovery")
+        thread.daemon = True
+        thread.start()
+
+    def _from_api(self, config):
+        client = OllamaClient(config.get("api_url", DEFAULT_API_URL), timeout=self.timeout)
+        try:
+            tags = client.request_json("GET", "/api/tags").get("models") or []
+        finally:
+            client.close()
+        models = []
+        for tag in tags:
+            details = tag.get("details") or {}
+            models.append({"name": tag.get("name") or tag.get("model"), "size": tag.get("size"),
+                           "parameter_size": details.get("parameter_size", ""),
+                           "quantization": details.get("quantization_level", ""),
+                           "family": details.get("family", ""), "modified": tag.get("modified_at", "")})
+        return sorted(models, key=lambda m: m["name"])
+
+    def _from_cli(self, config):
+        args = command_args(config.get("path", "ollama")) + ["list"]
+        cmd = " ".join(args)
+        process = popen_group(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        timed_out = []
+
+        def kill():
+            timed_out.append(True)
+            kill_process_tree(process)
+
+        timer = threading.Timer(self.timeout, kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            output, error = process.communicate()
+        finally:
+            timer.cancel()
+        if timed_out:
+            raise OllamaError("`%s` did not answer within %ss" % (cmd, self.timeout))
+        if process.returncode != 0:
+            raise OllamaError((error or b"").decode("utf-8", "replace").strip()
+                              or "`%s` exited with status %s" % (cmd, process.returncode))
+        return _parse_ollama_list(output.decode("utf-8", "replace"))
+
+
+class SpillStore(object):
+    """Temporary files for text too large to keep on the heap; everything is deleted by close()."""
+
+    def __init__(self, threshold=64 * 1024, prefix="ollama_spill_"):
+        self.threshold = threshold
+        self._prefix = prefix
+        self._directory = None
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix=self._prefix)
+            self._counter += 1
+            path = os.path.join(self._directory, "%d.txt" % self._counter)
+        with open(path, "wb") as f:
+            f.write(_to_bytes(text))
+        return path
+
+    def get(self, path, limit=None):
+        """The text at path; with limit, only about its first limit bytes."""
+        with open(path, "rb") as f:
+            data = f.read(limit) if limit else f.read()
+        return data.decode("utf-8", "ignore" if limit else "replace")
+
+    def delete(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            directory, self._directory = self._directory, None
+        if directory:
+            shutil.rmtree(directory, True)
+
+
+class TextSlot(object):
+    """One body of text: a plain string when small, a SpillStore file once above its threshold."""
+
+    def __init__(self, store, text=""):
+        self._store = store
+        self._text = ""
+        self._path = None
+        self.length = 0
+        self.set(text)
+
+    def set(self, text):
+        self.release()
+        text = text or ""
+        self.length = len(text)
+        if self._store is not None and self.length > self._store.threshold:
+            self._path = self._store.put(text)
+        else:
+            self._text = text
+
+    def get(self):
+        return self._store.get(self._path) if self._path else self._text
+
+    def preview(self, limit):
+        return self._store.get(self._path, limit) if self._path else self._text[:limit]
+
+    def spilled(self):
+        return self._path is not None
+
+    def release(self):
+        if self._path:
+            self._store.delete(self._path)
+        self._path = None
+        self._text = ""
+        self.length = 0
@@ -0,0 +1,922 @@
+# Tests for ollama_core against the fake Ollama server in benchmark.py.
+#
+#  python -m unittest test_ollama_core
+#
+# They run on Python 2.7 and 3 and need no Ollama install.
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmark import FakeOllama, BenchView, _dead_url, _fake_cli_writes, fake_tokens
+from ollama_core import (Analyzer, AnalysisJob, AnalysisQueue, Conversation, FindingStore, FindingsParser, FingerprintIndex, HistoryStore, HostPool, ModelCatalog, ModelComparison, ModelManager, OllamaClient, OllamaError, PassiveIntake, PostingList, SpillStore, StreamDecoder, TextSlot, TrafficChunker, TrafficReducer, chunk_reader, chunk_text, extract_traffic, fingerprint,
+                         hamming, path_template, remove_stale_temp_dirs, split_message, BACKEND_API, CACHE_MEMORY, COMPARE_SKIPPED, DEFAULT_CUSTOM_PROMPT, EXTRACT_CONTEXT, EXTRACT_LOCAL, JOB_CANCELLED, JOB_DONE, ORDER_PRIORITY, PRIORITY_BACKGROUND, PRIORITY_BATCH,
+                         PRIORITY_INTERACTIVE)
+
+TRAFFIC = ("GET /account?id=7 HTTP/1.1\r\nHost: example.com\r\nCookie: session=abc\r\n\r\n",
+           "HTTP/1.1 200 OK\r\nSet-Cookie: session=abc; Path=/\r\nContent-Type: text/plain\r\n\r\nhello")
+
+
+def wait_for(jobs, timeout=10):
+    """Wait until none of jobs is queued or running."""
+    done = threading.Event()
+
+    def check(job=None):
+        if not [job for job in jobs if job.is_active()]:
+            done.set()
+    for job in jobs:
+        job.watch(check)
+    return done.wait(timeout)
+
+
+def new_job():
+    job = AnalysisJob(lambda job: None, PRIORITY_INTERACTIVE, 0)
+    job.started_at = job.submitted_at
+    return job
+
+
+def eventually(condition, timeout=5):
+    """Poll condition() until it is true or timeout seconds pass."""
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class OllamaClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+        self.client = OllamaClient(self.fake.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.fake.close()
+
+    def test_generate_streams_each_ndjson_line(self):
+        chunks = list(self.client.generate("m", "hi"))
+        self.assertEqual(len(chunks), 19)
+        self.assertEqual("".join(chunk_text(chunk) for chunk in chunks), "".join(fake_tokens(18)))
+        self.assertTrue(chunks[-1]["done"])
+        self.assertEqual(chunks[-1]["eval_count"], 18)
+
+    def test_chat_streams_message_content(self):
+        chunks = list(self.client.chat("m", [{"role": "user", "content": "hi"}]))
+        self.assertEqual("".join(chunk_text(chunk) for chunk in chunks), "".join(fake_tokens(18)))
+
+    def test_connection_is_kept_alive_between_calls(self):
+        list(self.client.generate("m", "one"))
+        self.assertEqual(len(self.client._idle), 1)
+        conn = self.client._idle[0]
+        list(self.client.chat("m", [{"role": "user", "content": "two"}]))
+        self.assertEqual(self.client._idle, [conn])
+        self.assertIsNotNone(conn.sock)
+
+    def test_abandoned_stream_does_not_return_its_connection(self):
+        stream = self.client.generate("m", "hi")
+        next(stream)
+        stream.close()
+        self.assertEqual(self.client._idle, [])
+
+    def test_connection_finished_after_close_is_not_kept(self):
+        stream = self.client.generate("m", "hi")
+        next(stream)
+        self.client.close()
+        list(stream)
+        self.assertEqual(self.client._idle, [])
+
+    def test_error_line_raises(self):
+        self.assertRaises(OllamaError, self.client._decode_line, b'{"error": "model not found"}')
+        self.assertRaises(OllamaError, self.client._decode_line, b"not json")
+
+
+class HostPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+
+    def tearDown(self):
+        self.fake.close()
+
+    def test_fails_over_from_a_dead_host(self):
+        analyzer = Analyzer({"model": "m", "backend": BACKEND_API, "api_hosts": [_dead_url(), self.fake.url],
+                             "history_enabled": False, "timeout_seconds": 30})
+        try:
+            result = analyzer.analyze(new_job(), BenchView(), "", TRAFFIC)
+            dead, live = analyzer.pool().hosts
+        finally:
+            analyzer.close()
+        self.assertEqual(result, "".join(fake_tokens(18)))
+        self.assertEqual((dead.failures, dead.served, dead.healthy), (1, 0, False))
+        self.assertEqual((live.failures, live.served), (0, 1))
+
+    def test_respects_per_host_limits(self):
+        pool = HostPool([(self.fake.url, 1), (_dead_url(), 1)])
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertNotEqual(first, second)
+        self.assertIsNone(pool.acquire(lambda: True))
+        pool.release(first)
+        self.assertIs(pool.acquire(lambda: True), first)
+        self.assertEqual([host.outstanding for host in pool.hosts], [1, 1])
+
+    def test_analyzer_close_stops_health_checks_and_closes_connections(self):
+        analyzer = Analyzer({"model": "m", "backend": BACKEND_API, "api_hosts": [self.fake.url, _dead_url()],
+                             "history_enabled": False, "health_interval": 0.05})
+        analyzer.analyze(new_job(), BenchView(), "", TRAFFIC)
+        pool = analyzer.pool()
+        checker = pool._checker
+        self.assertTrue(checker.is_alive())
+        self.assertEqual(len(pool.hosts[0].client._idle), 1)
+        analyzer.close()
+        checker.join(5)
+        self.assertFalse(checker.is_alive())
+        self.assertEqual(pool.hosts[0].client._idle, [])
+
+
+class FollowUpCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+        self.analyzer = None
+
+    def tearDown(self):
+        if self.analyzer is not None:
+            self.analyzer.close()
+        self.fake.close()
+
+    def run_analysis(self, prompt, conversation=None):
+        job = new_job()
+        self.analyzer.analyze(job, BenchView(), prompt, TRAFFIC, conversation=conversation)
+        return job
+
+    def check_follow_up(self, structured):
+        self.analyzer = Analyzer({"model": "m", "backend": BACKEND_API, "api_url": self.fake.url,
+                                  "cache_mode": CACHE_MEMORY, "history_enabled": False, "timeout_seconds": 30,
+                                  "structured_findings": structured})
+        conversation = Conversation()
+        self.assertFalse(self.run_analysis("first", conversation).cached)
+        follow_up = self.run_analysis("why?", conversation)
+        self.assertEqual(conversation.turns, 2)
+        self.assertFalse(follow_up.cached)
+        self.assertEqual(follow_up.metrics.input_bytes, len("why?"))
+
+        self.assertFalse(self.run_analysis("why?").cached)
+        self.assertTrue(self.run_analysis("why?").cached)
+        self.assertTrue(self.run_analysis("first").cached)
+
+    def test_follow_up_is_not_cached_under_its_question(self):
+        self.check_follow_up(False)
+
+    def test_follow_up_with_structured_findings_is_not_cached(self):
+        self.check_follow_up(True)
+
+
+class FindingsParserTest(unittest.TestCase):
+
+    def parse(self, text, size):
+        parser = FindingsParser()
+        found = []
+        for i in range(0, len(text), size):
+            found.extend(parser.feed(text[i:i + size]))
+        return found
+
+    def test_streamed_fragments(self):
+        document = "".join(fake_tokens(60, True))
+        expected = document.count('"severity"')
+        for wrapped in (document, "Findings:\n```json\n" + document + "\n```\nDone."):
+            for size in range(1, 17):
+                found = self.parse(wrapped, size)
+                self.assertEqual(len(found), expected, "fragments of %d chars" % size)
+                self.assertEqual([f["parameter"] for f in found], ["session%d" % i for i in range(expected)])
+                self.assertTrue(all(f["severity"] == "Medium" for f in found))
+
+    def test_braces_inside_strings(self):
+        text = '[{"title": "a } b {", "severity": "High", "evidence": "x\\"}"}]'
+        found = self.parse(text, 3)
+        self.assertEqual([(f["title"], f["evidence"]) for f in found], [("a } b {", 'x"}')])
+
+    def test_store_merges_the_same_finding_per_analysis(self):
+        finding = self.parse('[{"title": "Reflected  XSS", "severity": "High", "parameter": "q"}]', 5)[0]
+        store = FindingStore()
+        self.assertEqual(store.add([finding], {"host": "example.com", "path": "/items/12?q=1", "analysis": 1}), 1)
+        self.assertEqual(store.add([finding, finding], {"host": "EXAMPLE.com", "path": "/items/99", "analysis": 2}), 0)
+        self.assertEqual(store.add([finding], {"host": "other.com", "path": "/items/12", "analysis": 2}), 1)
+        self.assertEqual(sorted((row["host"], row["count"]) for row in store.rows()),
+                         [("example.com", 2), ("other.com", 1)])
+
+
+class CascadeTriageTest(unittest.TestCase):
+
+    STATIC = ("GET /logo.png HTTP/1.1\r\nHost: example.com\r\n\r\n",
+              "HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\nPNG")
+    ERROR = ("POST /api/login?next=/home HTTP/1.1\r\nHost: example.com\r\nContent-Type: application/x-www-form-urlencoded"
+             "\r\n\r\nuser=a&password=b",
+             "HTTP/1.1 500 Internal Server Error\r\nContent-Type: text/plain\r\n\r\nTraceback (most recent call last):")
+
+    def setUp(self):
+        self.fake = None
+        self.analyzer = None
+
+    def tearDown(self):
+        if self.analyzer is not None:
+            self.analyzer.close()
+        if self.fake is not None:
+            self.fake.close()
+
+    def run_triage(self, traffic, priority=PRIORITY_BATCH, ttft=0, **config):
+        self.fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=ttft)
+        settings = {"model": "m", "backend": BACKEND_API, "api_url": self.fake.url, "history_enabled": False,
+                    "cascade_enabled": True, "timeout_seconds": 30}
+        settings.update(config)
+        self.analyzer = Analyzer(settings)
+        job = AnalysisJob(lambda job: None, priority, 0)
+        job.started_at = job.submitted_at
+        return job, self.analyzer.analyze(job, BenchView(), "", traffic)
+
+    def test_low_score_gets_a_note_instead_of_the_model(self):
+        job, result = self.run_triage(self.STATIC)
+        self.assertTrue(result.startswith("[Triage score 0/100 (heuristic) is below the escalation threshold of 30"))
+        self.assertIn("static asset", result)
+        self.assertEqual((job.metrics.model, job.metrics.escalated), ("heuristic triage", False))
+
+    def test_high_score_escalates_to_the_full_model(self):
+        job, result = self.run_triage(self.ERROR)
+        self.assertEqual(result, "".join(fake_tokens(18)))
+        self.assertTrue(job.metrics.escalated)
+        self.assertGreaterEqual(job.metrics.triage_score, 30)
+
+    def test_interactive_jobs_skip_triage_unless_asked(self):
+        job, result = self.run_triage(self.STATIC, PRIORITY_INTERACTIVE)
+        self.assertEqual(result, "".join(fake_tokens(18)))
+        self.assertIsNone(job.metrics.triage_score)
+
+    def test_slow_triage_model_falls_back_to_the_heuristic(self):
+        started = time.time()
+        job, result = self.run_triage(self.STATIC, ttft=3, cascade_model="tiny", cascade_timeout_seconds=0.3)
+        self.assertLess(time.time() - started, 2.5)
+        self.assertIn("(heuristic)", result)
+        self.assertEqual(job.metrics.model, "tiny")
+
+
+class LocalExtractionTest(unittest.TestCase):
+
+    REQUEST = ("POST /api/users?page=2 HTTP/1.1\r\nHost: example.com\r\nAuthorization: Bearer abc.def\r\n"
+               "Content-Type: application/json\r\n\r\n{\"user\": {\"name\": \"a\", \"roles\": [\"admin\"]}}")
+    RESPONSE = ("HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nSet-Cookie: sid=1; Path=/\r\n\r\n"
+                "<form method=post action=\"/login\"><input name=user><input name=pass></form>"
+                "<a href=\"https://cdn.example.com/x.js\">x</a><a href=\"#top\">t</a>"
+                "<script>fetch(\"/api/v2/items\", {method: \"POST\"}); axios.delete('/api/v2/items/1')</script>")
+
+    def test_finds_parameters_routes_forms_and_links(self):
+        extraction = extract_traffic((self.REQUEST, self.RESPONSE))
+        self.assertEqual(extraction.endpoint, "POST /api/users")
+        self.assertEqual(extraction.items("parameter"),
+                         [("query", "page", "2"), ("json", "user.name", "a"), ("json", "user.roles[]", "admin")])
+        self.assertEqual(extraction.items("route"), [("", "/api/v2/items"), ("DELETE", "/api/v2/items/1")])
+        self.assertEqual(extraction.items("form"), [("POST", "/login", ("user", "pass"))])
+        self.assertEqual(extraction.items("url"), ["https://cdn.example.com/x.js"])
+        self.assertIn(("request", "Authorization", "Bearer ..."), extraction.items("header"))
+        self.assertIn(("response", "Set-Cookie", "sid"), extraction.items("header"))
+        self.assertNotIn("abc.def", extraction.format() + extraction.context())
+
+    def test_burp_parsed_parameters_are_used_when_given(self):
+        extraction = extract_traffic((self.REQUEST, None), {"parameters": [("cookie", "sid", "1")]})
+        self.assertEqual(extraction.items("parameter"), [("cookie", "sid", "1")])
+
+    def test_default_prompt_skips_the_model(self):
+        analyzer = Analyzer({"api_url": _dead_url(), "backend": BACKEND_API, "history_enabled": False,
+                             "extraction_mode": EXTRACT_LOCAL})
+        job = new_job()
+        try:
+            self.assertTrue(analyzer.skips_model(DEFAULT_CUSTOM_PROMPT.rstrip(".").upper()))
+            self.assertFalse(analyzer.skips_model("Find XSS."))
+            result = analyzer.analyze(job, BenchView(), DEFAULT_CUSTOM_PROMPT, (self.REQUEST, self.RESPONSE))
+        finally:
+            analyzer.close()
+        self.assertTrue(result.startswith("Local extraction (11 items"))
+        self.assertEqual((job.metrics.model, job.metrics.status), ("local extraction", JOB_DONE))
+
+    def test_extraction_replaces_the_bodies_sent_to_the_model(self):
+        fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+        analyzer = Analyzer({"model": "m", "api_url": fake.url, "backend": BACKEND_API, "history_enabled": False,
+                             "extraction_mode": EXTRACT_CONTEXT, "reduce_traffic": False})
+        response = self.RESPONSE + "<p>" + "filler " * 5000 + "</p>"
+        view = BenchView()
+        job = new_job()
+        try:
+            result = analyzer.analyze(job, view, "Find XSS.", (self.REQUEST, response))
+        finally:
+            analyzer.close()
+            fake.close()
+        self.assertEqual(result, "".join(fake_tokens(18)))
+        self.assertLess(job.metrics.input_bytes, 2000)
+
+
+class StreamDecoderTest(unittest.TestCase):
+
+    def test_any_split_gives_the_same_text(self):
+        writes = _fake_cli_writes(40, 50.0, 0.2)
+        stream = b"".join(data for _, data in writes)
+        decoder = StreamDecoder()
+        whole = decoder.feed(stream) + decoder.flush()
+        self.assertEqual(whole, u"".join(token + (u" r\u00e9sum\u00e9 \u2014 \u2713" if i % 5 == 4 else u"")
+                                        for i, token in enumerate(fake_tokens(40))))
+        for size in range(1, 17):
+            decoder = StreamDecoder()
+            text = u"".join(decoder.feed(stream[i:i + size]) for i in range(0, len(stream), size)) + decoder.flush()
+            self.assertEqual(text, whole, "reads of %d bytes" % size)
+
+    def test_reader_returns_what_a_pipe_has_ready(self):
+        read_fd, write_fd = os.pipe()
+        stream = os.fdopen(read_fd, "rb", 0)
+        try:
+            os.write(write_fd, b"partial line")
+            read = chunk_reader(stream)
+            self.assertEqual(read(), b"partial line")
+            os.close(write_fd)
+            write_fd = None
+            self.assertEqual(read(), b"")
+        finally:
+            stream.close()
+            if write_fd is not None:
+                os.close(write_fd)
+
+    def test_reader_without_a_file_descriptor(self):
+        self.assertEqual(chunk_reader(io.BytesIO(b"abc" * 10), 4)(), b"abca")
+
+        class Stream(object):
+            def __init__(self):
+                self.data = io.BytesIO(b"xyz")
+
+            def fileno(self):
+                raise IOError("no descriptor")
+
+            def read(self, size):
+                return self.data.read(size)
+
+        logged = []
+        read = chunk_reader(Stream(), log=logged.append)
+        self.assertEqual([read(), read(), read(), read()], [b"x", b"y", b"z", b""])
+        self.assertEqual(len(logged), 1)
+
+
+class ModelComparisonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+        self.analyzer = Analyzer({"model": "m", "backend": BACKEND_API, "api_url": self.fake.url,
+                                  "cache_mode": CACHE_MEMORY, "history_enabled": False})
+        self.queue = AnalysisQueue(workers=4)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.analyzer.close()
+        self.fake.close()
+
+    def compare(self, models, run, parallel=0, early_stop=False):
+        def submit(model, on_status):
+            return self.queue.submit(lambda job: run(job, model), on_status=on_status)
+        comparison = ModelComparison(models, submit, self.queue.cancel, parallel, early_stop)
+        comparison.start()
+        self.assertTrue(eventually(lambda: not comparison.is_active()))
+        return comparison
+
+    def test_every_model_runs_even_with_a_cached_result(self):
+        def run(job, model):
+            return self.analyzer.analyze(job, BenchView(), "", TRAFFIC, force_refresh=True, model=model)
+        self.analyzer.analyze(new_job(), BenchView(), "", TRAFFIC, model="a")
+        comparison = self.compare(["a", "b", "c"], run, parallel=2)
+        self.assertEqual([comparison.status(model) for model in "abc"], [JOB_DONE] * 3)
+        self.assertEqual([comparison.jobs[model].result for model in "abc"], ["".join(fake_tokens(18))] * 3)
+        self.assertEqual([comparison.jobs[model].cached for model in "abc"], [False] * 3)
+        self.assertIn("tok/s", comparison.describe("b"))
+
+    def test_early_stop_keeps_the_first_model_to_finish(self):
+        def run(job, model):
+            while model == "slow" and not job.is_cancelled():
+                job._cancelled.wait(0.05)
+            return model
+        comparison = self.compare(["slow", "fast", "never"], run, parallel=2, early_stop=True)
+        self.assertEqual(comparison.chosen, "fast")
+        self.assertEqual((comparison.status("slow"), comparison.status("never")), (JOB_CANCELLED, COMPARE_SKIPPED))
+        self.assertTrue(comparison.describe("fast").startswith(JOB_DONE + ", chosen"))
+
+
+class AnalysisQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = AnalysisQueue(workers=1, ordering=ORDER_PRIORITY)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.order = []
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    def blocker(self, job):
+        self.started.set()
+        self.release.wait(10)
+        return "blocked"
+
+    def block(self):
+        job = self.queue.submit(self.blocker)
+        self.assertTrue(self.started.wait(5))
+        return job
+
+    def record(self, name):
+        def run(job):
+            self.order.append(name)
+            return name
+        return run
+
+    def test_runs_by_priority_once_a_worker_is_free(self):
+        first = self.block()
+        jobs = [self.queue.submit(self.record("background"), PRIORITY_BACKGROUND),
+                self.queue.submit(self.record("batch"), PRIORITY_BATCH),
+                self.queue.submit(self.record("interactive"), PRIORITY_INTERACTIVE)]
+        self.assertEqual(self.queue.counts(), (3, 1))
+        self.release.set()
+        self.assertTrue(wait_for([first] + jobs))
+        self.assertEqual(self.order, ["interactive", "batch", "background"])
+        self.assertEqual([job.status for job in jobs], [JOB_DONE] * 3)
+
+    def test_cancel_removes_a_queued_job(self):
+        self.block()
+        job = self.queue.submit(self.record("never"))
+        self.queue.cancel(job)
+        self.assertEqual(job.status, JOB_CANCELLED)
+        self.assertEqual(self.queue.counts(), (0, 1))
+
+    def until_cancelled(self, job):
+        self.started.set()
+        while not job.is_cancelled():
+            job._cancelled.wait(0.05)
+
+    def test_shutdown_cancels_running_and_queued_jobs(self):
+        first = self.queue.submit(self.until_cancelled)
+        self.assertTrue(self.started.wait(5))
+        queued = self.queue.submit(self.record("never"))
+        self.queue.shutdown("unloaded")
+        self.assertTrue(wait_for([first, queued]))
+        self.assertEqual((first.status, first.cancel_reason), (JOB_CANCELLED, "unloaded"))
+        self.assertEqual(queued.status, JOB_CANCELLED)
+        self.assertEqual(self.order, [])
+
+    def test_interactive_job_preempts_a_speculative_one(self):
+        speculative = self.queue.submit(self.until_cancelled, preemptible=True)
+        self.assertTrue(self.started.wait(5))
+        batch = self.queue.submit(self.record("batch"), PRIORITY_BATCH)
+        self.assertFalse(speculative.is_cancelled())
+        interactive = self.queue.submit(self.record("interactive"))
+        self.assertTrue(wait_for([speculative, batch, interactive]))
+        self.assertEqual((speculative.status, speculative.cancel_reason), (JOB_CANCELLED, "preempted"))
+        self.assertEqual(self.order, ["interactive", "batch"])
+
+    def test_speculative_jobs_wait_behind_every_other_job(self):
+        first = self.block()
+        jobs = [self.queue.submit(self.record("speculative"), preemptible=True),
+                self.queue.submit(self.record("background"), PRIORITY_BACKGROUND)]
+        self.release.set()
+        self.assertTrue(wait_for([first] + jobs))
+        self.assertEqual(self.order, ["background", "speculative"])
+
+    def test_promoted_job_is_ordered_and_kept_like_any_other(self):
+        first = self.block()
+        jobs = [self.queue.submit(self.record("background"), PRIORITY_BACKGROUND),
+                self.queue.submit(self.record("speculative"), preemptible=True)]
+        self.queue.promote(jobs[1])
+        self.release.set()
+        self.assertTrue(wait_for([first] + jobs))
+        self.assertEqual(self.order, ["speculative", "background"])
+
+        self.started.clear()
+        running = self.queue.submit(self.until_cancelled, preemptible=True)
+        self.assertTrue(self.started.wait(5))
+        self.queue.promote(running)
+        self.queue.submit(self.record("interactive"))
+        self.assertFalse(running.is_cancelled())
+        self.queue.cancel(running)
+
+    def test_run_now_does_not_wait_for_a_worker(self):
+        first = self.block()
+        job = self.queue.run_now(self.record("local"))
+        self.assertTrue(wait_for([job]))
+        self.assertEqual((job.status, self.order, first.is_active()), (JOB_DONE, ["local"], True))
+
+
+def response(body, content_type="text/html", headers=()):
+    head = ["HTTP/1.1 200 OK", "Content-Type: " + content_type] + list(headers)
+    return "\r\n".join(head) + "\r\n\r\n" + body
+
+
+class TrafficReducerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reducer = TrafficReducer(max_body_bytes=1024)
+
+    def test_binary_body_is_replaced_by_a_note(self):
+        _, reduced, stats = self.reducer.reduce(None, response("\x89PNG\x00\x01" * 500, "image/png"))
+        self.assertEqual(split_message(reduced)[2], "[binary body omitted: image/png, 3000 bytes]")
+        self.assertEqual(stats.saved_bytes(), stats.original_bytes - len(reduced))
+
+    def test_json_is_minified_without_changing_its_data(self):
+        data = {"user": {"id": 7, "roles": ["admin", "user"]}, "token": "abc"}
+        _, reduced, _ = self.reducer.reduce(None, response(json.dumps(data, indent=4), "application/json"))
+        body = split_message(reduced)[2]
+        self.assertNotIn("\n", body)
+        self.assertEqual(json.loads(body), data)
+
+    def test_large_body_keeps_its_start_and_end(self):
+        body = "<p>start</p>" + "<p>filler text</p>\n" * 400 + "<p>end</p>"
+        _, reduced, stats = self.reducer.reduce(None, response(body))
+        kept = split_message(reduced)[2]
+        self.assertTrue(kept.startswith("<p>start</p>"))
+        self.assertTrue(kept.endswith("<p>end</p>"))
+        self.assertIn("bytes omitted ...]", kept)
+        self.assertLess(len(kept), 1100)
+        self.assertGreater(stats.tokens_saved(), 1000)
+
+    def test_headers_are_collapsed_and_shortened_but_credentials_kept(self):
+        token = "Bearer " + "x" * 400
+        request = "\r\n".join(["GET / HTTP/1.1", "Host: example.com", "Authorization: " + token,
+                                "Cookie: session=" + "s" * 100, "X-Long: " + "v" * 400] +
+                               ["X-Trace: %d" % i for i in range(6)]) + "\r\n\r\n"
+        reduced, _, stats = self.reducer.reduce(request, None)
+        self.assertIn("Authorization: " + token, reduced)
+        self.assertIn("session=" + "s" * 48 + "...(100 chars)", reduced)
+        self.assertIn("...(400 chars)", reduced)
+        self.assertEqual(reduced.count("X-Trace:"), 3)
+        self.assertIn("[... 3 more X-Trace headers omitted ...]", reduced)
+        self.assertTrue(stats.actions)
+
+    def test_disabled_reducer_passes_traffic_through(self):
+        text = response("<p>  spaced  </p>" * 500)
+        request, reduced, stats = TrafficReducer(enabled=False).reduce(None, text)
+        self.assertIsNone(request)
+        self.assertEqual(reduced, text)
+        self.assertEqual(stats.saved_bytes(), 0)
+
+
+class TrafficChunkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chunker = TrafficChunker(chunk_size=1024, overlap=64)
+
+    def test_small_traffic_is_not_chunked(self):
+        self.assertFalse(self.chunker.needs_chunking("a" * 500, "b" * 500))
+        self.assertTrue(self.chunker.needs_chunking("a" * 500, "b" * 600))
+
+    def test_json_splits_between_objects_with_overlap(self):
+        items = [{"id": i, "name": "item %d" % i} for i in range(200)]
+        text = response(json.dumps(items), "application/json")
+        chunks = self.chunker.split(text)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(chunk) <= 1024 for chunk in chunks))
+        self.assertTrue(chunks[0].startswith("HTTP/1.1 200 OK"))
+        for before, after in zip(chunks, chunks[1:]):
+            self.assertTrue(after.startswith(before[-64:]))
+            self.assertTrue(before.endswith("},"))
+        for i in (0, 99, 199):
+            self.assertTrue([chunk for chunk in chunks if '"item %d"' % i in chunk])
+
+    def test_oversized_unit_is_cut_with_overlap(self):
+        chunks = self.chunker.split(response("z" * 5000, "text/plain"))
+        self.assertTrue(all(len(chunk) <= 1024 for chunk in chunks))
+        # The head is a chunk of its own; each later cut repeats the last 64 characters.
+        self.assertEqual(sum(chunk.count("z") for chunk in chunks) - 64 * (len(chunks) - 2), 5000)
+
+    def test_parts_are_numbered_across_request_and_response(self):
+        blocks = self.chunker.chunk_traffic("GET / HTTP/1.1\r\n\r\n", response("line\n" * 600, "text/plain"))
+        self.assertTrue(blocks[0].startswith("===== REQUEST (part 1/%d) =====" % len(blocks)))
+        self.assertTrue(blocks[-1].startswith("===== RESPONSE (part %d/%d) =====" % (len(blocks), len(blocks))))
+
+
+class HeldJob(object):
+    """Stands in for an AnalysisJob that stays active until finish()."""
+
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def finish(self):
+        self.active = False
+
+
+class PassiveIntakeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.submitted = []
+        self.intake = None
+
+    def tearDown(self):
+        if self.intake:
+            self.intake.stop()
+
+    def start(self, **config):
+        settings = {"passive_enabled": True, "passive_rate_per_minute": 0, "passive_inflight": 100}
+        settings.update(config)
+
+        def submit(message, info):
+            job = HeldJob()
+            self.submitted.append((message, job))
+            return job
+        self.intake = PassiveIntake(lambda message: message, submit, settings, clock=lambda: self.now[0])
+        return self.intake
+
+    def offer(self, count, host="example.com", mime="HTML", status=200):
+        for _ in range(count):
+            self.intake.offer({"host": host, "mime": mime, "status": status})
+
+    def settled(self, **expected):
+        def matches():
+            counts = self.intake.stats()
+            return all(counts[name] == value for name, value in expected.items())
+        self.assertTrue(eventually(matches), "%r, expected %r" % (self.intake.stats(), expected))
+
+    def test_filters_scope_mime_status_and_host(self):
+        intake = self.start(passive_hosts="*.example.com")
+        intake.offer(None)
+        self.offer(1, host="api.example.com")
+        self.offer(1, host="api.example.com", mime="image")
+        self.offer(1, host="api.example.com", status=304)
+        self.offer(1, host="other.org")
+        self.settled(seen=5, out_of_scope=1, filtered=3, submitted=1)
+        self.assertEqual(self.submitted[0][0]["host"], "api.example.com")
+
+    def test_rate_limit_per_host(self):
+        self.start(passive_rate_per_minute=2)
+        self.offer(5)
+        self.offer(1, host="b.example.com")
+        self.settled(seen=6, submitted=3, rate_limited=3)
+        self.now[0] += 30
+        self.offer(2)
+        self.settled(seen=8, submitted=4, rate_limited=4)
+
+    def test_backpressure_holds_items_and_drops_the_oldest(self):
+        self.start(passive_inflight=1, passive_queue_size=2)
+        self.offer(1, status=201)
+        self.settled(submitted=1)
+        for status in (202, 203, 204):
+            self.offer(1, status=status)
+        self.settled(seen=4, submitted=1, dropped=1, pending=2)
+        self.submitted[0][1].finish()
+        self.settled(submitted=2)
+        self.assertEqual(self.submitted[1][0]["status"], 203)
+
+    def test_sampling(self):
+        intake = self.start(passive_sample_percent=50)
+        values = iter([0.1, 0.9, 0.4, 0.6])
+        intake._rand = lambda: next(values)
+        self.offer(4)
+        self.settled(seen=4, submitted=2, sampled_out=2)
+
+
+def account(user_id, body=None):
+    request = "GET /api/users/%d/profile?token=%x HTTP/1.1\r\nHost: example.com\r\n\r\n" % (user_id, user_id * 7919)
+    data = body or {"id": user_id, "name": "user %d" % user_id, "roles": ["user"], "active": True}
+    return request, response(json.dumps(data), "application/json")
+
+
+class NearDuplicateTest(unittest.TestCase):
+
+    def test_path_template_replaces_ids(self):
+        self.assertEqual(path_template("/api/users/42/orders/3f2a9c1e-1b2c-4d5e-8f90-1234567890ab"),
+                         path_template("/api/users/7/orders/aaaaaaaa-bbbb-4ccc-8ddd-eeeeeeeeeeee"))
+        self.assertNotEqual(path_template("/api/users/42"), path_template("/api/orders/42"))
+
+    def test_same_shape_with_other_values_matches(self):
+        first, second = fingerprint(account(1)), fingerprint(account(2))
+        self.assertEqual(first.group, second.group)
+        self.assertEqual(hamming(first.shape, second.shape), 0)
+
+    def test_other_parameters_settings_or_status_do_not_match(self):
+        base = fingerprint(account(1))
+        request, resp = account(1)
+        self.assertNotEqual(fingerprint((request.replace("token=", "debug=1&token="), resp)).group, base.group)
+        self.assertNotEqual(fingerprint(account(1), "other model").group, base.group)
+        self.assertNotEqual(fingerprint((request, resp.replace("200 OK", "403 Forbidden"))).group, base.group)
+
+    def test_index_matches_within_distance(self):
+        index = FingerprintIndex(max_distance=3)
+        first = fingerprint(account(1))
+        slot, owner = index.claim(first)
+        self.assertTrue(owner)
+        same, owner = index.claim(fingerprint(account(2)))
+        self.assertIs(same, slot)
+        self.assertFalse(owner)
+        index.fill(slot, "result", "m")
+        self.assertTrue(slot.ready.is_set())
+        different = fingerprint(account(3, {"error": "not found", "code": 404, "trace": None}))
+        self.assertTrue(index.claim(different)[1])
+        index.abandon(slot)
+        self.assertTrue(index.claim(fingerprint(account(4)))[1])
+
+    def test_analyzer_reuses_only_when_enabled(self):
+        fake = FakeOllama(tokens_per_sec=2000, tokens=18, ttft=0)
+        try:
+            for enabled in (False, True):
+                config = {"model": "m", "backend": BACKEND_API, "api_url": fake.url, "history_enabled": False,
+                          "timeout_seconds": 30}
+                if enabled:
+                    config["dedupe_enabled"] = True
+                analyzer = Analyzer(config)
+                try:
+                    jobs = [new_job(), new_job()]
+                    results = [analyzer.analyze(job, BenchView(), "", account(i + 1)) for i, job in enumerate(jobs)]
+                finally:
+                    analyzer.close()
+                self.assertEqual(results, ["".join(fake_tokens(18))] * 2)
+                self.assertEqual([job.duplicate for job in jobs], [False, enabled])
+        finally:
+            fake.close()
+
+
+class ModelManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fakes = [FakeOllama(), FakeOllama()]
+        self.manager = None
+
+    def tearDown(self):
+        if self.manager:
+            self.manager.stop()
+        for fake in self.fakes:
+            fake.close()
+
+    def test_warms_every_host(self):
+        dead = _dead_url()
+        self.manager = ModelManager({"api_hosts": [fake.url for fake in self.fakes] + [dead], "model": "m",
+                                     "warm_models": 1})
+        self.assertTrue(eventually(lambda: all("m" in fake.loaded for fake in self.fakes)))
+        self.assertTrue(eventually(lambda: self.manager.status()[0]["hosts"] == 2))
+        row = self.manager.status()[0]
+        self.assertEqual((row["name"], row["state"], row["pinned"], row["host_count"]), ("m", "loaded", True, 2))
+        summary = self.manager.summary()
+        self.assertIn("m (pinned): loaded on 2/2 hosts", summary)
+        self.assertIn(dead + " unreachable", summary)
+
+    def test_follows_host_changes_and_selection(self):
+        self.manager = ModelManager({"api_url": self.fakes[0].url, "model": "m", "warm_models": 2})
+        self.assertTrue(eventually(lambda: "m" in self.fakes[0].loaded))
+        self.manager.update_config({"api_hosts": [fake.url for fake in self.fakes], "model": "m",
+                                    "warm_models": 2})
+        self.manager.select("other")
+        self.assertTrue(eventually(lambda: all(fake.loaded == set(["m", "other"]) for fake in self.fakes)))
+        self.assertEqual(self.manager.pinned(), ["other", "m"])
+
+    def test_warm_up_off(self):
+        self.manager = ModelManager({"api_url": self.fakes[0].url, "model": "m", "warm_models": 0})
+        time.sleep(0.2)
+        self.assertEqual(self.fakes[0].loaded, set())
+        self.assertIsNone(self.manager._thread)
+
+
+FAKE_LIST = """NAME              ID              SIZE      MODIFIED
+llama3:latest     365c0bd3c000    4.7 GB    2 days ago
+qwen2.5:0.5b      a8b0c5157701    397 MB    3 weeks ago
+"""
+
+
+@unittest.skipIf(sys.platform.startswith("win"), "uses a shell script as the fake ollama")
+class ModelCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="catalog test ")
+        self.marker = os.path.join(self.directory, "ran-shell")
+        self.ollama = os.path.join(self.directory, "fake ollama")
+        with open(self.ollama, "w") as f:
+            f.write("#!/bin/sh\n[ \"$1\" = list ] || exit 2\ncat <<'EOF'\n" + FAKE_LIST + "EOF\n")
+        os.chmod(self.ollama, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def discover(self, path):
+        return ModelCatalog(timeout=5).discover({"api_url": _dead_url(), "path": path})
+
+    def test_cli_fallback_with_spaces_in_the_path(self):
+        models, source, error = self.discover(self.ollama)
+        self.assertEqual((source, error), ("cli", None))
+        self.assertEqual([(m["name"], m["size_text"]) for m in models],
+                         [("llama3:latest", "4.7 GB"), ("qwen2.5:0.5b", "397 MB")])
+
+    def test_path_is_not_run_through_a_shell(self):
+        models, source, error = self.discover('"%s"; touch "%s"' % (self.ollama, self.marker))
+        self.assertEqual(models, [])
+        self.assertTrue(error)
+        self.assertFalse(os.path.exists(self.marker))
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HistoryStore(self.directory)
+        filler = " ".join("word%d" % i for i in range(1000))
+        for i in range(30):
+            self.store.add({"host": "h%d.example.com" % (i % 3), "path": "/api/items/%d" % i, "method": "GET",
+                            "status": 200 if i % 2 else 500, "model": "llama3" if i < 20 else "qwen",
+                            "timestamp": 1000 + i, "custom_prompt": "",
+                            "output": "Summary %d\n%s\n%s" % (i, filler, "deserialization" if i == 7 else "")})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def ids(self, query, store=None):
+        return [row["id"] for row in (store if store is not None else self.store).search(query)[1]]
+
+    def test_finds_words_anywhere_in_the_output(self):
+        self.assertEqual(self.ids("deserialization"), [7])
+        self.assertEqual(self.ids("word999 deserialization"), [7])
+        self.assertEqual(len(self.ids("word999")), 30)
+        self.assertEqual(self.ids("nothing_like_this"), [])
+
+    def test_prefixes_and_filters(self):
+        self.assertEqual(self.ids("deserial*"), [7])
+        self.assertEqual(self.ids("model:qwen status:500"), [28, 26, 24, 22, 20])
+        self.assertEqual(self.ids("word5 host:h1.example"), [28, 25, 22, 19, 16, 13, 10, 7, 4, 1])
+        total, rows = self.store.search("", offset=25, limit=10)
+        self.assertEqual((total, [row["id"] for row in rows]), (30, [4, 3, 2, 1, 0]))
+        self.assertEqual(self.store.get(7)["path"], "/api/items/7")
+
+    def test_index_is_reloaded_from_disk(self):
+        store = HistoryStore(self.directory)
+        total, rows = store.search("deserialization")
+        self.assertEqual((total, rows[0]["id"], rows[0]["summary"]), (1, 7, "Summary 7"))
+        self.assertEqual(len(store), 30)
+
+    def test_posting_list_round_trip(self):
+        numbers = [0, 1, 2, 130, 131, 20000, 5000000]
+        postings = PostingList()
+        for number in numbers:
+            postings.append(number)
+        self.assertEqual(list(postings), numbers)
+        self.assertEqual(len(postings), len(numbers))
+        self.assertLess(len(postings.data), 4 * len(numbers))
+
+
+class SpillStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_tempdir = tempfile.tempdir
+        self.root = tempfile.mkdtemp()
+        tempfile.tempdir = self.root
+
+    def tearDown(self):
+        tempfile.tempdir = self.saved_tempdir
+        shutil.rmtree(self.root, True)
+
+    def make_dir(self, name, files, age=0):
+        path = os.path.join(self.root, name)
+        os.mkdir(path)
+        for filename in files:
+            with open(os.path.join(path, filename), "w") as f:
+                f.write("x")
+            os.utime(os.path.join(path, filename), (time.time() - age, time.time() - age))
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_large_text_spills_and_close_removes_it(self):
+        store = SpillStore(threshold=10)
+        small, large = TextSlot(store, "short"), TextSlot(store, "y" * 100)
+        self.assertEqual((small.get(), large.get(), large.preview(3)), ("short", "y" * 100, "yyy"))
+        names = os.listdir(self.root)
+        self.assertEqual((len(names), names[0][:13]), (1, "ollama_spill_"))
+        store.close()
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_analyzer_close_removes_its_spill_directory(self):
+        analyzer = Analyzer({"api_url": _dead_url()})
+        analyzer._spill.put("z" * 10)
+        self.assertEqual(len(os.listdir(self.root)), 1)
+        analyzer.close()
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_stale_directories_are_swept(self):
+        day = 24 * 3600
+        self.make_dir("ollama_abc", ["http_traffic.txt"])
+        self.make_dir("ollama_spill_old", ["1.txt"], age=3 * day)
+        self.make_dir("ollama_tabs_old", [], age=3 * day)
+        kept = [self.make_dir("ollama_spill_live", ["1.txt"], age=day),
+                self.make_dir("ollama_tabs_live", ["3.txt"]),
+                self.make_dir("ollama_other", ["http_traffic.txt", "notes.txt"]),
+                self.make_dir("unrelated_spill_old", ["1.txt"], age=3 * day)]
+        self.assertEqual(remove_stale_temp_dirs(), 3)
+        self.assertEqual(sorted(os.listdir(self.root)), sorted(os.path.basename(path) for path in kept))
+
+
+if __name__ == "__main__":
+    unittest.main()